@@ -0,0 +1,337 @@
+"""
+Request handling shared by the Flask app (db_service.py) and the asyncio app
+(db_service_async.py). Each route reads its arguments with one of the
+``*_request`` functions here, makes its storage calls, and shapes the
+response with the function next to it, so the two apps only differ in
+whether they await storage.
+
+A request that cannot be served raises ApiError, which both apps turn into
+the error's JSON body and status.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from exercise_search import exercise_name_fields
+from request_parsing import (
+    NEXT_CURSOR_HEADER, encode_cursor, parse_date_range, parse_exercise_search_page, parse_ranked_search,
+    parse_stats_day_range, parse_todo_item_fields, search_history_page, todo_history_page,
+)
+from todo_bulk import MAX_BULK_TODO_ITEMS
+from todo_export import EXPORT_FORMATS
+
+logger = logging.getLogger(__name__)
+
+
+class ApiError(Exception):
+    """Answer the request with ``body`` (a dict sent as JSON) and ``status``."""
+
+    def __init__(self, body, status=400):
+        super().__init__(body)
+        self.body = body
+        self.status = status
+
+
+def _checked(parse, *args):
+    """Call a request_parsing parser, answering its ValueError with a 400."""
+    try:
+        return parse(*args)
+    except ValueError as e:
+        raise ApiError({"error": str(e)}) from e
+
+
+def parse_day(date):
+    """A YYYY-MM-DD date as midnight. Routes parse inside their try, so a bad date is a 500."""
+    return datetime.strptime(date, "%Y-%m-%d")
+
+
+def today():
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def page(rows, limit, cursor_fields):
+    """
+    ``(body, headers)`` for a page of ``rows`` fetched with ``limit + 1``: the
+    first ``limit`` rows, and the next page token when the extra row came back.
+    """
+    if len(rows) <= limit:
+        return rows, {}
+    last = rows[limit - 1]
+    return rows[:limit], {NEXT_CURSOR_HEADER: encode_cursor(*(last[field] for field in cursor_fields))}
+
+
+def found(document, message):
+    """``(body, status)``: the document, or a 404 with ``message``."""
+    if document:
+        return document, 200
+    return {"error": message}, 404
+
+
+# Users
+
+def create_user_request(data):
+    username = data.get("username")
+    password = data.get("password")
+    if not username or not password:
+        raise ApiError({"message": "Username and password are required!"})
+    return username, password
+
+
+USERNAME_TAKEN = {"message": "Username already exists!"}
+
+
+def auth_request(data):
+    username = data.get("username")
+    password = data.get("password")
+    if not username or not password:
+        raise ApiError({"error": "Username and password are required"})
+    return username, password
+
+
+INVALID_LOGIN = {"error": "Invalid username or password"}
+
+
+# Todo days and items
+
+def empty_day(user_id, day):
+    """Day documents are only created by the first add, so a missing one is an empty day."""
+    return {"user_id": user_id, "date": day, "todo": []}
+
+
+def add_todo_request(data):
+    """``(user_id, date, exercise_item)``; the date is left for the route to parse."""
+    user_id = data.get("user_id")
+    exercise_item = data.get("exercise_item")
+    date = data.get("date")
+    if not user_id or not exercise_item or not date:
+        logger.warning("Missing required fields - user_id: %s, date: %s, exercise_item: %s", user_id, date, bool(exercise_item))
+        raise ApiError({"error": "user_id, date, and exercise_item are required"})
+    return user_id, date, exercise_item
+
+
+def add_todo_response(created):
+    """``(body, status)`` for push_item's result: True for a new day, False for an existing one, None on failure."""
+    if created:
+        return {"success": True, "message": "New todo entry created"}, 200
+    if created is None:
+        return {"success": False, "message": "Failed to add todo item"}, 400
+    return {"success": True, "message": "New todo item added to existing entry"}, 200
+
+
+def add_todo_bulk_request(data):
+    user_id = (data or {}).get("user_id")
+    items = (data or {}).get("items")
+    if not user_id or not isinstance(items, list) or not items:
+        raise ApiError({"error": "user_id and a non-empty items list are required"})
+    if len(items) > MAX_BULK_TODO_ITEMS:
+        raise ApiError({"error": f"At most {MAX_BULK_TODO_ITEMS} items per request"})
+    return user_id, items
+
+
+def added_counts(items_by_day, errors):
+    """Items added per day by a bulk add, leaving out the days that failed."""
+    return {day: len(day_items) for day, day_items in items_by_day.items() if day not in errors}
+
+
+def get_exercise_by_id_request(args):
+    user_id = args.get("user_id")
+    date = args.get("date")
+    exercise_todo_id = args.get("exercise_todo_id")
+    if not user_id or not date or not exercise_todo_id:
+        raise ApiError({"error": "user_id, date, and exercise_todo_id are required"})
+    return user_id, date, exercise_todo_id
+
+
+def update_exercise_request(data):
+    user_id = data.get("user_id")
+    date = data.get("date")
+    exercise_todo_id = data.get("exercise_todo_id")
+    update_fields = data.get("update_fields", {})
+    if not user_id or not date or not exercise_todo_id or not update_fields:
+        raise ApiError({"error": "user_id, date, exercise_todo_id, and update_fields are required"})
+    return user_id, date, exercise_todo_id, update_fields
+
+
+def update_exercise_response(updated):
+    if updated:
+        return {"success": True, "message": "Exercise updated successfully"}, 200
+    return {"success": False, "message": "No matching exercise found"}, 404
+
+
+def todo_item_request(args):
+    try:
+        return parse_day(args.get("date", ""))
+    except ValueError as e:
+        raise ApiError({"error": "date is required as YYYY-MM-DD"}) from e
+
+
+def delete_exercise_request(data):
+    user_id = data.get("user_id")
+    date = data.get("date")
+    exercise_id = data.get("exercise_id")
+    if not user_id or not date or not exercise_id:
+        logger.warning("Missing user_id, date, or exercise_id in request")
+        raise ApiError({"success": False, "message": "user_id, date, and exercise_id are required"})
+    return user_id, date, exercise_id
+
+
+def delete_exercise_response(removed):
+    """``(body, status)`` for pull_item's result: items removed, or None when the day does not exist."""
+    if removed is None:
+        return {"success": False, "message": "No todos found for the specified date"}, 404
+    if removed:
+        return {"success": True, "message": "Exercise deleted successfully"}, 200
+    return {"success": False, "message": "Exercise not found"}, 404
+
+
+def todo_history_request(args):
+    return _checked(todo_history_page, args)
+
+
+def todo_history_response(todos, limit):
+    return page(todos, limit, ("date", "_id"))
+
+
+def todo_by_date_request(args):
+    """``(start_date, end_date, fields, max_items)``; the dates are left for the route to parse."""
+    start_date = args.get("start_date")
+    end_date = args.get("end_date")
+    if not start_date or not end_date:
+        raise ApiError({"error": "start_date and end_date are required"})
+    fields, max_items = _checked(parse_todo_item_fields, args)
+    return start_date, end_date, fields, max_items
+
+
+def day_range(start_date, end_date):
+    """``(start, end)`` days covering the inclusive YYYY-MM-DD dates."""
+    return parse_day(start_date), parse_day(end_date) + timedelta(days=1)
+
+
+# Export
+
+def export_request(args):
+    """``(export_format, start, end)`` of a /todo/export request."""
+    export_format = args.get("format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        raise ApiError({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"})
+    start, end = _checked(parse_date_range, args)
+    return export_format, start, end
+
+
+def export_headers(user_id, export_format):
+    return {"Content-Disposition": f'attachment; filename="todo-{user_id}.{export_format}"'}
+
+
+# Stats and calendar
+
+def daily_stats_request(args):
+    return _checked(parse_stats_day_range, args)
+
+
+def days_between(days, start_date, end_date):
+    return {day: count for day, count in days.items() if start_date <= day <= end_date}
+
+
+def todo_stats_request(args):
+    """The ``today`` date (default the UTC date) the current streak ends on."""
+    today_arg = args.get("today") or datetime.utcnow().strftime("%Y-%m-%d")
+    try:
+        return parse_day(today_arg).date()
+    except ValueError as e:
+        raise ApiError({"error": "Invalid date format. Use YYYY-MM-DD"}) from e
+
+
+def month_calendar_request(args):
+    month = args.get("month")
+    if not month:
+        raise ApiError({"error": "month is required"})
+    try:
+        return datetime.strptime(month, "%Y-%m")
+    except ValueError as e:
+        raise ApiError({"error": "Invalid month format. Use YYYY-MM"}) from e
+
+
+# Exercises
+
+def search_request(data):
+    """
+    ``(query, ranked, limit, option)`` of an /exercises/search request:
+    ``option`` is the ``after`` cursor of a prefix search, or the ``min_score``
+    of a ranked one.
+    """
+    query = data.get("query", "")
+    if data.get("mode") == "ranked":
+        limit, min_score = _checked(parse_ranked_search, data)
+        return query, True, limit, min_score
+    limit, after = _checked(parse_exercise_search_page, data)
+    return query, False, limit, after
+
+
+def search_response(results, last):
+    """``(body, headers)`` for a page of prefix search results ending at ``last``."""
+    return results, {NEXT_CURSOR_HEADER: encode_cursor(*last)} if last else {}
+
+
+def get_many_request(data):
+    exercise_ids = data.get("ids")
+    if not isinstance(exercise_ids, list):
+        raise ApiError({"error": "ids must be a list"})
+    return exercise_ids
+
+
+def resolve_request(data):
+    names = data.get("names")
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ApiError({"error": "names must be a list of strings"})
+    return names
+
+
+def add_exercise_request(data):
+    """The exercise to store, with the search fields of its name."""
+    workout_name = data.get("workout_name")
+    if not workout_name:
+        raise ApiError({"error": "workout_name is required"})
+    return {**data, **exercise_name_fields(workout_name)}
+
+
+def update_exercise_details_request(data):
+    """The fields to set, keeping the search fields in sync with the name."""
+    if data.get("workout_name"):
+        return {**data, **exercise_name_fields(data["workout_name"])}
+    return data
+
+
+# Search history, transcriptions and plans
+
+def _user_content(data):
+    user_id = data.get("user_id")
+    content = data.get("content")
+    if not user_id or not content:
+        raise ApiError({"error": "user_id and content are required"})
+    return user_id, content
+
+
+def add_search_history_request(data):
+    return _user_content(data)
+
+
+def search_history_request(args):
+    return _checked(search_history_page, args)
+
+
+def search_history_response(history, limit):
+    return page(history, limit, ("time", "_id"))
+
+
+def transcription_request(data):
+    """The transcription entry to store."""
+    user_id, content = _user_content(data)
+    return {"user_id": user_id, "content": content, "time": datetime.utcnow()}
+
+
+def save_plan_request(data):
+    """The plan entry to store, dated today (UTC)."""
+    user_id = data.get("user_id")
+    plan_data = data.get("plan")
+    if not user_id or not plan_data:
+        raise ApiError({"success": False, "message": "user_id and plan data are required"})
+    return {"user_id": user_id, "date": datetime.utcnow().strftime("%Y-%m-%d"), "plan": plan_data}
@@ -0,0 +1 @@
+"""Benchmarks for the db-service. Most need a local mongod; see each module."""
@@ -0,0 +1,105 @@
+"""
+Compare the Flask app (gthread workers) with the asyncio app (Quart on
+uvicorn workers) at 50, 200 and 1000 simultaneous clients, against a local
+mongod.
+
+The benchmark starts ``gunicorn`` itself with ``DB_SERVICE_IMPL=sync`` and
+then ``async``, so both get the worker counts from gunicorn.conf.py
+(``WEB_CONCURRENCY`` overrides both). Start a mongod and stop any db-service
+on the benchmark port first. From the db-service directory:
+
+    docker run -d -p 27017:27017 mongo:7
+    MONGO_URI=mongodb://localhost:27017 DB_NAME=bench MONGO_TLS=0 python -m benchmarks.bench_async
+    BENCH_CONCURRENCY=50,200 BENCH_REQUESTS=5000 python -m benchmarks.bench_async
+
+Every client is a thread of this process. At 1000 clients the load
+generator can become the bottleneck itself, so keep an eye on its CPU.
+Requests that fail (refused or reset connections, 5xx) are counted in the
+``errors`` column and left out of the percentiles.
+"""
+
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from benchmarks.bench_exercise_catalog import REQUESTS, call, percentile
+from benchmarks.bench_serving import post_json, wait_until_up
+
+IMPLEMENTATIONS = ("sync", "async")
+CONCURRENCY = [int(n) for n in os.getenv("BENCH_CONCURRENCY", "50,200,1000").split(",")]
+
+
+def attempt(scenario):
+    """Latency of one request in milliseconds, or None if it failed."""
+    try:
+        return scenario()
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+
+def bench_implementation(implementation):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn"],
+        env={**os.environ, "DB_SERVICE_IMPL": implementation},
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        wait_until_up(process)
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        # Reads and writes use different users so the day being read does not
+        # grow while the benchmark runs.
+        reader, writer = (
+            post_json("/users/create", {"username": f"bench_async_{role}_{time.time()}", "password": "bench-password"})
+            ["user_id"]
+            for role in ("reader", "writer")
+        )
+        for i in range(5):
+            post_json("/todo/add", {
+                "user_id": reader, "date": today,
+                "exercise_item": {"exercise_todo_id": f"bench{i}", "workout_name": "Bench Press"}
+            })
+        new_item = {"user_id": writer, "date": today, "exercise_item": {"workout_name": "Bench Press"}}
+
+        scenarios = [
+            ("GET /todo/get/<id>", lambda: call(f"/todo/get/{reader}")),
+            ("POST /todo/add", lambda: call("/todo/add", new_item)),
+        ]
+        for clients in CONCURRENCY:
+            requests = max(REQUESTS, clients * 5)
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                for endpoint, scenario in scenarios:
+                    start = time.perf_counter()
+                    results = list(pool.map(lambda _: attempt(scenario), range(requests)))
+                    elapsed = time.perf_counter() - start
+                    samples = [ms for ms in results if ms is not None]
+                    errors = len(results) - len(samples)
+                    if not samples:
+                        print(f"{implementation:<6} {clients:>7} {endpoint:<20} every request failed")
+                        continue
+                    print(
+                        f"{implementation:<6} {clients:>7} {endpoint:<20} {len(samples) / elapsed:>8.0f} "
+                        f"{statistics.median(samples):>8.2f} {percentile(samples, 95):>8.2f} "
+                        f"{percentile(samples, 99):>8.2f} {errors:>7}"
+                    )
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+
+def main():
+    print(f"at least {REQUESTS} requests per endpoint and concurrency level")
+    print(
+        f"{'impl':<6} {'clients':>7} {'endpoint':<20} {'req/s':>8} {'p50 ms':>8} "
+        f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    )
+    for implementation in IMPLEMENTATIONS:
+        bench_implementation(implementation)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Load the db-service with a synthetic dataset and measure the hot read
+endpoints, writing the results as JSON so two commits can be compared.
+
+The dataset is ``BENCH_USERS`` users, each with ``BENCH_DAYS`` consecutive
+days of ``BENCH_ITEMS`` todo items, plus a catalog of ``BENCH_EXERCISES``
+exercises. It is drawn from a random generator seeded with ``BENCH_SEED``, so
+every run builds the same data and sends the same requests. It is loaded
+through the service's own write endpoints (``/users/create``,
+``/exercises/add``, ``/todo/add_bulk``), so the documents carry every field the
+service derives on write.
+
+The benchmark starts ``gunicorn`` itself, like bench_async, and stops it with
+SIGTERM at the end. Stop any db-service on the benchmark port first.
+
+- ``DB_BACKEND=mongo`` (the default) needs a mongod. The service is pointed
+  at the ``BENCH_DB_NAME`` database (default ``fitness_bench``), which is
+  dropped before and after the run.
+- ``DB_BACKEND=memory`` needs no database.
+
+``DB_SERVICE_IMPL=async`` benchmarks the asyncio app. From the db-service
+directory:
+
+    docker run -d -p 27017:27017 mongo:7
+    MONGO_URI=mongodb://localhost:27017 MONGO_TLS=0 python -m benchmarks.bench_endpoints
+    DB_BACKEND=memory BENCH_USERS=20 BENCH_EXERCISES=2000 python -m benchmarks.bench_endpoints
+    python -m benchmarks.bench_endpoints compare before.json after.json
+
+Results go to ``BENCH_OUTPUT``. The default is
+``benchmarks/results/<commit>-<backend>-<impl>.json``. ``compare`` prints the
+change in throughput and percentiles per endpoint between two result files.
+"""
+
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pymongo import MongoClient
+from benchmarks.bench_async import attempt
+from benchmarks.bench_exercise_catalog import BASE_URL, CLIENTS, REQUESTS, call, percentile
+from benchmarks.bench_exercise_search import WORDS
+from benchmarks.bench_serving import AUTH_REQUESTS, post_json, wait_until_up
+from mongo_settings import client_options, mongo_uri
+from todo_bulk import MAX_BULK_TODO_ITEMS
+
+USERS = int(os.getenv("BENCH_USERS", "50"))
+DAYS = int(os.getenv("BENCH_DAYS", "180"))
+ITEMS = int(os.getenv("BENCH_ITEMS", "6"))
+EXERCISES = int(os.getenv("BENCH_EXERCISES", "10000"))
+SEED = int(os.getenv("BENCH_SEED", "1"))
+DB_NAME = os.getenv("BENCH_DB_NAME", "fitness_bench")
+PASSWORD = "bench-password"
+# The last generated day, fixed so every run reads the same dates.
+LAST_DAY = date(2025, 6, 30)
+# /todo/get_by_date reads a week, the range the web-app's calendar asks for.
+WINDOW_DAYS = 7
+SEARCH_QUERIES = WORDS + ("benchpress", "pullup", "zzz")
+
+
+def dataset():
+    return {"users": USERS, "days": DAYS, "items": ITEMS, "exercises": EXERCISES, "seed": SEED}
+
+
+def exercise_names(rng):
+    """``EXERCISES`` distinct names built from the words of bench_exercise_search."""
+    return [" ".join(rng.sample(WORDS, rng.randint(2, 4))).title() + f" {i}" for i in range(EXERCISES)]
+
+
+def todo_batches(rng, exercises):
+    """A user's todo items as /todo/add_bulk bodies (without user_id) of at most MAX_BULK_TODO_ITEMS."""
+    items = []
+    for offset in range(DAYS - 1, -1, -1):
+        day = (LAST_DAY - timedelta(days=offset)).isoformat()
+        for _ in range(ITEMS):
+            exercise_id, workout_name = rng.choice(exercises)
+            items.append({"date": day, "exercise_item": {
+                "exercise_todo_id": f"{day}-{len(items)}",
+                "exercise_id": exercise_id,
+                "workout_name": workout_name,
+                "working_time": rng.choice((None, 30, 60, 90)),
+                "reps": rng.randint(5, 15),
+                "weight": rng.choice((None, 20, 40, 60)),
+                "time": f"{day}T18:00:00+00:00",
+            }})
+    return [items[i:i + MAX_BULK_TODO_ITEMS] for i in range(0, len(items), MAX_BULK_TODO_ITEMS)]
+
+
+def load(pool, rng):
+    """Load the dataset through the API and return the usernames and user ids."""
+    names = exercise_names(rng)
+    ids = pool.map(lambda name: post_json("/exercises/add", {"workout_name": name})["id"], names)
+    exercises = list(zip(ids, names))
+
+    usernames = [f"bench_user_{i}" for i in range(USERS)]
+    user_ids = list(pool.map(
+        lambda username: post_json("/users/create", {"username": username, "password": PASSWORD})["user_id"],
+        usernames
+    ))
+    bodies = [
+        {"user_id": user_id, "items": batch}
+        for user_id in user_ids for batch in todo_batches(rng, exercises)
+    ]
+    for reply in pool.map(lambda body: post_json("/todo/add_bulk", body), bodies):
+        if not reply["success"]:
+            failed = [result["error"] for result in reply["results"] if not result["success"]]
+            raise RuntimeError(f"/todo/add_bulk rejected items: {failed[:3]}")
+    return usernames, user_ids
+
+
+def scenarios(rng, usernames, user_ids):
+    """(endpoint, requests) pairs; each request is the (path, body) of one call."""
+    def window(user_id):
+        start = LAST_DAY - timedelta(days=rng.randrange(max(1, DAYS - WINDOW_DAYS + 1)))
+        return (f"/todo/get_by_date/{user_id}?start_date={start.isoformat()}"
+                f"&end_date={(start + timedelta(days=WINDOW_DAYS - 1)).isoformat()}", None)
+
+    def history(user_id):
+        start = LAST_DAY - timedelta(days=rng.randrange(DAYS))
+        return (f"/todo/{user_id}?start_date={start.isoformat()}", None)
+
+    return [
+        ("GET /todo/get_by_date/<id>", [window(rng.choice(user_ids)) for _ in range(REQUESTS)]),
+        ("GET /todo/<id>", [history(rng.choice(user_ids)) for _ in range(REQUESTS)]),
+        ("POST /exercises/search", [
+            ("/exercises/search", {"query": rng.choice(SEARCH_QUERIES)}) for _ in range(REQUESTS)
+        ]),
+        ("POST /users/auth", [
+            ("/users/auth", {"username": rng.choice(usernames), "password": PASSWORD})
+            for _ in range(AUTH_REQUESTS)
+        ]),
+    ]
+
+
+def measure(pool, requests):
+    start = time.perf_counter()
+    results = list(pool.map(lambda args: attempt(lambda: call(*args)), requests))
+    elapsed = time.perf_counter() - start
+    samples = [ms for ms in results if ms is not None]
+    result = {"requests": len(results), "errors": len(results) - len(samples), "seconds": round(elapsed, 3)}
+    if samples:
+        result.update(
+            throughput=round(len(samples) / elapsed, 1),
+            p50_ms=round(statistics.median(samples), 3),
+            p95_ms=round(percentile(samples, 95), 3),
+            p99_ms=round(percentile(samples, 99), 3),
+        )
+    return result
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def drop_database():
+    client = MongoClient(mongo_uri(), **client_options())
+    try:
+        client.drop_database(DB_NAME)
+    finally:
+        client.close()
+
+
+def run():
+    backend = os.getenv("DB_BACKEND", "mongo")
+    implementation = os.getenv("DB_SERVICE_IMPL", "sync")
+    if backend == "mongo":
+        drop_database()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn"],
+        env={**os.environ, "DB_NAME": DB_NAME, "TEST_DB_NAME": DB_NAME},
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        wait_until_up(process)
+        rng = random.Random(SEED)
+        with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+            start = time.perf_counter()
+            usernames, user_ids = load(pool, rng)
+            load_seconds = time.perf_counter() - start
+            print(
+                f"loaded {USERS} users x {DAYS} days x {ITEMS} items and {EXERCISES} exercises "
+                f"in {load_seconds:.1f}s"
+            )
+            print(f"{'endpoint':<28} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+            endpoints = {}
+            for endpoint, requests in scenarios(rng, usernames, user_ids):
+                result = endpoints[endpoint] = measure(pool, requests)
+                if "throughput" not in result:
+                    print(f"{endpoint:<28} every request failed")
+                    continue
+                print(
+                    f"{endpoint:<28} {result['throughput']:>8.0f} {result['p50_ms']:>8.2f} "
+                    f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['errors']:>7}"
+                )
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+        if backend == "mongo":
+            drop_database()
+
+    results = {
+        "commit": commit(),
+        "backend": backend,
+        "implementation": implementation,
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "url": BASE_URL,
+        "clients": CLIENTS,
+        "dataset": dataset(),
+        "load_seconds": round(load_seconds, 1),
+        "endpoints": endpoints,
+    }
+    output = os.getenv("BENCH_OUTPUT") or os.path.join(
+        "benchmarks", "results", f"{results['commit']}-{backend}-{implementation}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+
+def change(before, after):
+    if before is None or after is None:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+
+
+def compare(before_path, after_path):
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"{before['commit']} ({before['backend']}, {before['implementation']}) -> "
+          f"{after['commit']} ({after['backend']}, {after['implementation']})")
+    if before["dataset"] != after["dataset"] or before["clients"] != after["clients"]:
+        print("warning: the runs used different datasets or client counts")
+    print(f"{'endpoint':<28} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint, new in after["endpoints"].items():
+        old = before["endpoints"].get(endpoint, {})
+        print(f"{endpoint:<28} " + " ".join(
+            f"{change(old.get(key), new.get(key)):>8}" for key in ("throughput", "p50_ms", "p95_ms", "p99_ms")
+        ))
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "compare":
+        compare(sys.argv[2], sys.argv[3])
+    elif len(sys.argv) == 1:
+        run()
+    else:
+        print("Usage: python -m benchmarks.bench_endpoints [compare BEFORE.json AFTER.json]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
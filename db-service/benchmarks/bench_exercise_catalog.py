@@ -0,0 +1,84 @@
+"""
+Load the exercise catalog endpoints of a running db-service and report latency
+percentiles together with the catalog cache counters.
+
+Start the service first (``python db_service.py``), then from the db-service
+directory:
+
+    python -m benchmarks.bench_exercise_catalog
+    BENCH_DB_SERVICE_URL=http://localhost:5112 BENCH_CLIENTS=32 python -m benchmarks.bench_exercise_catalog
+
+Run it against a build without the cache to compare p99.
+"""
+
+import json
+import os
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = os.getenv("BENCH_DB_SERVICE_URL", "http://localhost:5112").rstrip("/")
+CLIENTS = int(os.getenv("BENCH_CLIENTS", "16"))
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "2000"))
+
+
+def call(path, body=None):
+    """Issue one request and return its latency in milliseconds."""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(
+        BASE_URL + path, data=data, headers={"Content-Type": "application/json"}
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(req) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples``."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def fetch_json(path):
+    """GET ``path`` and decode the JSON body."""
+    with urllib.request.urlopen(BASE_URL + path) as response:
+        return json.loads(response.read())
+
+
+def main():
+    exercises = fetch_json("/exercises/all")
+    if not exercises:
+        print("The exercise catalog is empty; nothing to benchmark.")
+        return
+    exercise_id = exercises[0]["_id"]
+    query = exercises[0]["workout_name"][:4]
+
+    scenarios = {
+        "GET /exercises/all": lambda: call("/exercises/all"),
+        "GET /exercises/get/<id>": lambda: call(f"/exercises/get/{exercise_id}"),
+        "POST /exercises/search": lambda: call("/exercises/search", {"query": query}),
+    }
+
+    stats_before = fetch_json("/exercises/catalog/stats")
+    print(f"{'endpoint':<26} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+        for name, scenario in scenarios.items():
+            start = time.perf_counter()
+            samples = list(pool.map(lambda _: scenario(), range(REQUESTS)))
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:<26} {REQUESTS / elapsed:>8.0f} "
+                f"{statistics.median(samples):>8.2f} {percentile(samples, 99):>8.2f}"
+            )
+    stats_after = fetch_json("/exercises/catalog/stats")
+
+    print(
+        "catalog cache: "
+        + ", ".join(f"{key} +{stats_after[key] - stats_before[key]}" for key in ("hits", "misses", "reloads"))
+    )
+
+
+if __name__ == "__main__":
+    main()
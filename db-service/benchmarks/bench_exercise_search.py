@@ -0,0 +1,100 @@
+"""
+Compare the old ``$regexMatch`` exercise search with the indexed prefix search
+as the catalog grows from 1k to 100k exercises.
+
+Needs a local mongod (no TLS). From the db-service directory:
+
+    python -m benchmarks.bench_exercise_search
+    BENCH_MONGO_URI=mongodb://localhost:27017 python -m benchmarks.bench_exercise_search
+
+The benchmark writes to the ``fitness_bench`` database and drops its
+collection when it is done.
+"""
+
+import os
+import random
+import statistics
+import time
+from pymongo import MongoClient
+from exercise_search import exercise_name_fields, normalize_exercise_name, prefix_query
+
+SIZES = (1_000, 10_000, 100_000)
+QUERIES = ("bench", "pullup", "squat", "row", "zzz")
+REPEAT = 20
+
+WORDS = (
+    "barbell", "dumbbell", "kettlebell", "cable", "seated", "standing", "incline",
+    "decline", "bench", "press", "pull", "up", "squat", "lunge", "row", "curl",
+    "fly", "raise", "deadlift", "plank", "push", "dip", "crunch", "jump", "sprint",
+)
+
+
+def legacy_query(query):
+    """The collection-scanning filter the search endpoint used before."""
+    return {
+        "$expr": {
+            "$regexMatch": {
+                "input": {
+                    "$toLower": {
+                        "$replaceAll": {
+                            "input": {
+                                "$replaceAll": {
+                                    "input": "$workout_name",
+                                    "find": "-",
+                                    "replacement": ""
+                                }
+                            },
+                            "find": " ",
+                            "replacement": ""
+                        }
+                    }
+                },
+                "regex": normalize_exercise_name(query),
+                "options": "i"
+            }
+        }
+    }
+
+
+def seed(collection, size):
+    """Fill ``collection`` with ``size`` synthetic exercises."""
+    rng = random.Random(size)
+    collection.drop()
+    docs = []
+    for i in range(size):
+        name = " ".join(rng.sample(WORDS, rng.randint(2, 4))).title() + f" {i}"
+        docs.append({"workout_name": name, **exercise_name_fields(name)})
+    collection.insert_many(docs)
+    collection.create_index("workout_name_keys")
+
+
+def median_ms(collection, build_filter):
+    """Median wall time of running every query in QUERIES, in milliseconds."""
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for query in QUERIES:
+            list(collection.find(build_filter(query), {"_id": 1}).limit(50))
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    client = MongoClient(os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017"))
+    collection = client["fitness_bench"]["exercises"]
+    print(f"{'exercises':>10} {'legacy ms':>10} {'prefix ms':>10}  plan")
+    try:
+        for size in SIZES:
+            seed(collection, size)
+            legacy = median_ms(collection, legacy_query)
+            prefix = median_ms(collection, prefix_query)
+            plan = collection.find(prefix_query("bench")).explain()["queryPlanner"]["winningPlan"]
+            stage = plan.get("inputStage", plan).get("stage")
+            print(f"{size:>10} {legacy:>10.2f} {prefix:>10.2f}  {stage}")
+    finally:
+        collection.drop()
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
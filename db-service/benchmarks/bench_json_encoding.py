@@ -0,0 +1,87 @@
+"""
+Measure the cost of turning one todo day document into a JSON response body.
+
+"handler copy + json" is what the handlers used to do: deepcopy the document,
+str() every id and hand the result to the standard library encoder. "orjson
+provider" is the shared encoder in json_provider.py, fed the raw document.
+
+No database is needed. From the db-service directory:
+
+    python -m benchmarks.bench_json_encoding
+"""
+
+import copy
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from json_provider import dumps_bytes
+
+ITEMS_PER_DAY = (1, 5, 20)
+DOCS = 2_000
+REPEAT = 5
+
+
+def todo_document(items):
+    """A day document shaped like the ones /todo/add writes."""
+    day = datetime(2024, 12, 1)
+    return {
+        "_id": ObjectId(),
+        "user_id": str(ObjectId()),
+        "date": day,
+        "todo": [
+            {
+                "exercise_todo_id": str(ObjectId()),
+                "exercise_id": ObjectId(),
+                "workout_name": f"Exercise {i}",
+                "working_time": None,
+                "reps": 10,
+                "weight": 50,
+                "time": day + timedelta(minutes=i),
+            }
+            for i in range(items)
+        ],
+    }
+
+
+def handler_copy_json(doc):
+    doc = copy.deepcopy(doc)
+    doc["_id"] = str(doc["_id"])
+    doc["date"] = doc["date"].strftime("%a, %d %b %Y %H:%M:%S GMT")
+    for item in doc["todo"]:
+        item["exercise_todo_id"] = str(item["exercise_todo_id"])
+        item["exercise_id"] = str(item["exercise_id"])
+        item["time"] = item["time"].strftime("%Y-%m-%d")
+    return json.dumps(doc).encode("utf-8")
+
+
+ENCODERS = {
+    "handler copy + json": handler_copy_json,
+    "orjson provider": dumps_bytes,
+}
+
+
+def microseconds_per_doc(encode, docs):
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for doc in docs:
+            encode(doc)
+        timings.append((time.perf_counter() - start) * 1_000_000 / len(docs))
+    return statistics.median(timings)
+
+
+def main():
+    print(f"{'items/day':>9} " + " ".join(f"{name:>20}" for name in ENCODERS) + f" {'speedup':>8}")
+    for items in ITEMS_PER_DAY:
+        docs = [todo_document(items) for _ in range(DOCS)]
+        costs = [microseconds_per_doc(encode, docs) for encode in ENCODERS.values()]
+        print(
+            f"{items:>9} " + " ".join(f"{cost:>17.2f} us" for cost in costs)
+            + f" {costs[0] / costs[-1]:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
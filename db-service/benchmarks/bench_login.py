@@ -0,0 +1,41 @@
+"""
+Measure login throughput of a running db-service.
+
+Creates a throwaway user, then sends ``BENCH_REQUESTS`` logins from
+``BENCH_CLIENTS`` threads. Start the service first (``python db_service.py``),
+then from the db-service directory:
+
+    python -m benchmarks.bench_login
+
+Run it against a build that still writes a todo document on login to compare.
+Most of what is left is the password hash check, which is deliberately slow.
+"""
+
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.bench_exercise_catalog import CLIENTS, call, percentile
+
+# Every login runs a pbkdf2 check, so the default is smaller than the other benchmarks.
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "200"))
+
+
+def main():
+    credentials = {"username": f"bench_login_{time.time()}", "password": "bench-password"}
+    call("/users/create", credentials)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+        samples = list(pool.map(lambda _: call("/users/auth", credentials), range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+
+    print(f"{'endpoint':<18} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    print(
+        f"{'POST /users/auth':<18} {REQUESTS / elapsed:>8.0f} "
+        f"{statistics.median(samples):>8.2f} {percentile(samples, 99):>8.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Measure how ranked (trigram) exercise search scales with catalog size.
+
+The catalog is padded with made-up names around a few real ones, and the
+queries are typos of the real names. Query cost should follow the number of
+similar names rather than the size of the catalog.
+
+The index is in memory, so no database is needed. From the db-service
+directory:
+
+    python -m benchmarks.bench_ranked_search
+"""
+
+import random
+import statistics
+import time
+from exercise_search import TrigramIndex
+
+SIZES = (1_000, 10_000, 100_000)
+QUERIES = ("pulup", "benchpres", "inclne dumbell", "squat", "xyz")
+REPEAT = 20
+
+SYLLABLES = ("ka", "zo", "tri", "mel", "vor", "qui", "bax", "len", "dru", "sil", "fen", "gor")
+REAL_NAMES = ("Pull Up", "Bench Press", "Incline Dumbbell Press", "Squat", "Barbell Row")
+
+
+def synthetic_name(rng):
+    """A made-up two-word name, so the real names below stay a handful of true matches."""
+    return " ".join(
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(2)
+    )
+
+
+def build(size):
+    """A TrigramIndex over ``size`` synthetic exercise names plus the real ones queried."""
+    rng = random.Random(size)
+    index = TrigramIndex()
+    for i in range(size):
+        index.add(str(i), synthetic_name(rng))
+    for name in REAL_NAMES:
+        index.add(name, name)
+    return index
+
+
+def main():
+    print(f"{'exercises':>10} {'build s':>8} {'query ms':>9} {'per 1k':>8}")
+    for size in SIZES:
+        start = time.perf_counter()
+        index = build(size)
+        build_seconds = time.perf_counter() - start
+
+        timings = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            for query in QUERIES:
+                index.search(query, limit=10, min_score=0.3)
+            timings.append((time.perf_counter() - start) * 1000 / len(QUERIES))
+        query_ms = statistics.median(timings)
+        print(f"{size:>10} {build_seconds:>8.2f} {query_ms:>9.3f} {query_ms / (size / 1000):>8.4f}")
+
+
+if __name__ == "__main__":
+    main()
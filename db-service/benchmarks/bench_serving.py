@@ -0,0 +1,98 @@
+"""
+Compare the Werkzeug development server with the gunicorn setup in
+gunicorn.conf.py under the same concurrent load.
+
+The benchmark starts each server itself, one after the other, on the port in
+``BENCH_DB_SERVICE_URL``, then stops it with SIGTERM the way ``docker stop``
+does. Stop any db-service already running on that port first. From the
+db-service directory, with the service's usual ``.env``:
+
+    python -m benchmarks.bench_serving
+    BENCH_CLIENTS=64 WEB_CONCURRENCY=4 python -m benchmarks.bench_serving
+
+``/users/auth`` is CPU bound and shows what extra worker processes buy; the
+other two endpoints mostly wait on Mongo or the in-process catalog.
+"""
+
+import json
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.bench_exercise_catalog import BASE_URL, CLIENTS, REQUESTS, call, percentile
+
+SERVERS = {
+    "werkzeug dev server": [sys.executable, "db_service.py"],
+    "gunicorn": [sys.executable, "-m", "gunicorn", "db_service:app"],
+}
+# pbkdf2 makes every login slow, so it gets a smaller share of the requests.
+AUTH_REQUESTS = max(1, REQUESTS // 10)
+STARTUP_TIMEOUT = 60
+
+
+def wait_until_up(process):
+    """Poll /metrics until the server answers, or fail if it exits first."""
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(BASE_URL + "/metrics", timeout=1):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not answer within {STARTUP_TIMEOUT}s")
+
+
+def post_json(path, body):
+    """POST ``body`` to ``path`` and decode the JSON reply."""
+    req = urllib.request.Request(
+        BASE_URL + path, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read())
+
+
+def run_load(pool, scenario, requests):
+    start = time.perf_counter()
+    samples = list(pool.map(lambda _: scenario(), range(requests)))
+    return requests / (time.perf_counter() - start), samples
+
+
+def bench_server(name, command):
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        wait_until_up(process)
+        credentials = {"username": f"bench_serving_{time.time()}", "password": "bench-password"}
+        user_id = post_json("/users/create", credentials)["user_id"]
+
+        scenarios = [
+            ("GET /exercises/all", lambda: call("/exercises/all"), REQUESTS),
+            ("GET /todo/get/<id>", lambda: call(f"/todo/get/{user_id}"), REQUESTS),
+            ("POST /users/auth", lambda: call("/users/auth", credentials), AUTH_REQUESTS),
+        ]
+        with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+            for endpoint, scenario, requests in scenarios:
+                rate, samples = run_load(pool, scenario, requests)
+                print(
+                    f"{name:<20} {endpoint:<20} {rate:>8.0f} "
+                    f"{statistics.median(samples):>8.2f} {percentile(samples, 95):>8.2f} {percentile(samples, 99):>8.2f}"
+                )
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+
+
+def main():
+    print(f"{CLIENTS} clients, {REQUESTS} requests per endpoint ({AUTH_REQUESTS} for /users/auth)")
+    print(f"{'server':<20} {'endpoint':<20} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, command in SERVERS.items():
+        bench_server(name, command)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+In-process copy of the exercise catalog.
+
+The exercise catalog almost never changes, so the db-service keeps the whole
+of it in memory and serves reads from it. Every write to the catalog bumps a
+revision counter kept by the storage backend (``catalog_meta`` in Mongo);
+each process polls that counter at most once per ``check_interval`` seconds
+and reloads when the revision it holds is out of date.
+
+A trigram index for ranked search lives alongside the snapshots. It survives
+reloads and only the exercises that were added, renamed or removed since the
+previous load are re-indexed.
+
+``AsyncExerciseCatalog`` is the same cache for db_service_async.py, with the
+methods that may touch storage turned into coroutines.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from bson import ObjectId
+from exercise_search import TrigramIndex, exercise_name_keys, normalize_exercise_name
+
+
+class _Snapshot:
+    """One immutable load of the catalog."""
+
+    def __init__(self, revision, exercises):
+        self.revision = revision
+        self.by_id = {}
+        self.by_name = {}
+        self.keys_by_id = {}
+        keys = []
+        for exercise in exercises:
+            stored_keys = exercise.pop("workout_name_keys", None)
+            exercise.pop("workout_name_normalized", None)
+            exercise["_id"] = str(exercise["_id"])
+            self.by_id[exercise["_id"]] = exercise
+            self.by_name.setdefault(normalize_exercise_name(exercise.get("workout_name")), exercise)
+            self.keys_by_id[exercise["_id"]] = stored_keys or exercise_name_keys(exercise.get("workout_name", ""))
+            for key in self.keys_by_id[exercise["_id"]]:
+                keys.append((key, exercise["_id"]))
+        keys.sort()
+        self.keys = keys
+        self.all_payload = json.dumps(
+            [{"_id": ex["_id"], "workout_name": ex.get("workout_name")} for ex in self.by_id.values()]
+        ).encode("utf-8")
+        self.all_etag = f"exercises-{revision}-{hashlib.sha1(self.all_payload).hexdigest()[:16]}"
+
+
+class ExerciseCatalog:
+    """Lazily loaded, revision-checked cache of an exercises repository (see storage.py)."""
+
+    def __init__(self, exercises, check_interval=5.0):
+        self.exercises = exercises
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._trigrams = TrigramIndex()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def _checked_snapshot(self):
+        """The current snapshot if it was checked less than ``check_interval`` ago."""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        return None
+
+    def _install(self, snapshot):
+        self._reindex(self._snapshot, snapshot)
+        self._snapshot = snapshot
+        self.reloads += 1
+
+    def _fresh_snapshot(self):
+        """Return ``(snapshot, reloaded)``, reloading from storage if the revision moved."""
+        snapshot = self._checked_snapshot()
+        if snapshot is not None:
+            return snapshot, False
+
+        with self._lock:
+            snapshot = self._checked_snapshot()
+            if snapshot is not None:
+                return snapshot, False
+
+            revision = self.exercises.revision()
+            self._checked_at = time.monotonic()
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.revision == revision:
+                return snapshot, False
+
+            snapshot = _Snapshot(revision, self.exercises.all())
+            self._install(snapshot)
+            return snapshot, True
+
+    def _reindex(self, previous, current):
+        """Bring the trigram index from ``previous`` to ``current``."""
+        previous_by_id = previous.by_id if previous else {}
+        for exercise_id in previous_by_id.keys() - current.by_id.keys():
+            self._trigrams.remove(exercise_id)
+        for exercise_id, exercise in current.by_id.items():
+            old = previous_by_id.get(exercise_id)
+            if old is None or old.get("workout_name") != exercise.get("workout_name"):
+                self._trigrams.add(exercise_id, exercise.get("workout_name", ""))
+
+    def _count(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def bump_revision(self):
+        """Record a catalog write so every process reloads on its next check."""
+        self.exercises.bump_revision()
+        self._checked_at = 0.0
+
+    def all_payload(self):
+        """
+        The serialized ``[{_id, workout_name}, ...]`` list for /exercises/all
+        and its strong ETag, as ``(payload, etag)``.
+        """
+        snapshot, reloaded = self._fresh_snapshot()
+        self._count(not reloaded)
+        return snapshot.all_payload, snapshot.all_etag
+
+    def get(self, exercise_id):
+        """
+        Look an exercise up by id. Exercises that were written straight to
+        storage without bumping the revision fall back to a storage lookup.
+        """
+        snapshot, reloaded = self._fresh_snapshot()
+        exercise = snapshot.by_id.get(exercise_id)
+        self._count(exercise is not None and not reloaded)
+        if exercise is not None:
+            return exercise
+        return self.exercises.get(exercise_id)
+
+    def get_many(self, exercise_ids):
+        """
+        Map each known id in ``exercise_ids`` to its exercise. Ids missing from
+        the cache are looked up together in a single storage call.
+        """
+        snapshot, reloaded = self._fresh_snapshot()
+        found, missing = self._cached_many(snapshot, reloaded, exercise_ids)
+        if missing:
+            for exercise in self.exercises.get_many(missing):
+                found[exercise["_id"]] = exercise
+        return found
+
+    def _cached_many(self, snapshot, reloaded, exercise_ids):
+        """``(found, missing valid ids)`` for a get_many from ``snapshot``."""
+        found = {}
+        missing = []
+        for exercise_id in exercise_ids:
+            exercise = snapshot.by_id.get(exercise_id)
+            if exercise is not None:
+                found[exercise_id] = exercise
+            elif ObjectId.is_valid(exercise_id):
+                missing.append(exercise_id)
+        self._count(not missing and not reloaded)
+        return found, missing
+
+    def resolve(self, names):
+        """
+        Map each name to the exercise it most likely refers to, or ``None``.
+
+        Exact normalized matches win, including ones only storage knows about
+        (looked up together in a single call). Otherwise the first prefix
+        match is used, and failing that the best ranked match.
+        """
+        snapshot, reloaded = self._fresh_snapshot()
+        resolved, unmatched = self._cached_names(snapshot, reloaded, names)
+        if unmatched:
+            exact = self.exercises.find_by_names(unmatched)
+            self._resolve_unmatched(snapshot, resolved, unmatched, exact)
+        return resolved
+
+    def _cached_names(self, snapshot, reloaded, names):
+        """``(resolved, unmatched names)`` for a resolve from ``snapshot``."""
+        resolved = {}
+        unmatched = []
+        for name in names:
+            exercise = snapshot.by_name.get(normalize_exercise_name(name))
+            resolved[name] = exercise
+            if exercise is None:
+                unmatched.append(name)
+        self._count(not unmatched and not reloaded)
+        return resolved, unmatched
+
+    def _resolve_unmatched(self, snapshot, resolved, unmatched, exact):
+        """Fill in ``unmatched`` names from the ``exact`` matches storage found, then by prefix, then ranked."""
+        by_normalized = {}
+        for exercise in exact:
+            by_normalized.setdefault(normalize_exercise_name(exercise.get("workout_name")), exercise)
+
+        for name in unmatched:
+            exercise = by_normalized.get(normalize_exercise_name(name))
+            if exercise is None:
+                prefix_matches, _ = self._prefix_matches(snapshot, name, 1)
+                exercise = prefix_matches[0] if prefix_matches else None
+            if exercise is None:
+                ranked = self._trigrams.search(name, limit=1, min_score=0.5)
+                exercise = snapshot.by_id.get(ranked[0][0]) if ranked else None
+            resolved[name] = exercise
+
+    @staticmethod
+    def _prefix_matches(snapshot, query, limit=None, after=None):
+        """
+        Exercises in ``snapshot`` with a word starting with ``query``.
+
+        Each exercise is listed once, under its first matching key, so the
+        ``(key, id)`` of the last result is a stable cursor: pass it back as
+        ``after`` to continue. Returns ``(results, cursor or None)``.
+        """
+        prefix = normalize_exercise_name(query)
+        start = (prefix,) if after is None else tuple(after)
+        position = bisect_right(snapshot.keys, start) if after is not None else bisect_left(snapshot.keys, start)
+        results = []
+        last = None
+        for key, exercise_id in snapshot.keys[position:]:
+            if not key.startswith(prefix):
+                return results, None
+            first_key = min(k for k in snapshot.keys_by_id[exercise_id] if k.startswith(prefix))
+            if key != first_key:
+                continue
+            if len(results) == limit:
+                return results, last
+            results.append(snapshot.by_id[exercise_id])
+            last = (key, exercise_id)
+        return results, None
+
+    def search(self, query, limit=None, after=None):
+        """
+        Exercises with a word starting with ``query``, ordered by the matched
+        word, as ``(results, next cursor or None)``.
+        """
+        snapshot, reloaded = self._fresh_snapshot()
+        self._count(not reloaded)
+        return self._prefix_matches(snapshot, query, limit, after)
+
+    def ranked_search(self, query, limit=10, min_score=0.3):
+        """The ``limit`` exercises closest to ``query``, each with its ``score``."""
+        snapshot, reloaded = self._fresh_snapshot()
+        self._count(not reloaded)
+        return self._ranked_matches(snapshot, query, limit, min_score)
+
+    def _ranked_matches(self, snapshot, query, limit, min_score):
+        results = []
+        for exercise_id, score in self._trigrams.search(query, limit, min_score):
+            exercise = snapshot.by_id.get(exercise_id)
+            if exercise is not None:
+                results.append({**exercise, "score": round(score, 3)})
+        return results
+
+    def stats(self):
+        """Cache counters for the stats endpoint."""
+        snapshot = self._snapshot
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "revision": snapshot.revision if snapshot else None,
+            "size": len(snapshot.by_id) if snapshot else 0,
+        }
+
+
+class AsyncExerciseCatalog(ExerciseCatalog):
+    """
+    ExerciseCatalog over an async exercises repository. Requests that find the
+    cache stale wait for a single reload rather than each running their own.
+
+    The reload lock is made on first use: the catalog is built at import time,
+    and on Python 3.9 an asyncio.Lock binds to the loop current when it is
+    created, not the one the worker serves on.
+    """
+
+    def __init__(self, exercises, check_interval=5.0):
+        super().__init__(exercises, check_interval)
+        self._lock = None
+
+    def _reload_lock(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _fresh_snapshot(self):
+        snapshot = self._checked_snapshot()
+        if snapshot is not None:
+            return snapshot, False
+
+        async with self._reload_lock():
+            snapshot = self._checked_snapshot()
+            if snapshot is not None:
+                return snapshot, False
+
+            revision = await self.exercises.revision()
+            self._checked_at = time.monotonic()
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.revision == revision:
+                return snapshot, False
+
+            snapshot = _Snapshot(revision, await self.exercises.all())
+            self._install(snapshot)
+            return snapshot, True
+
+    async def bump_revision(self):
+        await self.exercises.bump_revision()
+        self._checked_at = 0.0
+
+    async def all_payload(self):
+        snapshot, reloaded = await self._fresh_snapshot()
+        self._count(not reloaded)
+        return snapshot.all_payload, snapshot.all_etag
+
+    async def get(self, exercise_id):
+        snapshot, reloaded = await self._fresh_snapshot()
+        exercise = snapshot.by_id.get(exercise_id)
+        self._count(exercise is not None and not reloaded)
+        if exercise is not None:
+            return exercise
+        return await self.exercises.get(exercise_id)
+
+    async def get_many(self, exercise_ids):
+        snapshot, reloaded = await self._fresh_snapshot()
+        found, missing = self._cached_many(snapshot, reloaded, exercise_ids)
+        if missing:
+            for exercise in await self.exercises.get_many(missing):
+                found[exercise["_id"]] = exercise
+        return found
+
+    async def resolve(self, names):
+        snapshot, reloaded = await self._fresh_snapshot()
+        resolved, unmatched = self._cached_names(snapshot, reloaded, names)
+        if unmatched:
+            exact = await self.exercises.find_by_names(unmatched)
+            self._resolve_unmatched(snapshot, resolved, unmatched, exact)
+        return resolved
+
+    async def search(self, query, limit=None, after=None):
+        snapshot, reloaded = await self._fresh_snapshot()
+        self._count(not reloaded)
+        return self._prefix_matches(snapshot, query, limit, after)
+
+    async def ranked_search(self, query, limit=10, min_score=0.3):
+        snapshot, reloaded = await self._fresh_snapshot()
+        self._count(not reloaded)
+        return self._ranked_matches(snapshot, query, limit, min_score)
@@ -1,157 +1,161 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 import os
-from datetime import datetime, timedelta
-from pymongo import MongoClient
-from bson import ObjectId
-import certifi
+import logging
+from pymongo.errors import PyMongoError
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
+import api
+from api import ApiError
+from catalog import ExerciseCatalog
+from month_summary import MonthSummaryCache
+from todo_export import EXPORT_BATCH_SIZE, EXPORT_FORMATS
+from todo_bulk import fill_results, group_items_by_day
+from user_stats import summarize
+from indexes import SEARCH_HISTORY_MAX_ENTRIES
+from json_provider import OrjsonProvider
+from structured_logging import configure_logging
+from metrics import instrument_app
+from mongo_monitoring import CommandMetrics, PoolMetrics
+from mongo_settings import client_options
+from storage import open_storage
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+configure_logging("db-service")
+instrument_app(app)
+logger = logging.getLogger(__name__)
 load_dotenv()
 
-mongo_uri = os.getenv("TEST_MONGO_URI") if os.getenv("ENV") == "TEST" else os.getenv("MONGO_URI")
-db_name = os.getenv("TEST_DB_NAME") if os.getenv("ENV") == "TEST" else os.getenv("DB_NAME")
+mongo_options = client_options()
+pool_metrics = PoolMetrics()
+# DB_BACKEND picks Mongo (the default) or the in-memory backend; see storage.py.
+storage = open_storage(mongo_options, event_listeners=[CommandMetrics(), pool_metrics])
 
-client = MongoClient(mongo_uri, tls=True, tlsCAFile=certifi.where())
-db = client[db_name]
+# Creating indexes that already exist is a no-op, so this runs on every start.
+# Set VERIFY_INDEXES=1 to refuse to start when a hot query would COLLSCAN.
+storage.prepare(verify=os.getenv("VERIFY_INDEXES") == "1")
 
-todo_collection = db["todo"]
-exercises_collection = db["exercises"]
-users_collection = db["users"]
-search_history_collection = db["search_history"]
-edit_transcription_collection = db["edit_transcription"]
-plan_collection = db["plans"]
+exercise_catalog = ExerciseCatalog(
+    storage.exercises,
+    check_interval=float(os.getenv("CATALOG_CHECK_INTERVAL", "5"))
+)
+month_summaries = MonthSummaryCache(
+    storage.todo.month_summary,
+    storage.stats.month_version,
+    ttl=float(os.getenv("MONTH_SUMMARY_TTL", "60"))
+)
 
 
+@app.errorhandler(ApiError)
+def api_error(e):
+    return jsonify(e.body), e.status
 
-def add_or_skip_todo(user_id):
 
+# How long /readyz waits for Mongo to answer.
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "2"))
+
+def ping_storage():
+    storage.ping(READY_TIMEOUT)
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """
+    Liveness: the process answers requests. Mongo is left out on purpose, so
+    an outage takes workers out of rotation (/readyz) instead of restarting them.
+    """
+    return jsonify({"status": "ok"}), 200
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """
+    Readiness: 200 once Mongo answers a ping within READY_TIMEOUT seconds, 503
+    otherwise. The memory backend is always ready.
+    """
     try:
-        today_date = datetime.utcnow().strftime("%Y-%m-%d")
-        
-        existing_todo = todo_collection.find_one({
-            "user_id": str(user_id),
-            "date": {
-                "$gte": datetime.strptime(today_date, "%Y-%m-%d"),
-                "$lt": datetime.strptime(today_date, "%Y-%m-%d") + timedelta(days=1)
-            }
-        })
-        
-        if existing_todo:
-            print(f"DEBUG: To-Do entry already exists for user {user_id} on {today_date}.")
-            return {"message": "To-Do entry already exists", "exists": True}
-        
-        time = datetime.utcnow()
-        target_date = datetime.strptime(date, "%Y-%m-%d").replace(hour=0, minute=0, second=0, microsecond=0)
-        todo_collection.insert_one({
-            "user_id": str(user_id),
-            "date": target_date,
-            "todo": []
-        })
-        
-        print(f"DEBUG: New To-Do entry created for user {user_id} on {today_date}.")
-        return {"message": "New To-Do entry created", "created": True}
-    
-    except Exception as e:
-        print(f"ERROR: Failed to add or skip To-Do entry: {e}")
-        return {"message": "An error occurred", "error": str(e)}
+        ping_storage()
+    except PyMongoError as e:
+        logger.warning("Readiness check failed: %s", e)
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+    return jsonify({"status": "ready"}), 200
+
+@app.route("/mongo/pool/stats", methods=["GET"])
+def mongo_pool_stats():
+    """Connection pool counters and recent checkout wait percentiles of this worker."""
+    return jsonify({
+        **pool_metrics.stats(),
+        "max_pool_size": mongo_options["maxPoolSize"],
+        "wait_queue_timeout_ms": mongo_options["waitQueueTimeoutMS"],
+    }), 200
+
 
 @app.route("/users/get/<user_id>", methods=["GET"])
 def get_user(user_id):
     """Retrieve user information by ID."""
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
+    user = storage.users.get(user_id)
     if user:
-        user["_id"] = str(user["_id"])
         return jsonify(user)
     return jsonify({"error": "User not found"}), 404
 
 @app.route("/users/create", methods=["POST"])
 def create_user():
     """Create a new user account."""
+    username, password = api.create_user_request(request.json)
     try:
-        data = request.json
-        username = data.get("username")
-        password = data.get("password")
-
-        if not username or not password:
-            return jsonify({"message": "Username and password are required!"}), 400
-
-        if users_collection.find_one({"username": username}):
-            return jsonify({"message": "Username already exists!"}), 400
+        if storage.users.find_by_username(username):
+            return jsonify(api.USERNAME_TAKEN), 400
 
         hashed_password = generate_password_hash(password, method="pbkdf2:sha256")
-        user_data = {"username": username, "password": hashed_password}
-
-        user_id = users_collection.insert_one(user_data).inserted_id
-        print(f"user id is :", str(user_id))
-        return jsonify({"user_id": str(user_id)}), 200
+        user_id = storage.users.create({"username": username, "password": hashed_password})
+        logger.info("Created user %s", user_id)
+        return jsonify({"user_id": user_id}), 200
 
-    except Exception as e:
-        print(f"Error creating user: {e}")
+    except Exception:
+        logger.exception("Error creating user")
         return jsonify({"message": "Internal server error"}), 500
 
 @app.route("/users/auth", methods=["POST"])
 def authenticate_user():
     """Authenticate user login credentials."""
-    data = request.json
-    username = data.get("username")
-    password = data.get("password") 
-
-    if not username or not password:
-        return jsonify({"error": "Username and password are required"}), 400
-
-    user = users_collection.find_one({"username": username})
+    username, password = api.auth_request(request.json)
+    user = storage.users.find_by_username(username)
     if user and check_password_hash(user["password"], password):
-        user["_id"] = str(user["_id"])
-        add_or_skip_todo(user["_id"])
         return jsonify(user), 200
-    return jsonify({"error": "Invalid username or password"}), 401
+    return jsonify(api.INVALID_LOGIN), 401
 
 @app.route("/todo/get/<string:user_id>", methods=["GET"])
 def get_todo(user_id):
     """
     获取用户当天的 To-Do 数据 (仅比较年月日)
+    Day documents are only created by the first add, so a missing one is an empty day.
     """
     try:
-        today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start + timedelta(days=1)
-
-        print(f"DEBUG: Today start: {today_start}, Today end: {today_end}")
-
-        todo_data = todo_collection.find_one({
-            "user_id": user_id,
-            "date": {
-                "$gte": today_start,
-                "$lt": today_end
-            }
-        })
-
-        if todo_data:
-            print(f"INFO: Found To-Do data for user {user_id}: {todo_data}")
-
-            import copy
-            todo_data = copy.deepcopy(todo_data)
-
-            todo_data["_id"] = str(todo_data["_id"])
-            for item in todo_data.get("todo", []):
-                if "exercise_todo_id" in item:
-                    item["exercise_todo_id"] = str(item["exercise_todo_id"])
-                if "exercise_id" in item:
-                    item["exercise_id"] = str(item["exercise_id"])
-                if "time" in item and isinstance(item["time"], datetime):
-                    item["time"] = item["time"].strftime("%Y-%m-%d")
-
-            print(f"DEBUG: Final To-Do data for response: {todo_data}")
-            return jsonify(todo_data), 200
-
-        print(f"WARNING: No To-Do data found for user {user_id} on {today_start.date()}")
-        return jsonify({"error": "Todo not found"}), 404
+        today_start = api.today()
+        todo_data = storage.todo.get_day(user_id, today_start)
+        logger.debug("To-Do data for user %s on %s: %s", user_id, today_start.date(), todo_data)
+        return jsonify(todo_data or api.empty_day(user_id, today_start)), 200
 
     except Exception as e:
-        print(f"ERROR: Exception occurred while fetching To-Do data: {e}")
+        logger.exception("Failed to fetch To-Do data for user %s", user_id)
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
+def record_todo_counts(user_id, counts_by_day):
+    """
+    Apply item count changes to the user's stats and stamp the months they
+    touched, so every worker's month calendar cache sees the write. The todo
+    write has already happened, so a failure is logged rather than failing
+    the request, and the user's stats are dropped to be counted again from
+    their todos on the next read.
+    """
+    try:
+        storage.stats.increment(user_id, counts_by_day)
+    except Exception:
+        logger.exception("Failed to update stats for user %s; recounting them on the next read", user_id)
+        try:
+            storage.stats.discard(user_id)
+        except Exception:
+            logger.exception("Failed to discard stats for user %s; run rebuild-user-stats", user_id)
+
+
 @app.route("/todo/add", methods=["POST"])
 def add_todo():
     """
@@ -159,86 +163,53 @@ def add_todo():
     如果记录不存在，直接创建新记录；如果存在，直接更新。
     """
     data = request.json
-    print(f"DEBUG: Received data: {data}")  
+    logger.debug("Received todo: %s", data)
+    user_id, date, exercise_item = api.add_todo_request(data)
 
-    user_id = data.get("user_id")
-    exercise_item = data.get("exercise_item")
-    date = data.get("date")  
+    try:
+        target_date = api.parse_day(date)
+        created = storage.todo.push_item(user_id, target_date, exercise_item)
+        body, status = api.add_todo_response(created)
+        if body["success"]:
+            record_todo_counts(user_id, {target_date: 1})
+        logger.debug("Add result - success: %s, created: %s", body["success"], created)
+        return jsonify(body), status
 
-    if not user_id or not exercise_item or not date:
-        print(f"ERROR: Missing required fields - user_id: {user_id}, exercise_item: {exercise_item}, date: {date}")
-        return jsonify({"error": "user_id, date, and exercise_item are required"}), 400
+    except Exception as e:
+        logger.exception("Failed to add todo item for user %s", user_id)
+        return jsonify({"error": "An error occurred", "message": str(e)}), 500
 
+@app.route("/todo/add_bulk", methods=["POST"])
+def add_todo_bulk():
+    """
+    Add many todo items for one user in a single request.
+    Body: {"user_id": ..., "items": [{"date": "YYYY-MM-DD", "exercise_item": {...}}, ...]}
+    Returns one result per item, in request order.
+    """
+    user_id, items = api.add_todo_bulk_request(request.json)
+    results, items_by_day, positions_by_day = group_items_by_day(items)
     try:
-        target_date = datetime.strptime(date, "%Y-%m-%d").replace(hour=0, minute=0, second=0, microsecond=0)
-        print(f"DEBUG: Parsed target_date: {target_date}")
-
-        existing_todo = todo_collection.find_one({
-            "user_id": user_id,
-            "date": {
-                "$gte": target_date,
-                "$lt": target_date + timedelta(days=1)
-            }
-        })
-        print(f"DEBUG: Existing todo record: {existing_todo}")
-
-        if existing_todo:
-            print(f"DEBUG: Updating existing todo for user_id: {user_id}, date: {target_date}")
-            result = todo_collection.update_one(
-                {"_id": existing_todo["_id"]},
-                {"$push": {"todo": exercise_item}}
-            )
-            success = result.modified_count > 0
-            message = "New todo item added to existing entry" if success else "Failed to add todo item"
-            print(f"DEBUG: Update result - success: {success}, modified_count: {result.modified_count}")
-        else:
-            print(f"DEBUG: Creating new todo entry for user_id: {user_id}, date: {target_date}")
-            new_todo = {
-                "user_id": user_id,
-                "date": target_date,
-                "todo": [exercise_item]
-            }
-            result = todo_collection.insert_one(new_todo)
-            success = result.inserted_id is not None
-            message = "New todo entry created" if success else "Failed to create new todo entry"
-            print(f"DEBUG: Insert result - success: {success}, inserted_id: {result.inserted_id if success else None}")
-
-        return jsonify({"success": success, "message": message}), 200 if success else 400
-
+        errors = storage.todo.push_items(user_id, items_by_day) if items_by_day else {}
     except Exception as e:
-        print(f"ERROR: Failed to add todo item: {e}")
+        logger.exception("Failed to add todo items in bulk for user %s", user_id)
         return jsonify({"error": "An error occurred", "message": str(e)}), 500
 
+    record_todo_counts(user_id, api.added_counts(items_by_day, errors))
+    return jsonify(fill_results(results, positions_by_day, errors)), 200
+
 @app.route("/todo/get_exercise_by_id", methods=["GET"])
 def get_exercise_by_id():
     """
     获取用户特定日期的特定 To-Do 项
     """
-    user_id = request.args.get("user_id")
-    date = request.args.get("date")
-    exercise_todo_id = request.args.get("exercise_todo_id")
-
-    if not user_id or not date or not exercise_todo_id:
-        return jsonify({"error": "user_id, date, and exercise_todo_id are required"}), 400
-
+    user_id, date, exercise_todo_id = api.get_exercise_by_id_request(request.args)
     try:
-        target_date = datetime.strptime(date, "%Y-%m-%d").replace(hour=0, minute=0, second=0, microsecond=0)
-
-        todo_data = todo_collection.find_one({
-            "user_id": user_id,
-            "date": target_date,
-            "todo.exercise_todo_id": exercise_todo_id
-        })
+        item = storage.todo.find_item(user_id, api.parse_day(date), exercise_todo_id)
+        body, status = api.found(item, "Exercise not found")
+        return jsonify(body), status
 
-        if todo_data:
-            for item in todo_data.get("todo", []):
-                if item.get("exercise_todo_id") == exercise_todo_id:
-                    return jsonify(item), 200
-
-        return jsonify({"error": "Exercise not found"}), 404
-
-    except Exception as e:
-        print(f"Error fetching exercise: {e}")
+    except Exception:
+        logger.exception("Error fetching todo exercise")
         return jsonify({"error": "Internal server error"}), 500
 
 @app.route("/todo/update_exercise", methods=["POST"])
@@ -246,202 +217,231 @@ def update_exercise():
     """
     更新用户特定 To-Do 项的字段
     """
-    data = request.json
-    user_id = data.get("user_id")
-    date = data.get("date")
-    exercise_todo_id = data.get("exercise_todo_id")
-    update_fields = data.get("update_fields", {})
-
-    if not user_id or not date or not exercise_todo_id or not update_fields:
-        return jsonify({"error": "user_id, date, exercise_todo_id, and update_fields are required"}), 400
-
+    user_id, date, exercise_todo_id, update_fields = api.update_exercise_request(request.json)
     try:
-        target_date = datetime.strptime(date, "%Y-%m-%d").replace(hour=0, minute=0, second=0, microsecond=0)
-
-        result = todo_collection.update_one(
-            {
-                "user_id": user_id,
-                "date": target_date,
-                "todo.exercise_todo_id": exercise_todo_id
-            },
-            {
-                "$set": {
-                    **{f"todo.$.{key}": value for key, value in update_fields.items()}
-                }
-            }
-        )
-
-        if result.modified_count > 0:
-            return jsonify({"success": True, "message": "Exercise updated successfully"}), 200
-        return jsonify({"success": False, "message": "No matching exercise found"}), 404
-
-    except Exception as e:
-        print(f"Error updating exercise: {e}")
+        target_date = api.parse_day(date)
+        updated = storage.todo.update_item(user_id, target_date, exercise_todo_id, update_fields)
+        if updated:
+            # No count changes, but the month calendar may show the new name.
+            record_todo_counts(user_id, {target_date: 0})
+        body, status = api.update_exercise_response(updated)
+        return jsonify(body), status
+
+    except Exception:
+        logger.exception("Error updating todo exercise %s", exercise_todo_id)
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route("/todo/get-item/<user_id>/<int:exercise_todo_id>", methods=["GET"])
+@app.route("/todo/get-item/<user_id>/<exercise_todo_id>", methods=["GET"])
 def get_todo_item(user_id, exercise_todo_id):
-    """Get a specific todo item."""
-    todo = todo_collection.find_one({"user_id": user_id})
-    if todo:
-        for item in todo.get("todo", []):
-            if item.get("exercise_todo_id") == exercise_todo_id:
-                return jsonify(item), 200
-    return jsonify({"error": "Todo item not found"}), 404
+    """Get a specific todo item from the day given as ?date=YYYY-MM-DD."""
+    target_date = api.todo_item_request(request.args)
+    body, status = api.found(storage.todo.find_item(user_id, target_date, exercise_todo_id), "Todo item not found")
+    return jsonify(body), status
 
 @app.route("/exercises/search", methods=["POST"])
 def search_exercises():
-    """Search exercises based on query."""
-    query = request.json.get("query", "")
-    normalized_query = query.lower().replace(" ", "").replace("-", "")
-    exercises = exercises_collection.find({
-        "$expr": {
-            "$regexMatch": {
-                "input": {
-                    "$toLower": {
-                        "$replaceAll": {
-                            "input": {
-                                "$replaceAll": {
-                                    "input": "$workout_name",
-                                    "find": "-",
-                                    "replacement": ""
-                                }
-                            },
-                            "find": " ",
-                            "replacement": ""
-                        }
-                    }
-                },
-                "regex": normalized_query,
-                "options": "i"
-            }
-        }
-    })
-    return jsonify([{**ex, "_id": str(ex["_id"])} for ex in exercises]), 200
+    """
+    Search exercises by name.
+
+    By default exercises with a word starting with the query are returned a
+    page at a time (``limit``, default 50); pass the X-Next-Cursor header of a
+    page back as ``after`` to get the next one. With ``"mode": "ranked"`` the best ``limit`` fuzzy matches scoring at least
+    ``min_score`` are returned, best first, each with its ``score``.
+    """
+    query, ranked, limit, option = api.search_request(request.json)
+    if ranked:
+        return jsonify(exercise_catalog.ranked_search(query, limit, option)), 200
+    body, headers = api.search_response(*exercise_catalog.search(query, limit, option))
+    return jsonify(body), 200, headers
+
+@app.route("/exercises/get_many", methods=["POST"])
+def get_many_exercises():
+    """Look up a batch of exercises by id. Returns ``{id: exercise}`` for the ids found."""
+    return jsonify(exercise_catalog.get_many(api.get_many_request(request.json))), 200
+
+@app.route("/exercises/resolve", methods=["POST"])
+def resolve_exercises():
+    """Resolve a batch of exercise names. Returns ``{name: exercise or null}``."""
+    return jsonify(exercise_catalog.resolve(api.resolve_request(request.json))), 200
+
+@app.route("/exercises/add", methods=["POST"])
+def add_exercise():
+    """Add an exercise to the catalog."""
+    exercise_id = storage.exercises.add(api.add_exercise_request(request.json))
+    exercise_catalog.bump_revision()
+    return jsonify({"id": exercise_id}), 200
+
+@app.route("/exercises/update/<exercise_id>", methods=["PUT"])
+def update_exercise_details(exercise_id):
+    """Update an exercise, keeping its search fields in sync with the name."""
+    data = api.update_exercise_details_request(request.json)
+    try:
+        updated = storage.exercises.update(exercise_id, data)
+        if updated:
+            exercise_catalog.bump_revision()
+        return jsonify({"success": updated}), 200
+    except Exception:
+        logger.exception("Error updating exercise %s", exercise_id)
+        return jsonify({"error": "Failed to update exercise"}), 500
 
 @app.route("/exercises/get/<exercise_id>", methods=["GET"])
 def get_exercise(exercise_id):
     """Get exercise details by ID."""
-    exercise = exercises_collection.find_one({"_id": ObjectId(exercise_id)})
-    if exercise:
-        exercise["_id"] = str(exercise["_id"])
-        return jsonify(exercise), 200
-    return jsonify({"error": "Exercise not found"}), 404
+    body, status = api.found(exercise_catalog.get(exercise_id), "Exercise not found")
+    return jsonify(body), status
 
 @app.route("/search-history/add", methods=["POST"])
 def add_search_history():
-    """Add a search query to user's search history."""
-    data = request.json
-    user_id = data.get("user_id")
-    content = data.get("content")
-
-    if not user_id or not content:
-        return jsonify({"error": "user_id and content are required"}), 400
-
-    search_entry = {
-        "user_id": user_id,
-        "content": content,
-        "time": datetime.utcnow()
-    }
-    result = search_history_collection.insert_one(search_entry)
-    return jsonify({"success": bool(result.inserted_id)}), 200
+    """Record a search query in the user's search history."""
+    user_id, content = api.add_search_history_request(request.json)
+    # Repeats of a search bump its entry; new ones may push the oldest out.
+    storage.search_history.record(user_id, content, SEARCH_HISTORY_MAX_ENTRIES)
+    return jsonify({"success": True}), 200
 
 @app.route("/search-history/get/<user_id>", methods=["GET"])
 def get_search_history(user_id):
-    """Retrieve user's search history."""
-    history = search_history_collection.find(
-        {"user_id": user_id}
-    ).sort("time", -1)
-    return jsonify([{**h, "_id": str(h["_id"])} for h in history]), 200
+    """Retrieve a page of the user's search history, newest first."""
+    after, limit = api.search_history_request(request.args)
+    history = storage.search_history.page(user_id, after, limit + 1)
+    body, headers = api.search_history_response(history, limit)
+    return jsonify(body), 200, headers
 
 @app.route("/transcriptions/add", methods=["POST"])
 def add_transcription():
     """Add a new transcription entry."""
-    data = request.json
-    user_id = data.get("user_id")
-    content = data.get("content")
-
-    if not user_id or not content:
-        return jsonify({"error": "user_id and content are required"}), 400
-
-    transcription_entry = {
-        "user_id": user_id,
-        "content": content,
-        "time": datetime.utcnow()
-    }
-    result = edit_transcription_collection.insert_one(transcription_entry)
-    if result.inserted_id:
-        return jsonify({"id": str(result.inserted_id)}), 200
+    transcription_id = storage.transcriptions.add(api.transcription_request(request.json))
+    if transcription_id:
+        return jsonify({"id": transcription_id}), 200
     return jsonify({"error": "Failed to save transcription"}), 500
+
 @app.route("/users/update/<user_id>", methods=["PUT"])
 def update_user(user_id):
     data = request.json
     try:
-        result = users_collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": data}
-        )
-        return jsonify({"success": result.modified_count > 0}), 200
-    except Exception as e:
-        print(f"Error updating user: {e}")
+        return jsonify({"success": storage.users.update(user_id, data)}), 200
+    except Exception:
+        logger.exception("Error updating user %s", user_id)
         return jsonify({"error": "Failed to update user"}), 500
 
 @app.route("/exercises/all", methods=["GET"])
 def get_all_exercises():
-    exercises = list(exercises_collection.find({}, {"workout_name": 1, "_id": 1}))
-    for exercise in exercises:
-        exercise["_id"] = str(exercise["_id"])
-    return jsonify(exercises), 200
+    """
+    Return the id and name of every exercise, pre-serialized by the catalog cache.
+    Clients revalidate with If-None-Match and get a bodiless 304 while the
+    catalog is unchanged.
+    """
+    payload, etag = exercise_catalog.all_payload()
+    response = app.response_class(payload, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+@app.route("/exercises/catalog/stats", methods=["GET"])
+def get_exercise_catalog_stats():
+    """Report exercise catalog cache hits, misses and reloads."""
+    return jsonify(exercise_catalog.stats()), 200
 
 @app.route("/todo/<user_id>", methods=["GET"])
 def get_todos(user_id):
     """
-    返回指定用户的 To-Do 数据
+    返回指定用户的 To-Do 数据, oldest day first, a page at a time.
+    Optional start_date/end_date (YYYY-MM-DD) narrow the days returned.
     """
+    start, end, after, limit = api.todo_history_request(request.args)
     try:
-        todos = list(todo_collection.find({"user_id": user_id}))
-        for todo in todos:
-            todo["_id"] = str(todo["_id"])
-            if "todo" in todo:
-                for item in todo["todo"]:
-                    if "time" in item:
-                        item["time"] = datetime.fromisoformat(item["time"]).strftime("%Y-%m-%d")
-        return jsonify(todos), 200
-    except Exception as e:
-        print(f"ERROR: Failed to retrieve todos for user {user_id}: {e}")
+        todos = storage.todo.history(user_id, start, end, after, limit + 1)
+        body, headers = api.todo_history_response(todos, limit)
+        return jsonify(body), 200, headers
+    except Exception:
+        logger.exception("Failed to retrieve todos for user %s", user_id)
         return jsonify({"error": "Failed to retrieve todos"}), 500
 
-@app.route("/todo/get_by_date/<string:user_id>", methods=["GET"])
-def get_todo_by_date(user_id):
+@app.route("/todo/export/<user_id>", methods=["GET"])
+def export_todos(user_id):
     """
-    获取用户在特定日期范围内的 To-Do 数据。
+    Stream the user's whole todo history, oldest day first, as NDJSON (one day
+    per line, the default) or ?format=csv (one item per row). Optional
+    start_date/end_date (YYYY-MM-DD) narrow the days.
     """
-    start_date = request.args.get("start_date")
-    end_date = request.args.get("end_date")
-
-    if not start_date or not end_date:
-        return jsonify({"error": "start_date and end_date are required"}), 400
+    export_format, start, end = api.export_request(request.args)
+    chunks, mimetype = EXPORT_FORMATS[export_format]
+
+    def generate():
+        days = storage.todo.export_days(user_id, start, end, EXPORT_BATCH_SIZE)
+        try:
+            yield from chunks(days)
+        except Exception:
+            # Headers are already sent, so the client only sees a cut-off body.
+            logger.exception("Todo export for user %s failed part way", user_id)
+            raise
+        finally:
+            days.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers=api.export_headers(user_id, export_format)
+    )
+
+@app.route("/todo/stats/daily/<user_id>", methods=["GET"])
+def get_daily_todo_stats(user_id):
+    """
+    Number of todo items per day, as {"YYYY-MM-DD": count}, for the days that
+    have any. Optional start_date/end_date (YYYY-MM-DD) narrow the days.
+    """
+    start_date, end_date = api.daily_stats_request(request.args)
+    try:
+        return jsonify(api.days_between(storage.stats.days(user_id), start_date, end_date)), 200
+    except Exception:
+        logger.exception("Failed to count todos for user %s", user_id)
+        return jsonify({"error": "Failed to retrieve todo stats"}), 500
 
+@app.route("/todo/stats/<user_id>", methods=["GET"])
+def get_todo_stats(user_id):
+    """
+    Dashboard totals: items planned, active days and the current and longest
+    streak of consecutive active days. ``today`` (YYYY-MM-DD, default the UTC
+    date) sets where the current streak ends.
+    """
+    today = api.todo_stats_request(request.args)
     try:
-        start_date_dt = datetime.strptime(start_date, "%Y-%m-%d").replace(hour=0, minute=0, second=0, microsecond=0)
-        end_date_dt = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=0, minute=0, second=0, microsecond=0)
+        return jsonify(summarize(storage.stats.get(user_id), today)), 200
+    except Exception:
+        logger.exception("Failed to read stats for user %s", user_id)
+        return jsonify({"error": "Failed to retrieve todo stats"}), 500
 
-        todos = list(todo_collection.find({
-            "user_id": user_id,
-            "date": {
-                "$gte": start_date_dt,
-                "$lt": end_date_dt + timedelta(days=1)
-            }
-        }))
+@app.route("/todo/calendar/month/<user_id>", methods=["GET"])
+def get_month_calendar(user_id):
+    """
+    Week-by-week preview of a month (?month=YYYY-MM) for the month calendar:
+    {"YYYY-MM-DD" week start: [first workout names]}, weeks starting on the 1st.
+    """
+    month_start = api.month_calendar_request(request.args)
+    try:
+        return jsonify(month_summaries.get(user_id, month_start)), 200
+    except Exception:
+        logger.exception("Failed to build month calendar for user %s", user_id)
+        return jsonify({"error": "Failed to build month calendar"}), 500
 
-        for todo in todos:
-            todo["_id"] = str(todo["_id"])
-            todo["date"] = todo["date"].strftime("%Y-%m-%d")
+@app.route("/todo/calendar/stats", methods=["GET"])
+def month_calendar_stats():
+    """Hit/miss counters of the month calendar cache."""
+    return jsonify(month_summaries.stats()), 200
 
-        return jsonify(todos), 200
+@app.route("/todo/get_by_date/<string:user_id>", methods=["GET"])
+def get_todo_by_date(user_id):
+    """
+    获取用户在特定日期范围内的 To-Do 数据。
+    Optional ``fields`` (comma separated item fields) and ``max_items`` trim
+    each day's todo list to what the caller renders.
+    """
+    start_date, end_date, fields, max_items = api.todo_by_date_request(request.args)
+    try:
+        start, end = api.day_range(start_date, end_date)
+        return jsonify(storage.todo.between(user_id, start, end, fields, max_items)), 200
 
     except Exception as e:
-        print(f"ERROR: Failed to get todos by date for user {user_id}: {e}")
+        logger.exception("Failed to get todos by date for user %s", user_id)
         return jsonify({"error": "An error occurred", "message": str(e)}), 500
 
 @app.route('/plan/save', methods=['POST'])
@@ -449,27 +449,13 @@ def save_plan():
     """
     保存计划到数据库
     """
+    plan_entry = api.save_plan_request(request.json)
     try:
-        data = request.json
-        user_id = data.get("user_id")
-        plan_data = data.get("plan")
-
-        if not user_id or not plan_data:
-            return jsonify({"success": False, "message": "user_id and plan data are required"}), 400
-
-        date = datetime.utcnow().strftime("%Y-%m-%d")
-
-        plan_entry = {
-            "user_id": user_id,
-            "date": date,  
-            "plan": plan_data
-        }
-        plan_collection.insert_one(plan_entry)
-
+        storage.plans.add(plan_entry)
         return jsonify({"success": True, "message": "Plan saved successfully"}), 201
 
     except Exception as e:
-        print(f"Error saving plan: {e}")
+        logger.exception("Error saving plan")
         return jsonify({"success": False, "message": str(e)}), 500
 
 @app.route('/todo/delete_exercise', methods=['POST'])
@@ -477,42 +463,18 @@ def delete_exercise_from_date():
     """
     根据用户 ID 和日期从数据库中删除指定的 exercise_id
     """
-    data = request.json
-    user_id = data.get("user_id") 
-    date = data.get("date")  
-    exercise_id = data.get("exercise_id") 
-
-    if not user_id or not date or not exercise_id:
-        print("DEBUG: Missing user_id, date, or exercise_id in request")
-        return jsonify({"success": False, "message": "user_id, date, and exercise_id are required"}), 400
-
+    user_id, date, exercise_id = api.delete_exercise_request(request.json)
     try:
-        target_date = datetime.strptime(date, "%Y-%m-%d").replace(hour=0, minute=0, second=0, microsecond=0)
-
-        print(f"DEBUG: Looking up todos for User ID: {user_id}, Date: {target_date}")
-
-        user_todo = todo_collection.find_one({"user_id": user_id, "date": target_date})
-
-        if not user_todo:
-            print(f"DEBUG: No todos found for User ID: {user_id} on Date: {target_date}")
-            return jsonify({"success": False, "message": "No todos found for the specified date"}), 404
-
-        print(f"DEBUG: Found todos: {user_todo['todo']}")
-
-        result = todo_collection.update_one(
-            {"user_id": user_id, "date": target_date},
-            {"$pull": {"todo": {"exercise_todo_id": exercise_id}}}
-        )
-
-        if result.modified_count > 0:
-            print(f"DEBUG: Successfully deleted exercise. User ID: {user_id}, Exercise ID: {exercise_id}")
-            return jsonify({"success": True, "message": "Exercise deleted successfully"}), 200
-
-        print(f"DEBUG: Exercise ID: {exercise_id} not found in User ID: {user_id}'s todo list for Date: {target_date}")
-        return jsonify({"success": False, "message": "Exercise not found"}), 404
+        target_date = api.parse_day(date)
+        removed = storage.todo.pull_item(user_id, target_date, exercise_id)
+        if removed:
+            record_todo_counts(user_id, {target_date: -removed})
+        logger.debug("Delete exercise %s for user %s on %s removed %s items", exercise_id, user_id, target_date, removed)
+        body, status = api.delete_exercise_response(removed)
+        return jsonify(body), status
 
     except Exception as e:
-        print(f"ERROR: Exception occurred while deleting exercise. Error: {str(e)}")
+        logger.exception("Failed to delete exercise %s for user %s", exercise_id, user_id)
         return jsonify({"success": False, "message": f"An error occurred: {str(e)}"}), 500
 
 
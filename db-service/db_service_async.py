@@ -0,0 +1,510 @@
+"""
+asyncio implementation of the db-service, on Quart and pymongo's
+AsyncMongoClient.
+
+It serves the same routes as db_service.py, with the same arguments,
+responses and status codes, against the same database. gunicorn.conf.py
+starts one or the other depending on ``DB_SERVICE_IMPL``; locally:
+
+    python db_service_async.py
+
+Request parsing and response shaping (api.py), the exercise catalog and
+month calendar caches, the export encoders and the storage backends are
+shared with db_service.py, so the routes here only differ in awaiting storage. pbkdf2
+password checks run in a worker thread so they do not stall the event loop.
+Log records are the same JSON, without the route field and per-route
+sampling, which structured_logging takes from Flask's request context.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dotenv import load_dotenv
+from pymongo.errors import PyMongoError
+from quart import Quart, Response, g, jsonify, request
+from werkzeug.exceptions import UnsupportedMediaType
+from werkzeug.security import generate_password_hash, check_password_hash
+import api
+from api import ApiError
+from catalog import AsyncExerciseCatalog
+from month_summary import AsyncMonthSummaryCache
+from todo_export import EXPORT_BATCH_SIZE, EXPORT_FORMATS, async_export_chunks
+from todo_bulk import fill_results, group_items_by_day
+from user_stats import summarize
+from indexes import SEARCH_HISTORY_MAX_ENTRIES
+from json_provider import OrjsonProvider
+from structured_logging import configure_logging
+from metrics import CONTENT_TYPE, REQUEST_LATENCY, REQUESTS, render
+from mongo_monitoring import CommandMetrics, PoolMetrics
+from mongo_settings import client_options
+from storage import open_async_storage
+
+app = Quart(__name__)
+app.json = OrjsonProvider(app)
+configure_logging("db-service")
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+mongo_options = client_options()
+pool_metrics = PoolMetrics()
+storage = open_async_storage(mongo_options, event_listeners=[CommandMetrics(), pool_metrics])
+
+exercise_catalog = AsyncExerciseCatalog(
+    storage.exercises,
+    check_interval=float(os.getenv("CATALOG_CHECK_INTERVAL", "5"))
+)
+month_summaries = AsyncMonthSummaryCache(
+    storage.todo.month_summary,
+    storage.stats.month_version,
+    ttl=float(os.getenv("MONTH_SUMMARY_TTL", "60"))
+)
+
+
+@app.before_serving
+async def prepare_database():
+    """Same start-up checks as db_service.py, once the event loop is running."""
+    await storage.prepare(verify=os.getenv("VERIFY_INDEXES") == "1")
+
+
+@app.after_serving
+async def close_database():
+    await storage.close()
+
+
+@app.before_request
+async def _start_request_timer():
+    g._metrics_started = time.perf_counter()
+
+
+@app.after_request
+async def _record_request(response):
+    started = g.pop("_metrics_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        REQUESTS.inc(route, request.method, str(response.status_code))
+        REQUEST_LATENCY.observe(time.perf_counter() - started, route, request.method)
+    return response
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics():
+    return Response(render(), content_type=CONTENT_TYPE)
+
+
+async def request_json():
+    """The JSON body, refusing other content types with a 415 like Flask's ``request.json``."""
+    if not request.is_json:
+        raise UnsupportedMediaType(
+            "Did not attempt to load JSON data because the request Content-Type was not 'application/json'."
+        )
+    return await request.get_json()
+
+
+@app.errorhandler(ApiError)
+async def api_error(e):
+    return jsonify(e.body), e.status
+
+
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "2"))
+
+async def ping_storage():
+    await storage.ping(READY_TIMEOUT)
+
+@app.route("/healthz", methods=["GET"])
+async def healthz():
+    """Liveness: the process answers requests. Mongo is left to /readyz, as in db_service.py."""
+    return jsonify({"status": "ok"}), 200
+
+@app.route("/readyz", methods=["GET"])
+async def readyz():
+    """Readiness: 200 once Mongo answers a ping within READY_TIMEOUT seconds, 503 otherwise."""
+    try:
+        await ping_storage()
+    except PyMongoError as e:
+        logger.warning("Readiness check failed: %s", e)
+        return jsonify({"status": "unavailable", "error": str(e)}), 503
+    return jsonify({"status": "ready"}), 200
+
+@app.route("/mongo/pool/stats", methods=["GET"])
+async def mongo_pool_stats():
+    """Connection pool counters and recent checkout wait percentiles of this worker."""
+    return jsonify({
+        **pool_metrics.stats(),
+        "max_pool_size": mongo_options["maxPoolSize"],
+        "wait_queue_timeout_ms": mongo_options["waitQueueTimeoutMS"],
+    }), 200
+
+
+@app.route("/users/get/<user_id>", methods=["GET"])
+async def get_user(user_id):
+    """Retrieve user information by ID."""
+    user = await storage.users.get(user_id)
+    if user:
+        return jsonify(user)
+    return jsonify({"error": "User not found"}), 404
+
+@app.route("/users/create", methods=["POST"])
+async def create_user():
+    """Create a new user account."""
+    username, password = api.create_user_request(await request_json())
+    try:
+        if await storage.users.find_by_username(username):
+            return jsonify(api.USERNAME_TAKEN), 400
+
+        hashed_password = await asyncio.to_thread(generate_password_hash, password, method="pbkdf2:sha256")
+        user_id = await storage.users.create({"username": username, "password": hashed_password})
+        logger.info("Created user %s", user_id)
+        return jsonify({"user_id": user_id}), 200
+
+    except Exception:
+        logger.exception("Error creating user")
+        return jsonify({"message": "Internal server error"}), 500
+
+@app.route("/users/auth", methods=["POST"])
+async def authenticate_user():
+    """Authenticate user login credentials."""
+    username, password = api.auth_request(await request_json())
+    user = await storage.users.find_by_username(username)
+    if user and await asyncio.to_thread(check_password_hash, user["password"], password):
+        return jsonify(user), 200
+    return jsonify(api.INVALID_LOGIN), 401
+
+@app.route("/todo/get/<string:user_id>", methods=["GET"])
+async def get_todo(user_id):
+    """
+    获取用户当天的 To-Do 数据 (仅比较年月日)
+    Day documents are only created by the first add, so a missing one is an empty day.
+    """
+    try:
+        today_start = api.today()
+        todo_data = await storage.todo.get_day(user_id, today_start)
+        return jsonify(todo_data or api.empty_day(user_id, today_start)), 200
+
+    except Exception as e:
+        logger.exception("Failed to fetch To-Do data for user %s", user_id)
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+async def record_todo_counts(user_id, counts_by_day):
+    """Apply item count changes to the user's stats and stamp their months; on failure, drop them to be recounted."""
+    try:
+        await storage.stats.increment(user_id, counts_by_day)
+    except Exception:
+        logger.exception("Failed to update stats for user %s; recounting them on the next read", user_id)
+        try:
+            await storage.stats.discard(user_id)
+        except Exception:
+            logger.exception("Failed to discard stats for user %s; run rebuild-user-stats", user_id)
+
+
+@app.route("/todo/add", methods=["POST"])
+async def add_todo():
+    """
+    Add a new todo item to the user's list.
+    如果记录不存在，直接创建新记录；如果存在，直接更新。
+    """
+    user_id, date, exercise_item = api.add_todo_request(await request_json())
+    try:
+        target_date = api.parse_day(date)
+        created = await storage.todo.push_item(user_id, target_date, exercise_item)
+        body, status = api.add_todo_response(created)
+        if body["success"]:
+            await record_todo_counts(user_id, {target_date: 1})
+        return jsonify(body), status
+
+    except Exception as e:
+        logger.exception("Failed to add todo item for user %s", user_id)
+        return jsonify({"error": "An error occurred", "message": str(e)}), 500
+
+@app.route("/todo/add_bulk", methods=["POST"])
+async def add_todo_bulk():
+    """
+    Add many todo items for one user in a single request.
+    Body: {"user_id": ..., "items": [{"date": "YYYY-MM-DD", "exercise_item": {...}}, ...]}
+    Returns one result per item, in request order.
+    """
+    user_id, items = api.add_todo_bulk_request(await request_json())
+    results, items_by_day, positions_by_day = group_items_by_day(items)
+    try:
+        errors = await storage.todo.push_items(user_id, items_by_day) if items_by_day else {}
+    except Exception as e:
+        logger.exception("Failed to add todo items in bulk for user %s", user_id)
+        return jsonify({"error": "An error occurred", "message": str(e)}), 500
+
+    await record_todo_counts(user_id, api.added_counts(items_by_day, errors))
+    return jsonify(fill_results(results, positions_by_day, errors)), 200
+
+@app.route("/todo/get_exercise_by_id", methods=["GET"])
+async def get_exercise_by_id():
+    """
+    获取用户特定日期的特定 To-Do 项
+    """
+    user_id, date, exercise_todo_id = api.get_exercise_by_id_request(request.args)
+    try:
+        item = await storage.todo.find_item(user_id, api.parse_day(date), exercise_todo_id)
+        body, status = api.found(item, "Exercise not found")
+        return jsonify(body), status
+
+    except Exception:
+        logger.exception("Error fetching todo exercise")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route("/todo/update_exercise", methods=["POST"])
+async def update_exercise():
+    """
+    更新用户特定 To-Do 项的字段
+    """
+    user_id, date, exercise_todo_id, update_fields = api.update_exercise_request(await request_json())
+    try:
+        target_date = api.parse_day(date)
+        updated = await storage.todo.update_item(user_id, target_date, exercise_todo_id, update_fields)
+        if updated:
+            # No count changes, but the month calendar may show the new name.
+            await record_todo_counts(user_id, {target_date: 0})
+        body, status = api.update_exercise_response(updated)
+        return jsonify(body), status
+
+    except Exception:
+        logger.exception("Error updating todo exercise %s", exercise_todo_id)
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route("/todo/get-item/<user_id>/<exercise_todo_id>", methods=["GET"])
+async def get_todo_item(user_id, exercise_todo_id):
+    """Get a specific todo item from the day given as ?date=YYYY-MM-DD."""
+    target_date = api.todo_item_request(request.args)
+    item = await storage.todo.find_item(user_id, target_date, exercise_todo_id)
+    body, status = api.found(item, "Todo item not found")
+    return jsonify(body), status
+
+@app.route("/exercises/search", methods=["POST"])
+async def search_exercises():
+    """Search exercises by name, by prefix a page at a time or ranked; see db_service.py."""
+    query, ranked, limit, option = api.search_request(await request_json())
+    if ranked:
+        return jsonify(await exercise_catalog.ranked_search(query, limit, option)), 200
+    body, headers = api.search_response(*await exercise_catalog.search(query, limit, option))
+    return jsonify(body), 200, headers
+
+@app.route("/exercises/get_many", methods=["POST"])
+async def get_many_exercises():
+    """Look up a batch of exercises by id. Returns ``{id: exercise}`` for the ids found."""
+    return jsonify(await exercise_catalog.get_many(api.get_many_request(await request_json()))), 200
+
+@app.route("/exercises/resolve", methods=["POST"])
+async def resolve_exercises():
+    """Resolve a batch of exercise names. Returns ``{name: exercise or null}``."""
+    return jsonify(await exercise_catalog.resolve(api.resolve_request(await request_json()))), 200
+
+@app.route("/exercises/add", methods=["POST"])
+async def add_exercise():
+    """Add an exercise to the catalog."""
+    exercise_id = await storage.exercises.add(api.add_exercise_request(await request_json()))
+    await exercise_catalog.bump_revision()
+    return jsonify({"id": exercise_id}), 200
+
+@app.route("/exercises/update/<exercise_id>", methods=["PUT"])
+async def update_exercise_details(exercise_id):
+    """Update an exercise, keeping its search fields in sync with the name."""
+    data = api.update_exercise_details_request(await request_json())
+    try:
+        updated = await storage.exercises.update(exercise_id, data)
+        if updated:
+            await exercise_catalog.bump_revision()
+        return jsonify({"success": updated}), 200
+    except Exception:
+        logger.exception("Error updating exercise %s", exercise_id)
+        return jsonify({"error": "Failed to update exercise"}), 500
+
+@app.route("/exercises/get/<exercise_id>", methods=["GET"])
+async def get_exercise(exercise_id):
+    """Get exercise details by ID."""
+    body, status = api.found(await exercise_catalog.get(exercise_id), "Exercise not found")
+    return jsonify(body), status
+
+@app.route("/search-history/add", methods=["POST"])
+async def add_search_history():
+    """Record a search query in the user's search history."""
+    user_id, content = api.add_search_history_request(await request_json())
+    await storage.search_history.record(user_id, content, SEARCH_HISTORY_MAX_ENTRIES)
+    return jsonify({"success": True}), 200
+
+@app.route("/search-history/get/<user_id>", methods=["GET"])
+async def get_search_history(user_id):
+    """Retrieve a page of the user's search history, newest first."""
+    after, limit = api.search_history_request(request.args)
+    history = await storage.search_history.page(user_id, after, limit + 1)
+    body, headers = api.search_history_response(history, limit)
+    return jsonify(body), 200, headers
+
+@app.route("/transcriptions/add", methods=["POST"])
+async def add_transcription():
+    """Add a new transcription entry."""
+    transcription_id = await storage.transcriptions.add(api.transcription_request(await request_json()))
+    if transcription_id:
+        return jsonify({"id": transcription_id}), 200
+    return jsonify({"error": "Failed to save transcription"}), 500
+
+@app.route("/users/update/<user_id>", methods=["PUT"])
+async def update_user(user_id):
+    data = await request_json()
+    try:
+        return jsonify({"success": await storage.users.update(user_id, data)}), 200
+    except Exception:
+        logger.exception("Error updating user %s", user_id)
+        return jsonify({"error": "Failed to update user"}), 500
+
+@app.route("/exercises/all", methods=["GET"])
+async def get_all_exercises():
+    """
+    Return the id and name of every exercise, pre-serialized by the catalog
+    cache, with the same ETag revalidation as db_service.py.
+    """
+    payload, etag = await exercise_catalog.all_payload()
+    response = app.response_class(payload, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return await response.make_conditional(request)
+
+@app.route("/exercises/catalog/stats", methods=["GET"])
+async def get_exercise_catalog_stats():
+    """Report exercise catalog cache hits, misses and reloads."""
+    return jsonify(exercise_catalog.stats()), 200
+
+@app.route("/todo/<user_id>", methods=["GET"])
+async def get_todos(user_id):
+    """
+    返回指定用户的 To-Do 数据, oldest day first, a page at a time.
+    Optional start_date/end_date (YYYY-MM-DD) narrow the days returned.
+    """
+    start, end, after, limit = api.todo_history_request(request.args)
+    try:
+        todos = await storage.todo.history(user_id, start, end, after, limit + 1)
+        body, headers = api.todo_history_response(todos, limit)
+        return jsonify(body), 200, headers
+    except Exception:
+        logger.exception("Failed to retrieve todos for user %s", user_id)
+        return jsonify({"error": "Failed to retrieve todos"}), 500
+
+@app.route("/todo/export/<user_id>", methods=["GET"])
+async def export_todos(user_id):
+    """
+    Stream the user's whole todo history, oldest day first, as NDJSON (the
+    default) or ?format=csv. Optional start_date/end_date (YYYY-MM-DD) narrow the days.
+    """
+    export_format, start, end = api.export_request(request.args)
+
+    async def generate():
+        days = storage.todo.export_days(user_id, start, end, EXPORT_BATCH_SIZE)
+        try:
+            async for chunk in async_export_chunks(days, export_format):
+                yield chunk
+        except Exception:
+            # Headers are already sent, so the client only sees a cut-off body.
+            logger.exception("Todo export for user %s failed part way", user_id)
+            raise
+        finally:
+            await days.aclose()
+
+    response = app.response_class(
+        generate(),
+        mimetype=EXPORT_FORMATS[export_format][1],
+        headers=api.export_headers(user_id, export_format)
+    )
+    # Quart cuts responses off after RESPONSE_TIMEOUT; a long history may take longer.
+    response.timeout = None
+    return response
+
+@app.route("/todo/stats/daily/<user_id>", methods=["GET"])
+async def get_daily_todo_stats(user_id):
+    """
+    Number of todo items per day, as {"YYYY-MM-DD": count}, for the days that
+    have any. Optional start_date/end_date (YYYY-MM-DD) narrow the days.
+    """
+    start_date, end_date = api.daily_stats_request(request.args)
+    try:
+        return jsonify(api.days_between(await storage.stats.days(user_id), start_date, end_date)), 200
+    except Exception:
+        logger.exception("Failed to count todos for user %s", user_id)
+        return jsonify({"error": "Failed to retrieve todo stats"}), 500
+
+@app.route("/todo/stats/<user_id>", methods=["GET"])
+async def get_todo_stats(user_id):
+    """
+    Dashboard totals: items planned, active days and the current and longest
+    streak, ending ``today`` (YYYY-MM-DD, default the UTC date).
+    """
+    today = api.todo_stats_request(request.args)
+    try:
+        return jsonify(summarize(await storage.stats.get(user_id), today)), 200
+    except Exception:
+        logger.exception("Failed to read stats for user %s", user_id)
+        return jsonify({"error": "Failed to retrieve todo stats"}), 500
+
+@app.route("/todo/calendar/month/<user_id>", methods=["GET"])
+async def get_month_calendar(user_id):
+    """
+    Week-by-week preview of a month (?month=YYYY-MM) for the month calendar:
+    {"YYYY-MM-DD" week start: [first workout names]}, weeks starting on the 1st.
+    """
+    month_start = api.month_calendar_request(request.args)
+    try:
+        return jsonify(await month_summaries.get(user_id, month_start)), 200
+    except Exception:
+        logger.exception("Failed to build month calendar for user %s", user_id)
+        return jsonify({"error": "Failed to build month calendar"}), 500
+
+@app.route("/todo/calendar/stats", methods=["GET"])
+async def month_calendar_stats():
+    """Hit/miss counters of the month calendar cache."""
+    return jsonify(month_summaries.stats()), 200
+
+@app.route("/todo/get_by_date/<string:user_id>", methods=["GET"])
+async def get_todo_by_date(user_id):
+    """
+    获取用户在特定日期范围内的 To-Do 数据。
+    Optional ``fields`` and ``max_items`` trim each day's todo list.
+    """
+    start_date, end_date, fields, max_items = api.todo_by_date_request(request.args)
+    try:
+        start, end = api.day_range(start_date, end_date)
+        return jsonify(await storage.todo.between(user_id, start, end, fields, max_items)), 200
+
+    except Exception as e:
+        logger.exception("Failed to get todos by date for user %s", user_id)
+        return jsonify({"error": "An error occurred", "message": str(e)}), 500
+
+@app.route('/plan/save', methods=['POST'])
+async def save_plan():
+    """
+    保存计划到数据库
+    """
+    plan_entry = api.save_plan_request(await request_json())
+    try:
+        await storage.plans.add(plan_entry)
+        return jsonify({"success": True, "message": "Plan saved successfully"}), 201
+
+    except Exception as e:
+        logger.exception("Error saving plan")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route('/todo/delete_exercise', methods=['POST'])
+async def delete_exercise_from_date():
+    """
+    根据用户 ID 和日期从数据库中删除指定的 exercise_id
+    """
+    user_id, date, exercise_id = api.delete_exercise_request(await request_json())
+    try:
+        target_date = api.parse_day(date)
+        removed = await storage.todo.pull_item(user_id, target_date, exercise_id)
+        if removed:
+            await record_todo_counts(user_id, {target_date: -removed})
+        body, status = api.delete_exercise_response(removed)
+        return jsonify(body), status
+
+    except Exception as e:
+        logger.exception("Failed to delete exercise %s for user %s", exercise_id, user_id)
+        return jsonify({"success": False, "message": f"An error occurred: {str(e)}"}), 500
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5112, debug=False)
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+Helpers for matching exercise names.
+
+Exercise documents carry two derived fields next to ``workout_name``:
+
+- ``workout_name_normalized``: the whole name lowercased with spaces and
+  hyphens removed ("Pull-Up Bar" -> "pullupbar").
+- ``workout_name_keys``: the normalized suffix starting at every word
+  ("pullupbar", "upbar", "bar"). The field is indexed, so an anchored
+  ``^query`` regex against it is an index range scan instead of a
+  collection scan.
+
+``TrigramIndex`` backs the ranked, typo-tolerant search mode: names are split
+into overlapping three-character grams and a query only scores exercises that
+share at least one gram with it.
+"""
+
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+
+_SEPARATORS = re.compile(r"[\s\-]+")
+
+# Derived search fields stay in the database; clients only see the exercise itself.
+EXERCISE_PROJECTION = {"workout_name_normalized": 0, "workout_name_keys": 0}
+
+
+def normalize_exercise_name(name):
+    """Lowercase a name and strip spaces and hyphens."""
+    return _SEPARATORS.sub("", name or "").lower()
+
+
+def exercise_name_keys(name):
+    """Return the normalized suffixes of ``name`` that start at a word boundary."""
+    words = [word for word in _SEPARATORS.split((name or "").lower()) if word]
+    return ["".join(words[i:]) for i in range(len(words))]
+
+
+def exercise_name_fields(name):
+    """Derived search fields to store alongside ``workout_name``."""
+    return {
+        "workout_name_normalized": normalize_exercise_name(name),
+        "workout_name_keys": exercise_name_keys(name),
+    }
+
+
+def prefix_query(query):
+    """Mongo filter matching exercises with a word starting with ``query``."""
+    return {"workout_name_keys": {"$regex": "^" + re.escape(normalize_exercise_name(query))}}
+
+
+def name_trigrams(name):
+    """The set of padded three-character grams of a normalized name."""
+    padded = "$$" + normalize_exercise_name(name) + "$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to exercise ids, updated one exercise at a time."""
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._grams = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._grams)
+
+    def _remove(self, exercise_id):
+        for gram in self._grams.pop(exercise_id, ()):
+            postings = self._postings[gram]
+            postings.discard(exercise_id)
+            if not postings:
+                del self._postings[gram]
+
+    def add(self, exercise_id, name):
+        """Index ``name`` under ``exercise_id``, replacing any earlier entry."""
+        grams = name_trigrams(name)
+        with self._lock:
+            self._remove(exercise_id)
+            self._grams[exercise_id] = grams
+            for gram in grams:
+                self._postings[gram].add(exercise_id)
+
+    def remove(self, exercise_id):
+        """Drop ``exercise_id`` from the index."""
+        with self._lock:
+            self._remove(exercise_id)
+
+    def search(self, query, limit=10, min_score=0.0):
+        """
+        Return up to ``limit`` ``(exercise_id, score)`` pairs, best first.
+
+        The score is the share of the query's trigrams found in the name, so a
+        query that is a prefix or a near-miss of a name scores close to 1.
+        Ties go to the name with fewer unmatched trigrams.
+        """
+        grams = name_trigrams(query)
+        if not normalize_exercise_name(query):
+            return []
+        required = max(1, math.ceil(min_score * len(grams) - 1e-9))
+
+        with self._lock:
+            postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+            counts = {}
+            # Scan posting lists from the rarest up. After ``scanned`` lists,
+            # any name not seen yet shares at most len(grams) - scanned grams,
+            # so we can stop once ``limit`` seen names beat that bound, or
+            # once the bound drops below ``required``.
+            for scanned, posting in enumerate(postings[:len(grams) - required + 1], start=1):
+                for exercise_id in posting:
+                    if exercise_id not in counts:
+                        counts[exercise_id] = sum(1 for other in postings if exercise_id in other)
+                unseen_bound = len(grams) - scanned
+                if sum(1 for count in counts.values() if count > unseen_bound) >= limit:
+                    break
+
+            scored = [
+                (count / len(grams), 2 * count / (len(grams) + len(self._grams[exercise_id])), exercise_id)
+                for exercise_id, count in counts.items()
+                if count >= required
+            ]
+
+        return [(exercise_id, score) for score, _, exercise_id in heapq.nlargest(limit, scored)]
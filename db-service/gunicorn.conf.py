@@ -0,0 +1,67 @@
+"""
+gunicorn settings for the db-service. gunicorn reads this file from the
+working directory, so from the db-service directory:
+
+    gunicorn
+
+``DB_SERVICE_IMPL`` picks the app: ``sync`` (the default) serves the Flask
+app in db_service.py from gthread workers, ``async`` the Quart app in
+db_service_async.py from uvicorn workers. ``python db_service.py`` still
+starts the Werkzeug development server for local work. ``WEB_CONCURRENCY``
+and ``GUNICORN_THREADS`` override the worker and thread counts.
+
+With ``DB_BACKEND=memory`` the data lives in the worker, so a single worker
+serves every request unless ``WEB_CONCURRENCY`` says otherwise.
+"""
+
+import multiprocessing
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5112')}"
+
+IMPL = os.getenv("DB_SERVICE_IMPL", "sync")
+if IMPL not in ("sync", "async"):
+    raise RuntimeError(f"DB_SERVICE_IMPL must be sync or async, not {IMPL!r}")
+
+if IMPL == "async":
+    wsgi_app = "db_service_async:app"
+    # One event loop per core waits on any number of Mongo calls at once.
+    workers = multiprocessing.cpu_count()
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "db_service:app"
+    # Handlers mostly wait on Mongo, so every worker also runs a few threads.
+    # /users/auth spends its time in a deliberately slow pbkdf2 check, which
+    # only more processes speed up, hence more workers than cores.
+    workers = multiprocessing.cpu_count() * 2 + 1
+    worker_class = "gthread"
+    threads = int(os.getenv("GUNICORN_THREADS", "4"))
+if os.getenv("DB_BACKEND") == "memory":
+    workers = 1
+workers = int(os.getenv("WEB_CONCURRENCY", str(workers)))
+
+# Each worker imports the app after it is forked, so its MongoClient,
+# connection pool and monitor threads belong to that worker alone. A client
+# created before the fork would be shared by every worker, which pymongo does
+# not support.
+preload_app = False
+
+# On SIGTERM (docker stop) workers stop accepting connections and get this
+# long to finish the requests they have.
+graceful_timeout = 30
+timeout = 30
+keepalive = 5
+
+accesslog = None
+errorlog = "-"
+
+
+def worker_exit(server, worker):
+    """
+    Close the worker's Mongo connections after its last request. The async
+    app closes its storage itself when uvicorn shuts it down.
+    """
+    db_service = sys.modules.get("db_service")
+    if db_service is not None:
+        db_service.storage.close()
@@ -0,0 +1,155 @@
+"""
+Index definitions for the db-service collections.
+
+``ensure_indexes`` (``ensure_indexes_async`` for db_service_async.py) creates
+every index in ``INDEXES`` and is safe to run on every start: creating an
+index that already exists with the same spec is a no-op. ``verify_indexes``
+explains each query in ``HOT_QUERIES`` and raises ``IndexCheckError`` if any
+of them would scan the whole collection.
+
+    python indexes.py ensure
+    python indexes.py check
+"""
+
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Each user keeps one entry per search (compared like exercise names) and
+# only the most recent SEARCH_HISTORY_MAX_ENTRIES of them. Searches nobody has
+# repeated for SEARCH_HISTORY_TTL_SECONDS drop out of the history.
+SEARCH_HISTORY_MAX_ENTRIES = int(os.getenv("SEARCH_HISTORY_MAX_ENTRIES", "50"))
+SEARCH_HISTORY_TTL_SECONDS = 90 * 24 * 60 * 60
+# Every field a history read returns is in the user_time_content index.
+SEARCH_HISTORY_PROJECTION = {"user_id": 1, "content": 1, "time": 1}
+
+# (collection, keys, options)
+INDEXES = [
+    ("todo", [("user_id", ASCENDING), ("date", ASCENDING)], {"name": "user_date", "unique": True}),
+    # Entries written before content_key existed are left out until dedupe-search-history runs.
+    ("search_history", [("user_id", ASCENDING), ("content_key", ASCENDING)],
+     {"name": "user_content", "unique": True, "partialFilterExpression": {"content_key": {"$exists": True}}}),
+    ("search_history", [("user_id", ASCENDING), ("time", DESCENDING), ("_id", DESCENDING), ("content", ASCENDING)],
+     {"name": "user_time_content"}),
+    ("search_history", [("time", ASCENDING)], {"name": "time_ttl", "expireAfterSeconds": SEARCH_HISTORY_TTL_SECONDS}),
+    ("users", [("username", ASCENDING)], {"name": "username", "unique": True}),
+    ("exercises", [("workout_name_keys", ASCENDING)], {"name": "workout_name_keys"}),
+    ("exercises", [("workout_name_normalized", ASCENDING)], {"name": "workout_name_normalized"}),
+    ("edit_transcription", [("user_id", ASCENDING), ("time", DESCENDING)], {"name": "user_time"}),
+    ("plans", [("user_id", ASCENDING), ("date", ASCENDING)], {"name": "user_date"}),
+]
+
+_SAMPLE_USER = "000000000000000000000000"
+_SAMPLE_DAY = datetime(2024, 1, 1)
+
+# (description, collection, filter, sort) for the queries the routes run on every request.
+HOT_QUERIES = [
+    ("todo by user and day", "todo",
+     {"user_id": _SAMPLE_USER, "date": {"$gte": _SAMPLE_DAY, "$lt": _SAMPLE_DAY + timedelta(days=1)}}, None),
+    ("todo history by user", "todo",
+     {"user_id": _SAMPLE_USER}, [("date", ASCENDING), ("_id", ASCENDING)]),
+    ("search history by user", "search_history",
+     {"user_id": _SAMPLE_USER}, [("time", DESCENDING), ("_id", DESCENDING)]),
+    ("user by username", "users", {"username": "sample"}, None),
+    ("exercise by name prefix", "exercises", {"workout_name_keys": {"$regex": "^sample"}}, None),
+    ("exercise by normalized name", "exercises", {"workout_name_normalized": {"$in": ["sample"]}}, None),
+    ("stats by user", "user_stats", {"_id": _SAMPLE_USER}, None),
+]
+
+
+class IndexCheckError(RuntimeError):
+    """A hot query is not backed by an index."""
+
+
+def ensure_indexes(db):
+    """
+    Create every index in INDEXES. Returns the names of the indexes that could
+    not be built (for example a unique index over duplicate data) after
+    logging why; the rest are still created.
+    """
+    failed = []
+    for collection, keys, options in INDEXES:
+        try:
+            db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            logger.error("Could not create index %s.%s: %s", collection, options["name"], e)
+            failed.append(f"{collection}.{options['name']}")
+    return failed
+
+
+async def ensure_indexes_async(db):
+    """ensure_indexes for a pymongo AsyncDatabase."""
+    failed = []
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            logger.error("Could not create index %s.%s: %s", collection, options["name"], e)
+            failed.append(f"{collection}.{options['name']}")
+    return failed
+
+
+def plan_stages(plan):
+    """Every ``stage`` in an explain() plan tree."""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key in ("inputStage", "queryPlan", "inputStages", "shards"):
+            child = plan.get(key)
+            for node in child if isinstance(child, list) else [child]:
+                stages.extend(plan_stages(node))
+    return stages
+
+
+def _hot_query_cursors(db):
+    for description, collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query)
+        yield description, collection, cursor.sort(sort) if sort else cursor
+
+
+def _check_plans(plans):
+    """Raise IndexCheckError for the ``(description, collection, explain output)`` that COLLSCAN."""
+    unindexed = []
+    for description, collection, explained in plans:
+        stages = plan_stages(explained["queryPlanner"]["winningPlan"])
+        if "COLLSCAN" in stages:
+            unindexed.append(f"{description} ({collection}: {' > '.join(stages)})")
+    if unindexed:
+        raise IndexCheckError("Hot queries without an index: " + "; ".join(unindexed))
+
+
+def verify_indexes(db):
+    """Raise IndexCheckError naming every hot query whose winning plan is a COLLSCAN."""
+    _check_plans(
+        (description, collection, cursor.explain()) for description, collection, cursor in _hot_query_cursors(db)
+    )
+
+
+async def verify_indexes_async(db):
+    """verify_indexes for a pymongo AsyncDatabase."""
+    _check_plans([
+        (description, collection, await cursor.explain())
+        for description, collection, cursor in _hot_query_cursors(db)
+    ])
+
+
+if __name__ == "__main__":
+    from db_service import storage
+
+    if len(sys.argv) != 2 or sys.argv[1] not in ("ensure", "check"):
+        print("Usage: python indexes.py [ensure | check]")
+        sys.exit(1)
+    if not hasattr(storage, "db"):
+        print("Indexes only apply to the Mongo backend; unset DB_BACKEND")
+        sys.exit(1)
+    db = storage.db
+    if sys.argv[1] == "ensure":
+        sys.exit(1 if ensure_indexes(db) else 0)
+    verify_indexes(db)
+    print("All hot queries use an index.")
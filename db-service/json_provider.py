@@ -0,0 +1,41 @@
+"""
+orjson-backed JSON provider for the db-service.
+
+Handlers hand documents to ``jsonify`` exactly as pymongo returns them.
+``ObjectId`` is written as its hex string and ``datetime`` as ISO 8601 in UTC
+(``2024-12-01T00:00:00Z``); Mongo stores naive UTC datetimes, so naive values
+are taken to be UTC.
+"""
+
+import orjson
+from bson import ObjectId
+from flask.json.provider import JSONProvider
+
+DUMPS_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    """Serialize ``obj`` to UTF-8 JSON bytes."""
+    return orjson.dumps(obj, default=_default, option=DUMPS_OPTIONS)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider that writes responses straight from orjson bytes."""
+
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
@@ -0,0 +1,488 @@
+"""
+In-memory backend of the db-service storage (see storage.py).
+
+Every repository keeps its documents in dicts, and the orders the routes page
+through as sorted lists searched with bisect: each user's days by date, each
+user's search history by ``(time, _id)``. Documents are copied on the way in
+and out, so callers may change what they get back, and they look like the
+ones Mongo returns: ObjectId ``_id``s, days at midnight, exercises with string
+ids and without their derived search fields.
+
+Nothing is persisted or shared between processes, and search history entries
+never expire. ``shared_storage()`` is the single instance of the process, so
+db_service.py and db_service_async.py imported side by side (as the tests do)
+see the same data. ``AsyncMemoryStorage`` gives db_service_async.py coroutine
+versions of the same repositories; none of them ever waits.
+"""
+
+import copy
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from exercise_search import EXERCISE_PROJECTION, normalize_exercise_name
+from month_summary import WEEK_PREVIEW_ITEMS, month_weeks, summary_from_buckets
+from user_stats import active_days, day_key, month_key, month_version, stats_document
+
+
+def _set_fields(doc, fields):
+    """Apply ``fields`` ({dotted path: value}) like ``$set``. Returns whether anything changed."""
+    if "_id" in fields:
+        raise ValueError("_id cannot be changed")
+    changed = False
+    for path, value in fields.items():
+        *parents, last = path.split(".")
+        target = doc
+        for key in parents:
+            target = target.setdefault(key, {})
+        if last not in target or target[last] != value:
+            target[last] = copy.deepcopy(value)
+            changed = True
+    return changed
+
+
+def _is_item(item, exercise_todo_id):
+    return isinstance(item, dict) and item.get("exercise_todo_id") == exercise_todo_id
+
+
+def _trimmed_items(items, fields, max_items):
+    """A day's items as the Mongo backend's todo_items_projection leaves them."""
+    items = items[:max_items] if max_items is not None else items
+    if fields:
+        items = [
+            {field: item[field] for field in fields if field in item} if isinstance(item, dict) else {}
+            for item in items
+        ]
+    return copy.deepcopy(items)
+
+
+def _public_exercise(exercise):
+    """An exercise as clients see it: string id, no derived search fields."""
+    if exercise is None:
+        return None
+    public = {key: copy.deepcopy(value) for key, value in exercise.items() if key not in EXERCISE_PROJECTION}
+    public["_id"] = str(public["_id"])
+    return public
+
+
+class MemoryUsers:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._ids_by_username = {}
+
+    def get(self, user_id):
+        user_id = ObjectId(user_id)
+        with self._lock:
+            return copy.deepcopy(self._by_id.get(user_id))
+
+    def find_by_username(self, username):
+        with self._lock:
+            return copy.deepcopy(self._by_id.get(self._ids_by_username.get(username)))
+
+    def create(self, user):
+        user = copy.deepcopy(user)
+        user.setdefault("_id", ObjectId())
+        with self._lock:
+            # Usernames are unique, like the users.username index.
+            if user.get("username") in self._ids_by_username:
+                raise DuplicateKeyError(f"username {user['username']!r} already exists")
+            self._by_id[user["_id"]] = user
+            self._ids_by_username[user.get("username")] = user["_id"]
+        return user["_id"]
+
+    def update(self, user_id, fields):
+        user_id = ObjectId(user_id)
+        with self._lock:
+            user = self._by_id.get(user_id)
+            if user is None:
+                return False
+            username = user.get("username")
+            if fields.get("username", username) != username and fields["username"] in self._ids_by_username:
+                raise DuplicateKeyError(f"username {fields['username']!r} already exists")
+            changed = _set_fields(user, fields)
+            if user.get("username") != username:
+                del self._ids_by_username[username]
+                self._ids_by_username[user.get("username")] = user_id
+            return changed
+
+
+class MemoryTodo:
+    """Each user's day documents by date, with the dates in a sorted list for range scans."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._days = {}
+        self._dates = {}
+
+    def _range(self, user_id, start, end, after=None, limit=None):
+        """
+        The user's day documents with ``start <= date < end`` (either may be
+        None), oldest first: the first ``limit`` of them past the ``(date,
+        _id)`` of ``after``.
+        """
+        dates = self._dates.get(user_id, [])
+        days = self._days.get(user_id, {})
+        low = bisect_left(dates, start) if start is not None else 0
+        if after is not None:
+            # One document per date, so only a day on the cursor's date needs its _id compared.
+            position = bisect_left(dates, after[0])
+            if position < len(dates) and dates[position] == after[0] and days[after[0]]["_id"] <= after[1]:
+                position += 1
+            low = max(low, position)
+        high = bisect_left(dates, end) if end is not None else len(dates)
+        if limit is not None:
+            high = min(high, low + limit)
+        return [days[date] for date in dates[low:high]]
+
+    def _push(self, user_id, day, items):
+        """Append ``items`` to the user's day, creating the day. Returns whether it was created."""
+        days = self._days.setdefault(user_id, {})
+        doc = days.get(day)
+        if doc is None:
+            doc = days[day] = {"_id": ObjectId(), "user_id": user_id, "date": day, "todo": []}
+            insort(self._dates.setdefault(user_id, []), day)
+            created = True
+        else:
+            created = False
+        doc.setdefault("todo", []).extend(copy.deepcopy(items))
+        return created
+
+    def _find(self, user_id, day, exercise_todo_id):
+        doc = self._days.get(user_id, {}).get(day) or {}
+        return next((item for item in doc.get("todo", []) if _is_item(item, exercise_todo_id)), None)
+
+    def get_day(self, user_id, day):
+        with self._lock:
+            days = self._range(user_id, day, day + timedelta(days=1))
+            return copy.deepcopy(days[0]) if days else None
+
+    def push_item(self, user_id, day, item):
+        with self._lock:
+            return self._push(user_id, day, [item])
+
+    def push_items(self, user_id, items_by_day):
+        with self._lock:
+            for day, items in items_by_day.items():
+                self._push(user_id, day, items)
+        return {}
+
+    def find_item(self, user_id, day, exercise_todo_id):
+        with self._lock:
+            return copy.deepcopy(self._find(user_id, day, exercise_todo_id))
+
+    def update_item(self, user_id, day, exercise_todo_id, fields):
+        with self._lock:
+            item = self._find(user_id, day, exercise_todo_id)
+            return item is not None and _set_fields(item, fields)
+
+    def pull_item(self, user_id, day, exercise_todo_id):
+        with self._lock:
+            doc = self._days.get(user_id, {}).get(day)
+            if doc is None:
+                return None
+            items = doc.get("todo", [])
+            kept = [item for item in items if not _is_item(item, exercise_todo_id)]
+            if len(kept) < len(items):
+                doc["todo"] = kept
+            return len(items) - len(kept)
+
+    def history(self, user_id, start, end, after, limit):
+        with self._lock:
+            return copy.deepcopy(self._range(user_id, start, end, after, limit))
+
+    def between(self, user_id, start, end, fields=(), max_items=None):
+        with self._lock:
+            if not fields and max_items is None:
+                return copy.deepcopy(self._range(user_id, start, end))
+            return [
+                {
+                    "_id": doc["_id"], "user_id": doc["user_id"], "date": doc["date"],
+                    "todo": _trimmed_items(doc.get("todo") or [], fields, max_items),
+                }
+                for doc in self._range(user_id, start, end)
+            ]
+
+    def export_days(self, user_id, start, end, batch_size):
+        # A page at a time, so a long export never holds the lock for long.
+        after = None
+        while True:
+            batch = self.history(user_id, start, end, after, batch_size)
+            for doc in batch:
+                doc.pop("user_id", None)
+                yield doc
+            if len(batch) < batch_size:
+                return
+            after = (batch[-1]["date"], batch[-1]["_id"])
+
+    def day_counts(self, user_id):
+        """The number of items on each of the user's days that has any, by ``YYYY-MM-DD``."""
+        with self._lock:
+            days = self._days.get(user_id, {})
+            counts = {day_key(day): len(doc.get("todo") or []) for day, doc in days.items()}
+        return {day: count for day, count in counts.items() if count}
+
+    def month_summary(self, user_id, month_start):
+        boundaries = month_weeks(month_start)
+        weeks = {}
+        with self._lock:
+            for doc in self._range(user_id, boundaries[0], boundaries[-1]):
+                week_start = boundaries[bisect_right(boundaries, doc["date"]) - 1]
+                names = [
+                    item["workout_name"] for item in doc.get("todo") or []
+                    if isinstance(item, dict) and "workout_name" in item
+                ]
+                weeks.setdefault(week_start, []).append(names[:WEEK_PREVIEW_ITEMS])
+        return summary_from_buckets(boundaries, [{"_id": week, "days": days} for week, days in weeks.items()])
+
+
+class MemoryStats:
+    """Counts per user, counted from ``todo`` (a MemoryTodo) for users without any."""
+
+    def __init__(self, todo):
+        self._todo = todo
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _stats_for(self, user_id):
+        stats = self._stats.get(user_id)
+        if stats is None:
+            stats = self._stats[user_id] = stats_document(user_id, self._todo.day_counts(user_id))
+        return stats
+
+    def get(self, user_id):
+        with self._lock:
+            return copy.deepcopy(self._stats_for(user_id))
+
+    def days(self, user_id):
+        with self._lock:
+            return active_days(self._stats_for(user_id))
+
+    def increment(self, user_id, counts_by_day):
+        if not counts_by_day:
+            return
+        counts = {day_key(day): count for day, count in counts_by_day.items() if count}
+        with self._lock:
+            if user_id in self._stats:
+                stats = self._stats[user_id]
+                stats["total_items"] += sum(counts.values())
+                for day, count in counts.items():
+                    stats["days"][day] = stats["days"].get(day, 0) + count
+            else:
+                # The todos already hold this write, so counting them is enough.
+                stats = self._stats_for(user_id)
+            versions = stats.setdefault("month_versions", {})
+            for day in counts_by_day:
+                versions[month_key(day)] = ObjectId()
+
+    def discard(self, user_id):
+        """Drop the user's counts, so the next read counts their todos again."""
+        with self._lock:
+            self._stats.pop(user_id, None)
+
+    def month_version(self, user_id, month_start):
+        with self._lock:
+            return month_version(self._stats.get(user_id), month_start)
+
+
+class MemoryExercises:
+    """Exercises by id, with an index of ids by normalized name, and the catalog revision."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._ids_by_name = {}
+        self._revision = 0
+
+    def _index(self, exercise):
+        self._ids_by_name.setdefault(normalize_exercise_name(exercise.get("workout_name")), []).append(exercise["_id"])
+
+    def _unindex(self, exercise):
+        self._ids_by_name[normalize_exercise_name(exercise.get("workout_name"))].remove(exercise["_id"])
+
+    def revision(self):
+        return self._revision
+
+    def bump_revision(self):
+        with self._lock:
+            self._revision += 1
+
+    def all(self):
+        with self._lock:
+            return copy.deepcopy(list(self._by_id.values()))
+
+    def get(self, exercise_id):
+        exercise_id = ObjectId(exercise_id)
+        with self._lock:
+            return _public_exercise(self._by_id.get(exercise_id))
+
+    def get_many(self, exercise_ids):
+        exercise_ids = [ObjectId(exercise_id) for exercise_id in exercise_ids]
+        with self._lock:
+            return [_public_exercise(self._by_id[i]) for i in exercise_ids if i in self._by_id]
+
+    def find_by_names(self, names):
+        keys = {normalize_exercise_name(name) for name in names}
+        with self._lock:
+            return [_public_exercise(self._by_id[i]) for key in keys for i in self._ids_by_name.get(key, [])]
+
+    def add(self, exercise):
+        exercise = copy.deepcopy(exercise)
+        exercise.setdefault("_id", ObjectId())
+        with self._lock:
+            self._by_id[exercise["_id"]] = exercise
+            self._index(exercise)
+        return exercise["_id"]
+
+    def update(self, exercise_id, fields):
+        exercise_id = ObjectId(exercise_id)
+        with self._lock:
+            exercise = self._by_id.get(exercise_id)
+            if exercise is None:
+                return False
+            self._unindex(exercise)
+            try:
+                return _set_fields(exercise, fields)
+            finally:
+                self._index(exercise)
+
+    def delete(self, exercise_id):
+        exercise_id = ObjectId(exercise_id)
+        with self._lock:
+            exercise = self._by_id.pop(exercise_id, None)
+            if exercise is None:
+                return False
+            self._unindex(exercise)
+            return True
+
+
+class MemorySearchHistory:
+    """
+    Each user's entries by normalized search, and a list of ``(time, _id,
+    content_key)`` sorted oldest first for paging and trimming.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._order = {}
+
+    def record(self, user_id, content, max_entries):
+        key = normalize_exercise_name(content)
+        now = datetime.utcnow()
+        with self._lock:
+            entries = self._entries.setdefault(user_id, {})
+            order = self._order.setdefault(user_id, [])
+            entry = entries.get(key)
+            created = entry is None
+            if created:
+                entry = entries[key] = {"_id": ObjectId(), "user_id": user_id, "content_key": key, "hits": 0}
+            else:
+                del order[bisect_left(order, (entry["time"], entry["_id"]))]
+            entry.update(content=content, time=now, hits=entry["hits"] + 1)
+            insort(order, (now, entry["_id"], key))
+            # Only a new entry can push the history past the cap.
+            if created and len(order) > max_entries:
+                for _, _, stale_key in order[:len(order) - max_entries]:
+                    del entries[stale_key]
+                del order[:len(order) - max_entries]
+
+    def page(self, user_id, after, limit):
+        with self._lock:
+            order = self._order.get(user_id, [])
+            entries = self._entries.get(user_id, {})
+            # Everything before bisect_left(order, after) is strictly older than ``after``.
+            end = bisect_left(order, after) if after is not None else len(order)
+            return [
+                {"_id": entry_id, "user_id": user_id, "content": entries[key]["content"], "time": time}
+                for time, entry_id, key in reversed(order[max(0, end - limit):end])
+            ]
+
+
+class MemoryEntries:
+    """An append-only list: transcriptions and plans."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []
+
+    def add(self, entry):
+        entry = copy.deepcopy(entry)
+        entry.setdefault("_id", ObjectId())
+        with self._lock:
+            self._entries.append(entry)
+        return entry["_id"]
+
+
+class MemoryStorage:
+    """The db-service repositories, held in this process."""
+
+    def __init__(self):
+        self.users = MemoryUsers()
+        self.todo = MemoryTodo()
+        self.stats = MemoryStats(self.todo)
+        self.exercises = MemoryExercises()
+        self.search_history = MemorySearchHistory()
+        self.transcriptions = MemoryEntries()
+        self.plans = MemoryEntries()
+
+    def prepare(self, verify=False):
+        """Nothing to index; every lookup already has its dict or sorted list."""
+
+    def ping(self, timeout):
+        pass
+
+    def close(self):
+        pass
+
+
+_shared = MemoryStorage()
+
+
+def shared_storage():
+    return _shared
+
+
+class _AsyncRepository:
+    """Coroutine versions of the methods of a memory repository."""
+
+    def __init__(self, repository):
+        self._repository = repository
+
+    def __getattr__(self, name):
+        method = getattr(self._repository, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+
+        setattr(self, name, call)
+        return call
+
+
+class _AsyncTodo(_AsyncRepository):
+    async def export_days(self, user_id, start, end, batch_size):
+        for doc in self._repository.export_days(user_id, start, end, batch_size):
+            yield doc
+
+
+class AsyncMemoryStorage:
+    """The repositories of ``storage`` (a MemoryStorage) for db_service_async.py."""
+
+    def __init__(self, storage):
+        self.users = _AsyncRepository(storage.users)
+        self.todo = _AsyncTodo(storage.todo)
+        self.stats = _AsyncRepository(storage.stats)
+        self.exercises = _AsyncRepository(storage.exercises)
+        self.search_history = _AsyncRepository(storage.search_history)
+        self.transcriptions = _AsyncRepository(storage.transcriptions)
+        self.plans = _AsyncRepository(storage.plans)
+
+    async def prepare(self, verify=False):
+        pass
+
+    async def ping(self, timeout):
+        pass
+
+    async def close(self):
+        pass
@@ -0,0 +1,224 @@
+"""
+In-process Prometheus metrics for the fitness tracker services.
+
+Each service is built from its own directory, so each carries an identical
+copy of this module; change all three together.
+
+``instrument_app`` times every request and serves everything recorded so far
+as Prometheus text on ``/metrics``:
+
+- ``http_requests_total{route, method, status}``
+- ``http_request_duration_seconds{route, method}`` (histogram)
+- ``dependency_duration_seconds{dependency, operation}`` (histogram)
+- ``dependency_errors_total{dependency, operation}``
+
+Outbound calls are recorded with ``track_dependency`` or
+``observe_dependency``; ``instrument_requests`` does it for every call made
+through ``requests``. Values live in this process only, so each worker
+process reports its own.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(zip(self.labelnames, labels))} {_format_number(value)}")
+        return lines
+
+
+class Gauge:
+    """A value per label set that can go up and down."""
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(zip(self.labelnames, labels))} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Observations per label set, counted into fixed upper-bound buckets."""
+
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *labels):
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((labels, ([*state[0]], state[1], state[2])) for labels, state in self._values.items())
+        for labels, (bucket_counts, total, count) in values:
+            pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_number(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_number(total)}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {count}")
+        return lines
+
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled, by route, method and status.", ("route", "method", "status")
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests.", ("route", "method")
+)
+DEPENDENCY_LATENCY = Histogram(
+    "dependency_duration_seconds", "Time spent waiting on outbound calls.", ("dependency", "operation")
+)
+DEPENDENCY_ERRORS = Counter(
+    "dependency_errors_total", "Outbound calls that failed.", ("dependency", "operation")
+)
+# Modules with metrics of their own append them here.
+REGISTRY = [REQUESTS, REQUEST_LATENCY, DEPENDENCY_LATENCY, DEPENDENCY_ERRORS]
+
+
+def render():
+    """Every metric in REGISTRY as Prometheus text."""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+def observe_dependency(dependency, operation, seconds, error=False):
+    DEPENDENCY_LATENCY.observe(seconds, dependency, operation)
+    if error:
+        DEPENDENCY_ERRORS.inc(dependency, operation)
+
+
+@contextmanager
+def track_dependency(dependency, operation):
+    """Time the body as one call to ``dependency``; an exception counts as an error."""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        observe_dependency(dependency, operation, time.perf_counter() - start, error)
+
+
+def instrument_app(app, path="/metrics"):
+    """Time every request of ``app`` and serve the metrics on ``path``."""
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            # Unmatched URLs share one label so scanners cannot blow up the series count.
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            REQUESTS.inc(route, request.method, str(response.status_code))
+            REQUEST_LATENCY.observe(time.perf_counter() - started, route, request.method)
+        return response
+
+    app.add_url_rule(path, "metrics", lambda: Response(render(), content_type=CONTENT_TYPE))
+
+
+def instrument_requests(dependencies):
+    """
+    Time every call made through ``requests``. ``dependencies`` maps a base URL
+    to the name it is reported under; other hosts are reported by host. The
+    operation is the method and first path segment, e.g. ``GET /todo``.
+    """
+    import requests
+
+    names = {urlsplit(url).netloc: name for url, name in dependencies.items()}
+    send = requests.Session.send
+    if getattr(send, "_metrics_wrapped", False):
+        return
+
+    def timed_send(self, prepared, **kwargs):
+        url = urlsplit(prepared.url)
+        operation = f"{prepared.method} /{url.path.strip('/').split('/')[0]}"
+        with track_dependency(names.get(url.netloc, url.netloc), operation):
+            return send(self, prepared, **kwargs)
+
+    timed_send._metrics_wrapped = True
+    requests.Session.send = timed_send
@@ -0,0 +1,166 @@
+"""
+One-off data migrations for the db-service collections.
+
+Run from the db-service directory with the same environment as the service:
+
+    python migrations.py backfill-exercise-names
+    python migrations.py merge-duplicate-todo-days
+    python migrations.py rebuild-user-stats
+    python migrations.py dedupe-search-history
+"""
+
+import sys
+from datetime import datetime
+from pymongo import UpdateOne
+from db_service import storage, SEARCH_HISTORY_MAX_ENTRIES
+from exercise_search import exercise_name_fields, normalize_exercise_name
+from indexes import ensure_indexes
+from mongo_storage import MongoStorage
+from user_stats import rebuild_user_stats
+
+if not isinstance(storage, MongoStorage):
+    raise RuntimeError("Migrations only apply to the Mongo backend; unset DB_BACKEND")
+db = storage.db
+exercises_collection = db["exercises"]
+search_history_collection = db["search_history"]
+todo_collection = db["todo"]
+user_stats_collection = db["user_stats"]
+
+
+def backfill_exercise_names(batch_size=1000):
+    """Store the derived search fields on exercises that predate them."""
+    updated = 0
+    batch = []
+    cursor = exercises_collection.find(
+        {"workout_name_keys": {"$exists": False}},
+        {"workout_name": 1}
+    )
+    for exercise in cursor:
+        batch.append(UpdateOne(
+            {"_id": exercise["_id"]},
+            {"$set": exercise_name_fields(exercise.get("workout_name", ""))}
+        ))
+        if len(batch) >= batch_size:
+            updated += exercises_collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += exercises_collection.bulk_write(batch, ordered=False).modified_count
+
+    print(f"Backfilled search fields on {updated} exercises.")
+    return updated
+
+
+def merge_duplicate_todo_days():
+    """
+    Fold every user's todo documents for the same calendar day into one, kept
+    at midnight, then build the unique (user_id, date) index that /todo/add
+    relies on. Items keep the order of the documents they came from.
+    """
+    duplicates = todo_collection.aggregate([
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+            },
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+
+    removed = 0
+    for group in duplicates:
+        docs = list(todo_collection.find({"_id": {"$in": group["ids"]}}).sort("_id", 1))
+        keep, extra = docs[0], docs[1:]
+        todo_collection.update_one({"_id": keep["_id"]}, {"$set": {
+            "date": datetime.strptime(group["_id"]["day"], "%Y-%m-%d"),
+            "todo": [item for doc in docs for item in doc.get("todo", [])],
+        }})
+        removed += todo_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in extra]}}).deleted_count
+
+    print(f"Merged away {removed} duplicate todo day documents.")
+    failed = ensure_indexes(db)
+    if failed:
+        print(f"Indexes still missing: {', '.join(failed)}")
+    return removed
+
+
+def rebuild_user_stats_command():
+    """Recompute user_stats from the todo collection and print where it had drifted."""
+    drift = rebuild_user_stats(todo_collection, user_stats_collection)
+    for user_id, days in drift.items():
+        for day, (stored, actual) in days.items():
+            print(f"{user_id} {day}: stored {stored}, actual {actual}")
+    print(f"Rebuilt user stats; {len(drift)} users had drifted.")
+    return drift
+
+
+def dedupe_search_history(batch_size=1000):
+    """
+    Fold every user's search history into one entry per normalized search,
+    keeping the newest spelling and time and counting the searches as hits,
+    and keep only the SEARCH_HISTORY_MAX_ENTRIES most recent entries. Then
+    drop the old user_time index and build the current ones.
+    """
+    updates = []
+    stale_ids = []
+    kept = {}
+    removed = {"count": 0}
+
+    def flush(force=False):
+        if updates and (force or len(updates) >= batch_size):
+            search_history_collection.bulk_write(updates, ordered=False)
+            updates.clear()
+        if stale_ids and (force or len(stale_ids) >= batch_size):
+            removed["count"] += search_history_collection.delete_many({"_id": {"$in": stale_ids}}).deleted_count
+            stale_ids.clear()
+
+    def finish_user():
+        for entry in kept.values():
+            updates.append(UpdateOne({"_id": entry["_id"]}, {"$set": {
+                "content_key": entry["content_key"], "hits": entry["hits"],
+            }}))
+        kept.clear()
+        flush()
+
+    user_id = None
+    cursor = search_history_collection.find({}, {"user_id": 1, "content": 1, "hits": 1}) \
+        .sort([("user_id", 1), ("time", -1), ("_id", -1)])
+    for entry in cursor:
+        if entry["user_id"] != user_id:
+            finish_user()
+            user_id = entry["user_id"]
+        key = normalize_exercise_name(entry.get("content"))
+        hits = entry.get("hits", 1)
+        if key in kept:
+            kept[key]["hits"] += hits
+            stale_ids.append(entry["_id"])
+        elif len(kept) >= SEARCH_HISTORY_MAX_ENTRIES:
+            stale_ids.append(entry["_id"])
+        else:
+            kept[key] = {"_id": entry["_id"], "content_key": key, "hits": hits}
+    finish_user()
+    flush(force=True)
+
+    if "user_time" in search_history_collection.index_information():
+        search_history_collection.drop_index("user_time")
+    print(f"Removed {removed['count']} duplicate or excess search history entries.")
+    failed = ensure_indexes(db)
+    if failed:
+        print(f"Indexes still missing: {', '.join(failed)}")
+    return removed["count"]
+
+
+MIGRATIONS = {
+    "backfill-exercise-names": backfill_exercise_names,
+    "merge-duplicate-todo-days": merge_duplicate_todo_days,
+    "rebuild-user-stats": rebuild_user_stats_command,
+    "dedupe-search-history": dedupe_search_history,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in MIGRATIONS:
+        print(f"Usage: python migrations.py [{' | '.join(MIGRATIONS)}]")
+        sys.exit(1)
+    MIGRATIONS[sys.argv[1]]()
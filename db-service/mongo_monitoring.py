@@ -0,0 +1,136 @@
+"""
+pymongo event listeners that feed the db-service metrics.
+
+Pass them to ``MongoClient(event_listeners=[...])``. ``PoolMetrics`` follows
+the connection pool (CMAP) events: how many connections are open and checked
+out, and how long requests wait to check one out. Besides the Prometheus
+series it keeps the most recent waits for the pool stats endpoint.
+"""
+
+import threading
+from collections import deque
+from pymongo import monitoring
+from metrics import REGISTRY, Counter, Gauge, Histogram, observe_dependency
+
+POOL_CHECKED_OUT = Gauge(
+    "mongo_pool_checked_out_connections", "Mongo connections checked out of the pool.", ("address",)
+)
+POOL_OPEN = Gauge(
+    "mongo_pool_open_connections", "Mongo connections open in the pool, idle or not.", ("address",)
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting to check a Mongo connection out of the pool.",
+    ("address",), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total", "Mongo connection checkouts that failed, by reason.", ("address", "reason")
+)
+POOL_CLEARED = Counter(
+    "mongo_pool_cleared_total", "Times the Mongo pool was cleared after a server error.", ("address",)
+)
+REGISTRY.extend([POOL_CHECKED_OUT, POOL_OPEN, POOL_CHECKOUT_WAIT, POOL_CHECKOUT_FAILURES, POOL_CLEARED])
+
+
+def _address(event):
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Record the server round trip of every Mongo command, by command name."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        observe_dependency("mongo", event.command_name, event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        observe_dependency("mongo", event.command_name, event.duration_micros / 1_000_000, error=True)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection counts and checkout waits of every pool the client opens."""
+
+    def __init__(self, window=1024):
+        self._waits = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._addresses = set()
+        self.checkouts = 0
+        self.failures = {}
+
+    def _record_wait(self, address, duration):
+        if duration is None:
+            return
+        POOL_CHECKOUT_WAIT.observe(duration, address)
+        with self._lock:
+            self._waits.append(duration)
+
+    def connection_checked_out(self, event):
+        address = _address(event)
+        POOL_CHECKED_OUT.inc(address)
+        self._record_wait(address, event.duration)
+        with self._lock:
+            self.checkouts += 1
+
+    def connection_check_out_failed(self, event):
+        address = _address(event)
+        POOL_CHECKOUT_FAILURES.inc(address, event.reason)
+        self._record_wait(address, event.duration)
+        with self._lock:
+            self.failures[event.reason] = self.failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        POOL_CHECKED_OUT.inc(_address(event), amount=-1)
+
+    def connection_created(self, event):
+        address = _address(event)
+        POOL_OPEN.inc(address)
+        with self._lock:
+            self._addresses.add(address)
+
+    def connection_closed(self, event):
+        POOL_OPEN.inc(_address(event), amount=-1)
+
+    def pool_cleared(self, event):
+        POOL_CLEARED.inc(_address(event))
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def stats(self):
+        """
+        Pool counters for the stats endpoint: open and checked out connections
+        per server, checkouts and failures so far, and wait percentiles in
+        milliseconds over the last ``window`` checkouts.
+        """
+        with self._lock:
+            waits = sorted(self._waits)
+            addresses = sorted(self._addresses)
+            checkouts = self.checkouts
+            failures = dict(self.failures)
+        pools = {
+            address: {"open": POOL_OPEN.value(address), "checked_out": POOL_CHECKED_OUT.value(address)}
+            for address in addresses
+        }
+        wait_ms = {
+            f"p{pct}": round(_percentile(waits, pct) * 1000, 3) if waits else None for pct in (50, 95, 99)
+        }
+        wait_ms["max"] = round(waits[-1] * 1000, 3) if waits else None
+        return {"pools": pools, "checkouts": checkouts, "checkout_failures": failures, "wait_ms": wait_ms}
@@ -0,0 +1,52 @@
+"""
+Where and how the db-service connects to Mongo, shared by db_service.py and
+db_service_async.py. Read after ``load_dotenv()``.
+
+``ENV=TEST`` switches to ``TEST_MONGO_URI``/``TEST_DB_NAME``. Connections use
+TLS with certifi's CA bundle unless ``MONGO_TLS=0``, e.g. for a local mongod.
+
+The connection pool is sized per worker process:
+
+- ``MONGO_MAX_POOL_SIZE`` (default 100) caps the connections to each server.
+- ``MONGO_MIN_POOL_SIZE`` (default 0) keeps that many open while idle.
+- ``MONGO_WAIT_QUEUE_TIMEOUT_MS`` (default 5000) is how long a request waits
+  for a free connection before failing, rather than until gunicorn kills it.
+- ``MONGO_SERVER_SELECTION_TIMEOUT_MS`` (default 10000) is how long an
+  operation waits for a reachable server.
+- ``MONGO_COMPRESSORS`` (e.g. ``zstd,zlib``) enables wire compression, in
+  order of preference. zlib is built in; zstd and snappy need extra packages.
+"""
+
+import os
+import certifi
+
+
+def mongo_uri():
+    return os.getenv("TEST_MONGO_URI") if os.getenv("ENV") == "TEST" else os.getenv("MONGO_URI")
+
+
+def database_name():
+    return os.getenv("TEST_DB_NAME") if os.getenv("ENV") == "TEST" else os.getenv("DB_NAME")
+
+
+def _int_setting(name, default):
+    value = os.getenv(name) or default
+    try:
+        return int(value)
+    except ValueError:
+        raise RuntimeError(f"{name} must be a whole number, not {value!r}") from None
+
+
+def client_options():
+    """Keyword arguments for MongoClient and AsyncMongoClient."""
+    options = {
+        "maxPoolSize": _int_setting("MONGO_MAX_POOL_SIZE", "100"),
+        "minPoolSize": _int_setting("MONGO_MIN_POOL_SIZE", "0"),
+        "waitQueueTimeoutMS": _int_setting("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"),
+        "serverSelectionTimeoutMS": _int_setting("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000"),
+    }
+    if os.getenv("MONGO_COMPRESSORS"):
+        options["compressors"] = os.getenv("MONGO_COMPRESSORS")
+    if os.getenv("MONGO_TLS", "1") != "0":
+        options.update(tls=True, tlsCAFile=certifi.where())
+    return options
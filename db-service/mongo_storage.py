@@ -0,0 +1,588 @@
+"""
+Mongo backend of the db-service storage (see storage.py).
+
+``MongoStorage`` holds the repositories over a MongoClient, for db_service.py;
+``AsyncMongoStorage`` the same over an AsyncMongoClient, for
+db_service_async.py. Every repository keeps its collection as ``collection``,
+and the async repositories subclass the sync ones, so both send Mongo the same
+filters and updates. migrations.py and ``python indexes.py`` work on
+``MongoStorage.db`` directly.
+"""
+
+from datetime import datetime, timedelta
+import pymongo
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from exercise_search import EXERCISE_PROJECTION, normalize_exercise_name
+from indexes import (
+    SEARCH_HISTORY_PROJECTION, ensure_indexes, ensure_indexes_async, verify_indexes, verify_indexes_async,
+)
+from month_summary import month_summary_pipeline, month_weeks, summary_from_buckets
+from todo_bulk import day_operations, sort_write_errors
+from user_stats import (
+    active_days, month_key, month_version, stats_document, stats_increment, user_day_counts_pipeline,
+)
+
+CATALOG_META_ID = "exercises"
+
+TODO_ORDER = [("date", 1), ("_id", 1)]
+SEARCH_HISTORY_ORDER = [("time", -1), ("_id", -1)]
+
+
+def _with_str_id(exercise):
+    if exercise:
+        exercise["_id"] = str(exercise["_id"])
+    return exercise
+
+
+def _normalized_names_filter(names):
+    return {"workout_name_normalized": {"$in": [normalize_exercise_name(name) for name in names]}}
+
+
+def _date_filter(start, end):
+    """Filter on ``date`` from ``start`` (inclusive) to ``end`` (exclusive); either may be None."""
+    date_range = {}
+    if start is not None:
+        date_range["$gte"] = start
+    if end is not None:
+        date_range["$lt"] = end
+    return {"date": date_range} if date_range else {}
+
+
+def _todo_days_query(user_id, start, end, after=None):
+    """The user's days between ``start`` and ``end``, past the ``(date, _id)`` of ``after``."""
+    query = {"user_id": user_id, **_date_filter(start, end)}
+    if after is not None:
+        after_date, after_id = after
+        query["$or"] = [
+            {"date": {"$gt": after_date}},
+            {"date": after_date, "_id": {"$gt": after_id}}
+        ]
+    return query
+
+
+def todo_items_projection(fields, max_items):
+    """
+    $project expression for a day's todo items: the first ``max_items`` items
+    (all when None), each cut down to ``fields`` (whole items when empty).
+    """
+    items = {"$ifNull": ["$todo", []]}
+    if max_items is not None:
+        items = {"$slice": [items, max_items]}
+    if fields:
+        items = {"$map": {"input": items, "as": "item", "in": {field: f"$$item.{field}" for field in fields}}}
+    return items
+
+
+def _trimmed_days_pipeline(query, fields, max_items):
+    return [
+        {"$match": query},
+        {"$project": {"user_id": 1, "date": 1, "todo": todo_items_projection(fields, max_items)}},
+    ]
+
+
+def _item_filter(user_id, day, exercise_todo_id):
+    return {"user_id": user_id, "date": day, "todo.exercise_todo_id": exercise_todo_id}
+
+
+def _item_projection(exercise_todo_id):
+    """Only the matching item of the day; Mongo sends nothing else back."""
+    return {"_id": 0, "todo": {"$elemMatch": {"exercise_todo_id": exercise_todo_id}}}
+
+
+def _first_item(todo_data):
+    return todo_data["todo"][0] if todo_data and todo_data.get("todo") else None
+
+
+def _item_update(fields):
+    return {"$set": {f"todo.$.{key}": value for key, value in fields.items()}}
+
+
+def _push_result(result):
+    """push_item's answer from the UpdateResult of its upsert."""
+    if result.upserted_id is not None:
+        return True
+    return False if result.modified_count > 0 else None
+
+
+def _removed_items(before, exercise_todo_id):
+    """How many items a pull took out, given the day as it was before, or None without a day."""
+    if not before:
+        return None
+    return sum(item.get("exercise_todo_id") == exercise_todo_id for item in before.get("todo", []))
+
+
+def _search_history_query(user_id, after):
+    """The user's entries older than the ``(time, _id)`` of ``after``."""
+    query = {"user_id": user_id}
+    if after is not None:
+        after_time, after_id = after
+        query["$or"] = [
+            {"time": {"$lt": after_time}},
+            {"time": after_time, "_id": {"$lt": after_id}}
+        ]
+    return query
+
+
+def _search_bump(user_id, content):
+    """Filter and update bumping the user's entry for ``content``."""
+    return (
+        {"user_id": user_id, "content_key": normalize_exercise_name(content)},
+        {"$set": {"content": content, "time": datetime.utcnow()}, "$inc": {"hits": 1}},
+    )
+
+
+class MongoUsers:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, user_id):
+        return self.collection.find_one({"_id": ObjectId(user_id)})
+
+    def find_by_username(self, username):
+        return self.collection.find_one({"username": username})
+
+    def create(self, user):
+        return self.collection.insert_one(user).inserted_id
+
+    def update(self, user_id, fields):
+        return self.collection.update_one({"_id": ObjectId(user_id)}, {"$set": fields}).modified_count > 0
+
+
+class MongoTodo:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get_day(self, user_id, day):
+        return self.collection.find_one({"user_id": user_id, **_date_filter(day, day + timedelta(days=1))})
+
+    def _push(self, user_id, day, item):
+        return self.collection.update_one({"user_id": user_id, "date": day}, {"$push": {"todo": item}}, upsert=True)
+
+    def push_item(self, user_id, day, item):
+        # One round trip; the unique (user_id, date) index makes concurrent
+        # adds for the same day land in the same document.
+        try:
+            result = self._push(user_id, day, item)
+        except DuplicateKeyError:
+            # Lost the insert race to another upsert: the day now exists.
+            result = self._push(user_id, day, item)
+        return _push_result(result)
+
+    def push_items(self, user_id, items_by_day):
+        """
+        One unordered bulk_write of upserts, one per day. Upserts that lost an
+        insert race are replayed once.
+        """
+        days = list(items_by_day)
+        operations = day_operations(user_id, days, items_by_day)
+        errors = {}
+        pending = list(range(len(days)))
+        for attempt in range(2):
+            try:
+                self.collection.bulk_write([operations[i] for i in pending], ordered=False)
+                break
+            except BulkWriteError as e:
+                pending = sort_write_errors(e, pending, errors, can_retry=not attempt)
+                if not pending:
+                    break
+        return {days[i]: message for i, message in errors.items()}
+
+    def find_item(self, user_id, day, exercise_todo_id):
+        return _first_item(self.collection.find_one(
+            _item_filter(user_id, day, exercise_todo_id), _item_projection(exercise_todo_id)
+        ))
+
+    def update_item(self, user_id, day, exercise_todo_id, fields):
+        result = self.collection.update_one(_item_filter(user_id, day, exercise_todo_id), _item_update(fields))
+        return result.modified_count > 0
+
+    def pull_item(self, user_id, day, exercise_todo_id):
+        # The document as it was before the pull tells how many items went.
+        before = self.collection.find_one_and_update(
+            {"user_id": user_id, "date": day},
+            {"$pull": {"todo": {"exercise_todo_id": exercise_todo_id}}},
+            projection={"todo.exercise_todo_id": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        return _removed_items(before, exercise_todo_id)
+
+    def history(self, user_id, start, end, after, limit):
+        return list(self.collection.find(_todo_days_query(user_id, start, end, after)).sort(TODO_ORDER).limit(limit))
+
+    def between(self, user_id, start, end, fields=(), max_items=None):
+        query = {"user_id": user_id, **_date_filter(start, end)}
+        if fields or max_items is not None:
+            return list(self.collection.aggregate(_trimmed_days_pipeline(query, fields, max_items)))
+        return list(self.collection.find(query))
+
+    def export_days(self, user_id, start, end, batch_size):
+        cursor = self.collection.find(_todo_days_query(user_id, start, end), {"user_id": 0}) \
+            .sort(TODO_ORDER).batch_size(batch_size)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def month_summary(self, user_id, month_start):
+        boundaries = month_weeks(month_start)
+        return summary_from_buckets(boundaries, self.collection.aggregate(month_summary_pipeline(user_id, boundaries)))
+
+
+class MongoStats:
+    """user_stats, counted from the todo collection for users without a complete document."""
+
+    def __init__(self, collection, todo_collection):
+        self.collection = collection
+        self.todo_collection = todo_collection
+
+    def get(self, user_id):
+        stats = self.collection.find_one({"_id": user_id})
+        if stats is None or not stats.get("complete"):
+            stats = self._recount(user_id, self.todo_collection.aggregate(user_day_counts_pipeline(user_id)))
+        return stats
+
+    def days(self, user_id):
+        return active_days(self.get(user_id))
+
+    def increment(self, user_id, counts_by_day):
+        update = stats_increment(counts_by_day)
+        if update is None:
+            return
+        if not self.collection.update_one({"_id": user_id, "complete": True}, update).matched_count:
+            # Nothing complete to add to: count the todos, this write
+            # included, and only stamp the months it touched.
+            self._recount(user_id, self.todo_collection.aggregate(user_day_counts_pipeline(user_id)))
+            self.collection.update_one({"_id": user_id}, {"$set": update["$set"]})
+
+    def discard(self, user_id):
+        """Drop the user's counts, so the next read counts their todos again."""
+        self.collection.delete_one({"_id": user_id})
+
+    def _recount(self, user_id, day_counts):
+        stats = stats_document(user_id, {day["_id"]["day"]: day["count"] for day in day_counts})
+        try:
+            self.collection.replace_one({"_id": user_id}, stats, upsert=True)
+        except DuplicateKeyError:
+            pass  # A concurrent recount stored the same counts first.
+        return stats
+
+    def month_version(self, user_id, month_start):
+        stats = self.collection.find_one({"_id": user_id}, {f"month_versions.{month_key(month_start)}": 1})
+        return month_version(stats, month_start)
+
+
+class MongoExercises:
+    """The exercises collection, with the catalog revision in ``catalog_meta``."""
+
+    def __init__(self, collection, meta_collection):
+        self.collection = collection
+        self.meta_collection = meta_collection
+
+    def revision(self):
+        meta = self.meta_collection.find_one({"_id": CATALOG_META_ID})
+        return meta["revision"] if meta else 0
+
+    def bump_revision(self):
+        self.meta_collection.update_one({"_id": CATALOG_META_ID}, {"$inc": {"revision": 1}}, upsert=True)
+
+    def all(self):
+        return self.collection.find({})
+
+    def get(self, exercise_id):
+        return _with_str_id(self.collection.find_one({"_id": ObjectId(exercise_id)}, EXERCISE_PROJECTION))
+
+    def get_many(self, exercise_ids):
+        cursor = self.collection.find({"_id": {"$in": [ObjectId(i) for i in exercise_ids]}}, EXERCISE_PROJECTION)
+        return [_with_str_id(exercise) for exercise in cursor]
+
+    def find_by_names(self, names):
+        cursor = self.collection.find(_normalized_names_filter(names), EXERCISE_PROJECTION)
+        return [_with_str_id(exercise) for exercise in cursor]
+
+    def add(self, exercise):
+        return self.collection.insert_one(exercise).inserted_id
+
+    def update(self, exercise_id, fields):
+        return self.collection.update_one({"_id": ObjectId(exercise_id)}, {"$set": fields}).modified_count > 0
+
+    def delete(self, exercise_id):
+        return self.collection.delete_one({"_id": ObjectId(exercise_id)}).deleted_count > 0
+
+
+class MongoSearchHistory:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def _bump(self, user_id, content):
+        return self.collection.update_one(*_search_bump(user_id, content), upsert=True)
+
+    def record(self, user_id, content, max_entries):
+        try:
+            result = self._bump(user_id, content)
+        except DuplicateKeyError:
+            # Lost the insert race to the same search: the entry now exists.
+            result = self._bump(user_id, content)
+        # Only a new entry can push the history past the cap.
+        if result.upserted_id is not None:
+            stale = self.collection.find({"user_id": user_id}, {"_id": 1}) \
+                .sort(SEARCH_HISTORY_ORDER).skip(max_entries)
+            stale_ids = [entry["_id"] for entry in stale]
+            if stale_ids:
+                self.collection.delete_many({"_id": {"$in": stale_ids}})
+
+    def page(self, user_id, after, limit):
+        return list(
+            self.collection.find(_search_history_query(user_id, after), SEARCH_HISTORY_PROJECTION)
+            .sort(SEARCH_HISTORY_ORDER).limit(limit)
+        )
+
+
+class MongoEntries:
+    """An append-only collection: transcriptions and plans."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def add(self, entry):
+        return self.collection.insert_one(entry).inserted_id
+
+
+class MongoStorage:
+    """The db-service repositories over one database of a MongoClient."""
+
+    def __init__(self, client, db_name):
+        self.client = client
+        self.db = client[db_name]
+        self.users = MongoUsers(self.db["users"])
+        self.todo = MongoTodo(self.db["todo"])
+        self.stats = MongoStats(self.db["user_stats"], self.db["todo"])
+        self.exercises = MongoExercises(self.db["exercises"], self.db["catalog_meta"])
+        self.search_history = MongoSearchHistory(self.db["search_history"])
+        self.transcriptions = MongoEntries(self.db["edit_transcription"])
+        self.plans = MongoEntries(self.db["plans"])
+
+    def prepare(self, verify=False):
+        """Create the indexes and, with ``verify``, raise IndexCheckError if a hot query would COLLSCAN."""
+        ensure_indexes(self.db)
+        if verify:
+            verify_indexes(self.db)
+
+    def ping(self, timeout):
+        with pymongo.timeout(timeout):
+            self.client.admin.command("ping")
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncMongoUsers(MongoUsers):
+    async def get(self, user_id):
+        return await self.collection.find_one({"_id": ObjectId(user_id)})
+
+    async def find_by_username(self, username):
+        return await self.collection.find_one({"username": username})
+
+    async def create(self, user):
+        return (await self.collection.insert_one(user)).inserted_id
+
+    async def update(self, user_id, fields):
+        return (await self.collection.update_one({"_id": ObjectId(user_id)}, {"$set": fields})).modified_count > 0
+
+
+class AsyncMongoTodo(MongoTodo):
+    async def get_day(self, user_id, day):
+        return await self.collection.find_one({"user_id": user_id, **_date_filter(day, day + timedelta(days=1))})
+
+    async def _push(self, user_id, day, item):
+        return await self.collection.update_one(
+            {"user_id": user_id, "date": day}, {"$push": {"todo": item}}, upsert=True
+        )
+
+    async def push_item(self, user_id, day, item):
+        try:
+            result = await self._push(user_id, day, item)
+        except DuplicateKeyError:
+            result = await self._push(user_id, day, item)
+        return _push_result(result)
+
+    async def push_items(self, user_id, items_by_day):
+        days = list(items_by_day)
+        operations = day_operations(user_id, days, items_by_day)
+        errors = {}
+        pending = list(range(len(days)))
+        for attempt in range(2):
+            try:
+                await self.collection.bulk_write([operations[i] for i in pending], ordered=False)
+                break
+            except BulkWriteError as e:
+                pending = sort_write_errors(e, pending, errors, can_retry=not attempt)
+                if not pending:
+                    break
+        return {days[i]: message for i, message in errors.items()}
+
+    async def find_item(self, user_id, day, exercise_todo_id):
+        return _first_item(await self.collection.find_one(
+            _item_filter(user_id, day, exercise_todo_id), _item_projection(exercise_todo_id)
+        ))
+
+    async def update_item(self, user_id, day, exercise_todo_id, fields):
+        result = await self.collection.update_one(_item_filter(user_id, day, exercise_todo_id), _item_update(fields))
+        return result.modified_count > 0
+
+    async def pull_item(self, user_id, day, exercise_todo_id):
+        before = await self.collection.find_one_and_update(
+            {"user_id": user_id, "date": day},
+            {"$pull": {"todo": {"exercise_todo_id": exercise_todo_id}}},
+            projection={"todo.exercise_todo_id": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        return _removed_items(before, exercise_todo_id)
+
+    async def history(self, user_id, start, end, after, limit):
+        return await self.collection.find(_todo_days_query(user_id, start, end, after)) \
+            .sort(TODO_ORDER).limit(limit).to_list(None)
+
+    async def between(self, user_id, start, end, fields=(), max_items=None):
+        query = {"user_id": user_id, **_date_filter(start, end)}
+        if fields or max_items is not None:
+            cursor = await self.collection.aggregate(_trimmed_days_pipeline(query, fields, max_items))
+        else:
+            cursor = self.collection.find(query)
+        return await cursor.to_list(None)
+
+    async def export_days(self, user_id, start, end, batch_size):
+        cursor = self.collection.find(_todo_days_query(user_id, start, end), {"user_id": 0}) \
+            .sort(TODO_ORDER).batch_size(batch_size)
+        try:
+            async for day in cursor:
+                yield day
+        finally:
+            await cursor.close()
+
+    async def month_summary(self, user_id, month_start):
+        boundaries = month_weeks(month_start)
+        buckets = await self.collection.aggregate(month_summary_pipeline(user_id, boundaries))
+        return summary_from_buckets(boundaries, await buckets.to_list(None))
+
+
+class AsyncMongoStats(MongoStats):
+    async def get(self, user_id):
+        stats = await self.collection.find_one({"_id": user_id})
+        if stats is None or not stats.get("complete"):
+            stats = await self._recount(user_id)
+        return stats
+
+    async def days(self, user_id):
+        return active_days(await self.get(user_id))
+
+    async def increment(self, user_id, counts_by_day):
+        update = stats_increment(counts_by_day)
+        if update is None:
+            return
+        if not (await self.collection.update_one({"_id": user_id, "complete": True}, update)).matched_count:
+            await self._recount(user_id)
+            await self.collection.update_one({"_id": user_id}, {"$set": update["$set"]})
+
+    async def discard(self, user_id):
+        await self.collection.delete_one({"_id": user_id})
+
+    async def _recount(self, user_id):
+        day_counts = await self.todo_collection.aggregate(user_day_counts_pipeline(user_id))
+        stats = stats_document(user_id, {day["_id"]["day"]: day["count"] for day in await day_counts.to_list(None)})
+        try:
+            await self.collection.replace_one({"_id": user_id}, stats, upsert=True)
+        except DuplicateKeyError:
+            pass
+        return stats
+
+    async def month_version(self, user_id, month_start):
+        stats = await self.collection.find_one({"_id": user_id}, {f"month_versions.{month_key(month_start)}": 1})
+        return month_version(stats, month_start)
+
+
+class AsyncMongoExercises(MongoExercises):
+    async def revision(self):
+        meta = await self.meta_collection.find_one({"_id": CATALOG_META_ID})
+        return meta["revision"] if meta else 0
+
+    async def bump_revision(self):
+        await self.meta_collection.update_one({"_id": CATALOG_META_ID}, {"$inc": {"revision": 1}}, upsert=True)
+
+    async def all(self):
+        return await self.collection.find({}).to_list(None)
+
+    async def get(self, exercise_id):
+        return _with_str_id(await self.collection.find_one({"_id": ObjectId(exercise_id)}, EXERCISE_PROJECTION))
+
+    async def get_many(self, exercise_ids):
+        cursor = self.collection.find({"_id": {"$in": [ObjectId(i) for i in exercise_ids]}}, EXERCISE_PROJECTION)
+        return [_with_str_id(exercise) async for exercise in cursor]
+
+    async def find_by_names(self, names):
+        cursor = self.collection.find(_normalized_names_filter(names), EXERCISE_PROJECTION)
+        return [_with_str_id(exercise) async for exercise in cursor]
+
+    async def add(self, exercise):
+        return (await self.collection.insert_one(exercise)).inserted_id
+
+    async def update(self, exercise_id, fields):
+        result = await self.collection.update_one({"_id": ObjectId(exercise_id)}, {"$set": fields})
+        return result.modified_count > 0
+
+    async def delete(self, exercise_id):
+        return (await self.collection.delete_one({"_id": ObjectId(exercise_id)})).deleted_count > 0
+
+
+class AsyncMongoSearchHistory(MongoSearchHistory):
+    async def _bump(self, user_id, content):
+        return await self.collection.update_one(*_search_bump(user_id, content), upsert=True)
+
+    async def record(self, user_id, content, max_entries):
+        try:
+            result = await self._bump(user_id, content)
+        except DuplicateKeyError:
+            result = await self._bump(user_id, content)
+        if result.upserted_id is not None:
+            stale = self.collection.find({"user_id": user_id}, {"_id": 1}) \
+                .sort(SEARCH_HISTORY_ORDER).skip(max_entries)
+            stale_ids = [entry["_id"] async for entry in stale]
+            if stale_ids:
+                await self.collection.delete_many({"_id": {"$in": stale_ids}})
+
+    async def page(self, user_id, after, limit):
+        return await self.collection.find(_search_history_query(user_id, after), SEARCH_HISTORY_PROJECTION) \
+            .sort(SEARCH_HISTORY_ORDER).limit(limit).to_list(None)
+
+
+class AsyncMongoEntries(MongoEntries):
+    async def add(self, entry):
+        return (await self.collection.insert_one(entry)).inserted_id
+
+
+class AsyncMongoStorage(MongoStorage):
+    """MongoStorage over an AsyncMongoClient; every repository method is a coroutine."""
+
+    def __init__(self, client, db_name):
+        self.client = client
+        self.db = client[db_name]
+        self.users = AsyncMongoUsers(self.db["users"])
+        self.todo = AsyncMongoTodo(self.db["todo"])
+        self.stats = AsyncMongoStats(self.db["user_stats"], self.db["todo"])
+        self.exercises = AsyncMongoExercises(self.db["exercises"], self.db["catalog_meta"])
+        self.search_history = AsyncMongoSearchHistory(self.db["search_history"])
+        self.transcriptions = AsyncMongoEntries(self.db["edit_transcription"])
+        self.plans = AsyncMongoEntries(self.db["plans"])
+
+    async def prepare(self, verify=False):
+        await ensure_indexes_async(self.db)
+        if verify:
+            await verify_indexes_async(self.db)
+
+    async def ping(self, timeout):
+        with pymongo.timeout(timeout):
+            await self.client.admin.command("ping")
+
+    async def close(self):
+        await self.client.close()
@@ -0,0 +1,122 @@
+"""
+Week-by-week summaries of a user's month, for the month calendar view.
+
+A month is cut into 7-day weeks starting on the 1st (1-7, 8-14, ..., 29-end),
+and each week lists the first ``WEEK_PREVIEW_ITEMS`` exercise names planned in
+it. The Mongo backend buckets the days with ``$bucket``; the memory backend
+buckets them itself into the same shape.
+
+Summaries are cached per (user, month) in each process, together with the
+month's stamp in the user's stats (see user_stats.py). Every todo write gives
+the months it touched a new stamp, so a worker serves a cached summary only
+while the stamp it was built under is still current, whichever worker took
+the write. Entries also expire after ``ttl`` seconds, which bounds how stale
+a summary gets when a stats update fails. ``AsyncMonthSummaryCache`` does the
+same for db_service_async.py.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+WEEK_PREVIEW_ITEMS = 3
+
+
+def month_weeks(month_start):
+    """Start of every week in the month, followed by the start of the next month."""
+    next_month = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    starts = []
+    week_start = month_start
+    while week_start < next_month:
+        starts.append(week_start)
+        week_start += timedelta(days=7)
+    return starts + [next_month]
+
+
+def month_summary_pipeline(user_id, boundaries):
+    """Aggregation bucketing the user's days between the first and last of ``boundaries``."""
+    return [
+        {"$match": {"user_id": user_id, "date": {"$gte": boundaries[0], "$lt": boundaries[-1]}}},
+        {"$sort": {"date": 1}},
+        {"$bucket": {
+            "groupBy": "$date",
+            "boundaries": boundaries,
+            "output": {"days": {"$push": {"$slice": [
+                {"$ifNull": ["$todo.workout_name", []]}, WEEK_PREVIEW_ITEMS
+            ]}}},
+        }},
+    ]
+
+
+def summary_from_buckets(boundaries, buckets):
+    """{"YYYY-MM-DD" week start: [workout names]} from the month_summary_pipeline output."""
+    summary = {week_start.strftime("%Y-%m-%d"): [] for week_start in boundaries[:-1]}
+    for bucket in buckets:
+        names = [name for day in bucket["days"] for name in day]
+        summary[bucket["_id"].strftime("%Y-%m-%d")] = names[:WEEK_PREVIEW_ITEMS]
+    return summary
+
+
+class MonthSummaryCache:
+    """
+    LRU of month summaries, checked against the month's stamp and expired
+    after ``ttl`` seconds. ``build(user_id, month_start)`` makes a summary on
+    a miss; ``version(user_id, month_start)`` reads the stamp.
+    """
+
+    def __init__(self, build, version, ttl=60.0, max_entries=1024):
+        self.build = build
+        self.version = version
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, month_start):
+        """The summary for ``month_start`` (the 1st, at midnight), built on a miss."""
+        # The stamp is read before building, so a write that lands during the
+        # build leaves the entry behind the stamp and the next read rebuilds.
+        version = self.version(user_id, month_start)
+        key, summary = self._lookup(user_id, month_start, version)
+        if summary is None:
+            summary = self.build(user_id, month_start)
+            self._store(key, version, summary)
+        return summary
+
+    def _lookup(self, user_id, month_start, version):
+        """``(key, cached summary or None)``."""
+        key = (user_id, month_start.strftime("%Y-%m"))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == version and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return key, entry[2]
+            self.misses += 1
+            return key, None
+
+    def _store(self, key, version, summary):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), version, summary)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class AsyncMonthSummaryCache(MonthSummaryCache):
+    """MonthSummaryCache whose ``build`` and ``version`` are coroutines, as is ``get``."""
+
+    async def get(self, user_id, month_start):
+        version = await self.version(user_id, month_start)
+        key, summary = self._lookup(user_id, month_start, version)
+        if summary is None:
+            summary = await self.build(user_id, month_start)
+            self._store(key, version, summary)
+        return summary
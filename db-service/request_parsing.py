@@ -0,0 +1,133 @@
+"""
+Request parsing shared by the Flask app (db_service.py) and the asyncio app
+(db_service_async.py), so both accept the same arguments and answer bad ones
+with the same errors. Parsers return plain values; turning them into queries
+is left to the storage backend.
+
+Every parser raises ValueError with a message fit for the ``{"error": ...}``
+body of a 400.
+"""
+
+import base64
+import binascii
+import json
+import re
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+TODO_ITEM_FIELD = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def parse_limit(value, default=DEFAULT_PAGE_LIMIT):
+    """Parse a page size, raising ValueError when it is not 1..MAX_PAGE_LIMIT."""
+    limit = default if value in (None, "") else int(value)
+    if not 1 <= limit <= MAX_PAGE_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_LIMIT}")
+    return limit
+
+
+def encode_cursor(*values):
+    """Opaque page token holding the sort key of the last item on a page."""
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else str(value) for value in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor. Raises ValueError on a malformed token."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def decode_time_cursor(token):
+    """Decode a ``(datetime, ObjectId)`` cursor."""
+    try:
+        time_value, object_id = decode_cursor(token)
+        return datetime.fromisoformat(time_value), ObjectId(object_id)
+    except (TypeError, InvalidId) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def parse_date_range(args):
+    """
+    ``(start, end)`` days from optional inclusive start_date/end_date
+    (YYYY-MM-DD) args: ``end`` is the day after end_date, and either is None
+    when not given.
+    """
+    start = datetime.strptime(args["start_date"], "%Y-%m-%d") if args.get("start_date") else None
+    end = datetime.strptime(args["end_date"], "%Y-%m-%d") + timedelta(days=1) if args.get("end_date") else None
+    return start, end
+
+
+def parse_exercise_search_page(data):
+    """``(limit, after)`` of a prefix /exercises/search request."""
+    try:
+        limit = parse_limit(data.get("limit"))
+        after = decode_cursor(data["after"]) if data.get("after") else None
+        if after is not None and (len(after) != 2 or not all(isinstance(v, str) for v in after)):
+            raise ValueError("invalid cursor")
+    except TypeError as e:
+        raise ValueError(str(e)) from e
+    return limit, after
+
+
+def parse_ranked_search(data):
+    """``(limit, min_score)`` of a ranked /exercises/search request."""
+    try:
+        limit = int(data.get("limit", 10))
+        min_score = float(data.get("min_score", 0.3))
+    except (TypeError, ValueError) as e:
+        raise ValueError("limit must be an integer and min_score a number") from e
+    if not 1 <= limit <= 100 or not 0 <= min_score <= 1:
+        raise ValueError("limit must be 1-100 and min_score 0-1")
+    return limit, min_score
+
+
+def search_history_page(args):
+    """``(after, limit)`` for a page of /search-history/get, newest first; ``after`` is a ``(time, _id)`` or None."""
+    limit = parse_limit(args.get("limit"), default=20)
+    after = decode_time_cursor(args["after"]) if args.get("after") else None
+    return after, limit
+
+
+def todo_history_page(args):
+    """
+    ``(start, end, after, limit)`` for a page of /todo/<user_id>, oldest day
+    first: the parse_date_range bounds, and the ``(date, _id)`` of the last
+    day already sent or None.
+    """
+    limit = parse_limit(args.get("limit"), default=100)
+    start, end = parse_date_range(args)
+    after = decode_time_cursor(args["after"]) if args.get("after") else None
+    return start, end, after, limit
+
+
+def parse_todo_item_fields(args):
+    """``(fields, max_items)`` trimming each day of /todo/get_by_date; both may be empty."""
+    fields = [field for field in args.get("fields", "").split(",") if field]
+    if not all(TODO_ITEM_FIELD.match(field) for field in fields):
+        raise ValueError("fields must be comma separated item field names")
+    max_items = args.get("max_items")
+    if max_items is not None:
+        if not max_items.isdigit() or int(max_items) < 1:
+            raise ValueError("max_items must be a positive integer")
+        max_items = int(max_items)
+    return fields, max_items
+
+
+def parse_stats_day_range(args):
+    """
+    Inclusive ``(start, end)`` "YYYY-MM-DD" bounds for /todo/stats/daily,
+    zero-padded like the day keys they are compared with.
+    """
+    start, end = parse_date_range(args)
+    return (
+        start.strftime("%Y-%m-%d") if start else "",
+        (end - timedelta(days=1)).strftime("%Y-%m-%d") if end else "9999-12-31",
+    )
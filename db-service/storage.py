@@ -0,0 +1,61 @@
+"""
+Storage backends for the db-service.
+
+Route handlers do not talk to a database directly; they go through the
+repositories of a storage object:
+
+- ``users``: accounts, looked up by id or username.
+- ``todo``: one document per user and day holding that day's items.
+- ``stats``: each user's item counts per day (see user_stats.py).
+- ``exercises``: the exercise catalog and its revision counter (see catalog.py).
+- ``search_history``: each user's deduplicated, capped searches.
+- ``transcriptions`` and ``plans``: append-only entries.
+
+Repository methods take and return plain documents, so the handlers, the
+caches and the JSON they serve do not depend on the backend. The storage
+object also has ``prepare(verify=False)`` (create indexes at start-up),
+``ping(timeout)`` for /readyz and ``close()``.
+
+``DB_BACKEND`` picks the backend:
+
+- ``mongo`` (the default): mongo_storage.py, on the database configured in
+  mongo_settings.py.
+- ``memory``: memory_storage.py, which keeps everything in the process. It
+  needs no database, so the tests and benchmarks run offline and show what
+  the service costs without Mongo. Data is lost on exit and each gunicorn
+  worker has its own, so gunicorn.conf.py starts a single worker.
+
+``open_storage`` is for db_service.py and ``open_async_storage`` for
+db_service_async.py, whose repository methods are coroutines.
+"""
+
+import os
+from pymongo import AsyncMongoClient, MongoClient
+from memory_storage import AsyncMemoryStorage, shared_storage
+from mongo_settings import database_name, mongo_uri
+from mongo_storage import AsyncMongoStorage, MongoStorage
+
+BACKENDS = ("mongo", "memory")
+
+
+def storage_backend():
+    backend = os.getenv("DB_BACKEND", "mongo")
+    if backend not in BACKENDS:
+        raise RuntimeError(f"DB_BACKEND must be one of {', '.join(BACKENDS)}, not {backend!r}")
+    return backend
+
+
+def open_storage(client_options, event_listeners=()):
+    """The configured storage, with a MongoClient built from ``client_options`` and ``event_listeners``."""
+    if storage_backend() == "memory":
+        return shared_storage()
+    client = MongoClient(mongo_uri(), event_listeners=list(event_listeners), **client_options)
+    return MongoStorage(client, database_name())
+
+
+def open_async_storage(client_options, event_listeners=()):
+    """open_storage for db_service_async.py, with an AsyncMongoClient."""
+    if storage_backend() == "memory":
+        return AsyncMemoryStorage(shared_storage())
+    client = AsyncMongoClient(mongo_uri(), event_listeners=list(event_listeners), **client_options)
+    return AsyncMongoStorage(client, database_name())
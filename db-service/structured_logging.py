@@ -0,0 +1,103 @@
+"""
+Logging setup for the fitness tracker services.
+
+Each service is built from its own directory, so each carries an identical
+copy of this module; change all three together.
+
+Records go to stdout as one JSON object per line, with the service, the Flask
+route and any ``extra=`` fields attached. ``LOG_LEVEL`` sets the level
+(default INFO).
+
+Inside a request, DEBUG and INFO records are sampled per route. The decision
+is made once per request so a request logs all of its records or none.
+``LOG_SAMPLE_RATE`` (default 1) is the share of requests that log, and
+``LOG_SAMPLE_RATES`` overrides it for single routes, using the route rule:
+
+    LOG_SAMPLE_RATES="/todo/add=0.01,/todo/get/<string:user_id>=0.1"
+
+Warnings and errors are always kept. Pass values as arguments
+(``logger.debug("todo %s", doc)``) rather than f-strings, so nothing is
+formatted for a record that is dropped.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import time
+from flask import g, has_request_context, request
+
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule else request.path
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    converter = time.gmtime
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        entry = {
+            "time": f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if has_request_context():
+            entry["method"] = request.method
+            entry["route"] = _route()
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RouteSampler(logging.Filter):
+    """Keep DEBUG/INFO records for a sampled share of each route's requests."""
+
+    def __init__(self, default_rate=1.0, rates=None):
+        super().__init__()
+        self.default_rate = default_rate
+        self.rates = rates or {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not has_request_context():
+            return True
+        sampled = g.get("_log_sampled")
+        if sampled is None:
+            rate = self.rates.get(_route(), self.default_rate)
+            sampled = g._log_sampled = rate >= 1 or random.random() < rate
+        return sampled
+
+
+def parse_sample_rates(value):
+    """``"/a=0.1,/b=1"`` -> ``{"/a": 0.1, "/b": 1.0}``."""
+    rates = {}
+    for part in filter(None, (part.strip() for part in (value or "").split(","))):
+        route, _, rate = part.rpartition("=")
+        rates[route] = float(rate)
+    return rates
+
+
+def configure_logging(service):
+    """Send every log record of this process to stdout as JSON, sampled per route."""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter(service))
+    handler.addFilter(RouteSampler(
+        float(os.getenv("LOG_SAMPLE_RATE", "1")),
+        parse_sample_rates(os.getenv("LOG_SAMPLE_RATES")),
+    ))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
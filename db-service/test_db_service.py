@@ -13,14 +13,54 @@ load_dotenv()
 
 from db_service import app
 
+# DB_BACKEND=memory runs the suite without Mongo. Tests seed and check data
+# through db_service.storage; only the index and migration tests use Mongo
+# directly (through db_connection), and they are skipped.
+MEMORY_BACKEND = os.getenv("DB_BACKEND") == "memory"
+
+@pytest.fixture(scope="session")
+def async_app():
+    """db_service_async.app behind a WSGI adapter, started on an event loop of its own."""
+    import asyncio
+    import threading
+    from a2wsgi import ASGIMiddleware
+    import db_service_async
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(db_service_async.app.startup(), loop).result()
+    yield ASGIMiddleware(db_service_async.app, loop=loop)
+    asyncio.run_coroutine_threadsafe(db_service_async.app.shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+@pytest.fixture(params=["db_service", "db_service_async"])
+def service(request):
+    """The module of the implementation under test; tests using ``client`` run against both."""
+    import importlib
+    return importlib.import_module(request.param)
+
 @pytest.fixture
-def client():
-    app.config['TESTING'] = True
-    with app.test_client() as client:
-        yield client
+def client(service, request):
+    if service.__name__ == "db_service":
+        app.config['TESTING'] = True
+        with app.test_client() as client:
+            yield client
+    else:
+        from werkzeug.test import Client
+
+        class BufferedClient(Client):
+            # Reading the whole body closes it, which lets the ASGI request task finish.
+            def open(self, *args, buffered=True, **kwargs):
+                return super().open(*args, buffered=buffered, **kwargs)
+
+        yield BufferedClient(request.getfixturevalue("async_app"))
 
 @pytest.fixture(scope="session")
 def db_connection():
+    if MEMORY_BACKEND:
+        pytest.skip("reads or writes Mongo directly")
     mongo_uri = os.getenv("TEST_MONGO_URI")
     db_name = os.getenv("TEST_DB_NAME")
     client = MongoClient(mongo_uri, tls=True, tlsCAFile=certifi.where())
@@ -28,15 +68,23 @@ def db_connection():
     yield db
     client.close()
 
+@pytest.fixture
+def added_exercises():
+    """Ids of the exercises a test adds, deleted through the storage layer afterwards."""
+    from db_service import storage
+    exercise_ids = []
+    yield exercise_ids
+    for exercise_id in exercise_ids:
+        storage.exercises.delete(exercise_id)
+    storage.exercises.bump_revision()
+
 @pytest.fixture(autouse=True)
-def setup_test_collections(db_connection):
+def setup_test_collections(request):
     test_user = {
         "_id": ObjectId(),
         "username": f"testuser_{datetime.utcnow().timestamp()}",
         "password": generate_password_hash("testpass")
     }
-    db_connection.users.insert_one(test_user)
-    
     test_exercise = {
         "_id": ObjectId(),
         "workout_name": "Test Exercise",
@@ -46,19 +94,32 @@ def setup_test_collections(db_connection):
         "reps": None,
         "weight": None
     }
-    db_connection.exercises.insert_one(test_exercise)
-    
-    yield {
+    ids = {
         "user_id": str(test_user["_id"]),
         "exercise_id": str(test_exercise["_id"])
     }
-    
+
+    if MEMORY_BACKEND:
+        # Every test gets a new user, so nothing needs cleaning up.
+        from db_service import storage
+        storage.users.create(test_user)
+        storage.exercises.add(test_exercise)
+        yield ids
+        return
+
+    db_connection = request.getfixturevalue("db_connection")
+    db_connection.users.insert_one(test_user)
+    db_connection.exercises.insert_one(test_exercise)
+
+    yield ids
+
     db_connection.users.delete_many({"username": {"$regex": "^testuser_"}})
     db_connection.users.delete_many({"username": {"$regex": "^newuser_"}})
     db_connection.todo.delete_many({"user_id": str(test_user["_id"])})
     db_connection.search_history.delete_many({"user_id": str(test_user["_id"])})
     db_connection.edit_transcription.delete_many({"user_id": str(test_user["_id"])})
     db_connection.plans.delete_many({"user_id": str(test_user["_id"])})
+    db_connection.user_stats.delete_many({"_id": str(test_user["_id"])})
 
 def test_user_operations(client, setup_test_collections):
     new_user = {
@@ -622,7 +683,7 @@ def test_user_update_validation(client, setup_test_collections):
                          content_type='application/json')
     assert response.status_code == 200  # Should return success=False
 
-def test_get_all_exercises(client, db_connection):
+def test_get_all_exercises(client):
     """Test get all exercises"""
     response = client.get('/exercises/all')
     assert response.status_code == 200
@@ -726,4 +787,798 @@ def test_delete_exercise_errors(client, setup_test_collections):
                               "exercise_id": "test123"
                           }),
                           content_type='application/json')
-    assert response.status_code == 500
\ No newline at end of file
+    assert response.status_code == 500
+def test_exercise_prefix_search(client, added_exercises):
+    """Test that added exercises are found by the prefix of any word"""
+    response = client.post('/exercises/add',
+                          data=json.dumps({"workout_name": "Testbench Incline-Press"}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    exercise_id = json.loads(response.data)["id"]
+    added_exercises.append(exercise_id)
+
+    for query in ["testbench", "Test Bench", "incline", "inclinepress", "press"]:
+        response = client.post('/exercises/search',
+                              data=json.dumps({"query": query}),
+                              content_type='application/json')
+        assert response.status_code == 200
+        results = json.loads(response.data)
+        assert exercise_id in [ex["_id"] for ex in results]
+        assert all("workout_name_keys" not in ex for ex in results)
+
+    response = client.put(f'/exercises/update/{exercise_id}',
+                         data=json.dumps({"workout_name": "Testbench Decline-Press"}),
+                         content_type='application/json')
+    assert response.status_code == 200
+    response = client.post('/exercises/search',
+                          data=json.dumps({"query": "declinepr"}),
+                          content_type='application/json')
+    assert exercise_id in [ex["_id"] for ex in json.loads(response.data)]
+
+    response = client.post('/exercises/add',
+                          data=json.dumps({"description": "No name"}),
+                          content_type='application/json')
+    assert response.status_code == 400
+
+def test_exercise_catalog_cache(client, added_exercises):
+    """Test that catalog reads are served from the cache and reload after writes"""
+    response = client.get('/exercises/all')
+    assert response.status_code == 200
+    before = json.loads(client.get('/exercises/catalog/stats').data)
+
+    client.get('/exercises/all')
+    after = json.loads(client.get('/exercises/catalog/stats').data)
+    assert after["hits"] == before["hits"] + 1
+    assert after["reloads"] == before["reloads"]
+
+    response = client.post('/exercises/add',
+                          data=json.dumps({"workout_name": "Testcache Row"}),
+                          content_type='application/json')
+    exercise_id = json.loads(response.data)["id"]
+    added_exercises.append(exercise_id)
+
+    exercises = json.loads(client.get('/exercises/all').data)
+    assert exercise_id in [ex["_id"] for ex in exercises]
+    stats = json.loads(client.get('/exercises/catalog/stats').data)
+    assert stats["reloads"] == after["reloads"] + 1
+
+    response = client.get(f'/exercises/get/{exercise_id}')
+    assert response.status_code == 200
+    assert json.loads(response.data)["workout_name"] == "Testcache Row"
+
+def test_exercise_ranked_search(client, added_exercises):
+    """Test ranked fuzzy search tolerates typos and orders by score"""
+    ids = added_exercises
+    for name in ["Testrank Pull Up", "Testrank Pullover", "Testrank Bench Press"]:
+        response = client.post('/exercises/add',
+                              data=json.dumps({"workout_name": name}),
+                              content_type='application/json')
+        ids.append(json.loads(response.data)["id"])
+
+    response = client.post('/exercises/search',
+                          data=json.dumps({"query": "testrank pulup", "mode": "ranked", "limit": 2}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    results = json.loads(response.data)
+    assert len(results) <= 2
+    assert results[0]["_id"] == ids[0]
+    assert results[0]["score"] >= results[-1]["score"]
+
+    response = client.post('/exercises/search',
+                          data=json.dumps({"query": "testrankbenchpres", "mode": "ranked"}),
+                          content_type='application/json')
+    assert json.loads(response.data)[0]["_id"] == ids[2]
+
+    response = client.post('/exercises/search',
+                          data=json.dumps({"query": "zzzzzz", "mode": "ranked", "min_score": 0.9}),
+                          content_type='application/json')
+    assert json.loads(response.data) == []
+
+    response = client.post('/exercises/search',
+                          data=json.dumps({"query": "pull", "mode": "ranked", "limit": "many"}),
+                          content_type='application/json')
+    assert response.status_code == 400
+
+def test_exercise_batch_lookups(client, added_exercises, setup_test_collections):
+    """Test resolving batches of exercise ids and names"""
+    response = client.post('/exercises/add',
+                          data=json.dumps({"workout_name": "Testbatch Goblet Squat"}),
+                          content_type='application/json')
+    added_id = json.loads(response.data)["id"]
+    added_exercises.append(added_id)
+    fixture_id = setup_test_collections["exercise_id"]
+    unknown_id = str(ObjectId())
+
+    response = client.post('/exercises/get_many',
+                          data=json.dumps({"ids": [added_id, fixture_id, unknown_id, "bad-id"]}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    found = json.loads(response.data)
+    assert found[added_id]["workout_name"] == "Testbatch Goblet Squat"
+    assert found[fixture_id]["workout_name"] == "Test Exercise"
+    assert unknown_id not in found and "bad-id" not in found
+
+    names = ["testbatch goblet-squat", "Testbatch Gob", "Testbatch Gobelt Sqat", "Zzzz Nothing"]
+    response = client.post('/exercises/resolve',
+                          data=json.dumps({"names": names}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    resolved = json.loads(response.data)
+    assert resolved[names[0]]["_id"] == added_id
+    assert resolved[names[1]]["_id"] == added_id
+    assert resolved[names[2]]["_id"] == added_id
+    assert resolved[names[3]] is None
+
+    response = client.post('/exercises/resolve',
+                          data=json.dumps({"names": "Squat"}),
+                          content_type='application/json')
+    assert response.status_code == 400
+
+def test_keyset_pagination(client, setup_test_collections):
+    """Test walking list endpoints page by page with the next cursor"""
+    user_id = setup_test_collections["user_id"]
+
+    for term in ["first", "second", "third", "fourth", "fifth"]:
+        client.post('/search-history/add',
+                    data=json.dumps({"user_id": user_id, "content": term}),
+                    content_type='application/json')
+    seen = []
+    after = None
+    while True:
+        url = f'/search-history/get/{user_id}?limit=2' + (f'&after={after}' if after else '')
+        response = client.get(url)
+        assert response.status_code == 200
+        page = json.loads(response.data)
+        assert len(page) <= 2
+        seen.extend(entry["content"] for entry in page)
+        after = response.headers.get("X-Next-Cursor")
+        if not after:
+            break
+    assert seen == ["fifth", "fourth", "third", "second", "first"]
+
+    start = datetime(2024, 1, 1)
+    for i in range(3):
+        client.post('/todo/add',
+                    data=json.dumps({
+                        "user_id": user_id,
+                        "date": (start + timedelta(days=i)).strftime("%Y-%m-%d"),
+                        "exercise_item": {"exercise_todo_id": f"page{i}"}
+                    }),
+                    content_type='application/json')
+    response = client.get(f'/todo/{user_id}?limit=2&start_date=2024-01-01&end_date=2024-01-31')
+    assert len(json.loads(response.data)) == 2
+    after = response.headers["X-Next-Cursor"]
+    response = client.get(f'/todo/{user_id}?limit=2&start_date=2024-01-01&end_date=2024-01-31&after={after}')
+    page = json.loads(response.data)
+    assert [todo["todo"][0]["exercise_todo_id"] for todo in page] == ["page2"]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.post('/exercises/search',
+                          data=json.dumps({"query": "", "limit": 1}),
+                          content_type='application/json')
+    assert len(json.loads(response.data)) == 1
+    response = client.post('/exercises/search',
+                          data=json.dumps({"query": "", "limit": 1, "after": response.headers["X-Next-Cursor"]}),
+                          content_type='application/json')
+    assert response.status_code == 200
+
+    assert client.get(f'/search-history/get/{user_id}?limit=0').status_code == 400
+    assert client.get(f'/todo/{user_id}?after=not-a-cursor').status_code == 400
+
+def test_get_all_exercises_conditional(client, added_exercises):
+    """Test /exercises/all answers 304 to a matching If-None-Match"""
+    response = client.get('/exercises/all')
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert not etag.startswith("W/")
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    response = client.get('/exercises/all', headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    response = client.post('/exercises/add',
+                          data=json.dumps({"workout_name": "Testetag Curl"}),
+                          content_type='application/json')
+    added_exercises.append(json.loads(response.data)["id"])
+    response = client.get('/exercises/all', headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_indexes(db_connection):
+    """Test index creation is idempotent and hot queries use them"""
+    from indexes import ensure_indexes, verify_indexes, plan_stages
+
+    assert ensure_indexes(db_connection) == []
+    assert ensure_indexes(db_connection) == []
+    assert "user_date" in db_connection.todo.index_information()
+    assert "username" in db_connection.users.index_information()
+    verify_indexes(db_connection)
+
+    plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}
+    assert plan_stages(plan) == ["FETCH", "IXSCAN"]
+    plan = {"queryPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}}
+    assert "COLLSCAN" in plan_stages(plan)
+
+def test_concurrent_todo_adds(setup_test_collections):
+    """Test parallel adds for the same day end up in a single day document"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    user_id = setup_test_collections["user_id"]
+    today = datetime.utcnow().strftime("%Y-%m-%d")
+
+    def add(i):
+        with app.test_client() as thread_client:
+            return thread_client.post('/todo/add',
+                                      data=json.dumps({
+                                          "user_id": user_id,
+                                          "exercise_item": {"exercise_todo_id": f"parallel_{i}"},
+                                          "date": today
+                                      }),
+                                      content_type='application/json').status_code
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        statuses = list(pool.map(add, range(64)))
+
+    assert statuses == [200] * 64
+    from db_service import storage
+    days = storage.todo.history(user_id, None, None, None, 10)
+    assert len(days) == 1
+    assert sorted(item["exercise_todo_id"] for item in days[0]["todo"]) == \
+        sorted(f"parallel_{i}" for i in range(64))
+
+def test_merge_duplicate_todo_days(db_connection, setup_test_collections):
+    """Test the migration folds same-day todo documents into one"""
+    from migrations import merge_duplicate_todo_days
+
+    user_id = setup_test_collections["user_id"]
+    day = datetime(2024, 3, 5)
+    db_connection.todo.insert_many([
+        {"user_id": user_id, "date": day, "todo": [{"exercise_todo_id": 1}]},
+        {"user_id": user_id, "date": day.replace(hour=9, minute=30), "todo": [{"exercise_todo_id": 2}]},
+        {"user_id": user_id, "date": day + timedelta(days=1), "todo": [{"exercise_todo_id": 3}]},
+    ])
+
+    assert merge_duplicate_todo_days() == 1
+    days = list(db_connection.todo.find({"user_id": user_id}).sort("date", 1))
+    assert [doc["date"] for doc in days] == [day, day + timedelta(days=1)]
+    assert [item["exercise_todo_id"] for item in days[0]["todo"]] == [1, 2]
+
+def test_add_todo_bulk(client, setup_test_collections):
+    """Test /todo/add_bulk applies valid items and reports each one"""
+    user_id = setup_test_collections["user_id"]
+    client.post('/todo/add',
+                data=json.dumps({"user_id": user_id, "date": "2024-12-01",
+                                 "exercise_item": {"exercise_todo_id": "existing"}}),
+                content_type='application/json')
+
+    items = [
+        {"date": "2024-12-01", "exercise_item": {"exercise_todo_id": "a"}},
+        {"date": "2024-12-02", "exercise_item": {"exercise_todo_id": "b"}},
+        {"date": "12/03/2024", "exercise_item": {"exercise_todo_id": "c"}},
+        {"date": "2024-12-01", "exercise_item": {"exercise_todo_id": "d"}},
+        {"date": "2024-12-02"},
+    ]
+    response = client.post('/todo/add_bulk',
+                          data=json.dumps({"user_id": user_id, "items": items}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["success"] is False
+    assert data["added"] == 3
+    assert [result["success"] for result in data["results"]] == [True, True, False, True, False]
+
+    from db_service import storage
+    days = storage.todo.history(user_id, None, None, None, 10)
+    assert [doc["date"] for doc in days] == [datetime(2024, 12, 1), datetime(2024, 12, 2)]
+    assert [item["exercise_todo_id"] for item in days[0]["todo"]] == ["existing", "a", "d"]
+    assert [item["exercise_todo_id"] for item in days[1]["todo"]] == ["b"]
+
+    for body in ({"user_id": user_id}, {"user_id": user_id, "items": []}, {"items": items}):
+        response = client.post('/todo/add_bulk',
+                              data=json.dumps(body),
+                              content_type='application/json')
+        assert response.status_code == 400
+
+def test_login_does_not_write(client, setup_test_collections):
+    """Test login leaves the todo collection alone and an empty day reads as []"""
+    username = f"testuser_login_{datetime.utcnow().timestamp()}"
+    auth_data = {"username": username, "password": "testpass"}
+    response = client.post('/users/create',
+                          data=json.dumps(auth_data),
+                          content_type='application/json')
+    user_id = json.loads(response.data)["user_id"]
+
+    response = client.post('/users/auth',
+                          data=json.dumps(auth_data),
+                          content_type='application/json')
+    assert response.status_code == 200
+    from db_service import storage
+    assert storage.todo.history(user_id, None, None, None, 1) == []
+
+    response = client.get(f'/todo/get/{user_id}')
+    assert response.status_code == 200
+    assert json.loads(response.data)["todo"] == []
+
+def test_daily_todo_stats(client, setup_test_collections):
+    """Test /todo/stats/daily counts items per day within the range"""
+    user_id = setup_test_collections["user_id"]
+    for date in ("2024-12-05", "2024-12-05", "2024-12-06", "2025-01-02"):
+        client.post('/todo/add',
+                   data=json.dumps({"user_id": user_id, "date": date, "exercise_item": {"exercise_todo_id": date}}),
+                   content_type='application/json')
+    client.post('/todo/add_bulk',
+               data=json.dumps({"user_id": user_id, "items": [
+                   {"date": "2024-12-07", "exercise_item": {"exercise_todo_id": "a"}},
+                   {"date": "2024-12-07", "exercise_item": {"exercise_todo_id": "b"}},
+               ]}),
+               content_type='application/json')
+    client.post('/todo/delete_exercise',
+               data=json.dumps({"user_id": user_id, "date": "2025-01-02", "exercise_id": "2025-01-02"}),
+               content_type='application/json')
+
+    response = client.get(f'/todo/stats/daily/{user_id}')
+    assert response.status_code == 200
+    assert json.loads(response.data) == {"2024-12-05": 2, "2024-12-06": 1, "2024-12-07": 2}
+
+    response = client.get(f'/todo/stats/daily/{user_id}?start_date=2024-12-06&end_date=2024-12-31')
+    assert json.loads(response.data) == {"2024-12-06": 1, "2024-12-07": 2}
+
+    response = client.get(f'/todo/stats/daily/{user_id}?start_date=2024-12-6&end_date=2025-1-1')
+    assert json.loads(response.data) == {"2024-12-06": 1, "2024-12-07": 2}
+
+    response = client.get(f'/todo/stats/daily/{user_id}?start_date=12-06-2024')
+    assert response.status_code == 400
+
+    response = client.get(f'/todo/stats/{user_id}?today=2024-12-08')
+    assert json.loads(response.data) == {
+        "total_items": 5, "active_days": 3, "current_streak": 3, "longest_streak": 3
+    }
+    response = client.get(f'/todo/stats/{user_id}?today=2024-12-10')
+    assert json.loads(response.data)["current_streak"] == 0
+
+def test_todo_stats_without_stats_document(client, service, monkeypatch, setup_test_collections):
+    """Test the stats endpoints count todos written before the user had stats, or after an update failed"""
+    from db_service import storage
+    user_id = setup_test_collections["user_id"]
+    storage.todo.push_item(user_id, datetime(2024, 12, 5), {"exercise_todo_id": "a"})
+    storage.todo.push_item(user_id, datetime(2024, 12, 5), {"exercise_todo_id": "b"})
+    storage.todo.push_item(user_id, datetime(2024, 12, 6), {"exercise_todo_id": "c"})
+
+    response = client.get(f'/todo/stats/daily/{user_id}')
+    assert json.loads(response.data) == {"2024-12-05": 2, "2024-12-06": 1}
+    response = client.get(f'/todo/stats/{user_id}?today=2024-12-06')
+    assert json.loads(response.data) == {
+        "total_items": 3, "active_days": 2, "current_streak": 2, "longest_streak": 2
+    }
+
+    # A write for a user without stats counts the todos it joins.
+    storage.stats.discard(user_id)
+    client.post('/todo/add',
+               data=json.dumps({"user_id": user_id, "date": "2024-12-07", "exercise_item": {"exercise_todo_id": "d"}}),
+               content_type='application/json')
+    response = client.get(f'/todo/stats/daily/{user_id}')
+    assert json.loads(response.data) == {"2024-12-05": 2, "2024-12-06": 1, "2024-12-07": 1}
+
+    def failing_increment(user_id, counts_by_day):
+        raise RuntimeError("stats unavailable")
+
+    async def failing_increment_async(user_id, counts_by_day):
+        failing_increment(user_id, counts_by_day)
+
+    monkeypatch.setattr(service.storage.stats, "increment",
+                        failing_increment_async if service.__name__ == "db_service_async" else failing_increment)
+    response = client.post('/todo/add',
+                          data=json.dumps({"user_id": user_id, "date": "2024-12-07", "exercise_item": {"exercise_todo_id": "e"}}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    monkeypatch.undo()
+
+    response = client.get(f'/todo/stats/daily/{user_id}')
+    assert json.loads(response.data) == {"2024-12-05": 2, "2024-12-06": 1, "2024-12-07": 2}
+
+def test_rebuild_user_stats(db_connection, setup_test_collections):
+    """Test the rebuild recomputes user_stats from todos and reports drift"""
+    from migrations import rebuild_user_stats_command
+    user_id = setup_test_collections["user_id"]
+    db_connection.todo.insert_many([
+        {"user_id": user_id, "date": datetime(2024, 12, 5), "todo": [{}, {}]},
+        {"user_id": user_id, "date": datetime(2024, 12, 6), "todo": []},
+    ])
+    db_connection.user_stats.insert_one({"_id": user_id, "total_items": 4, "days": {"2024-12-05": 1, "2024-12-06": 3}})
+
+    drift = rebuild_user_stats_command()
+
+    assert drift[user_id] == {"2024-12-05": (1, 2), "2024-12-06": (3, 0)}
+    assert db_connection.user_stats.find_one({"_id": user_id}) == {
+        "_id": user_id, "total_items": 2, "days": {"2024-12-05": 2}, "complete": True
+    }
+    assert user_id not in rebuild_user_stats_command()
+
+def test_single_todo_item_lookups(client, setup_test_collections):
+    """Test get_exercise_by_id and get-item return only the matching item of that day"""
+    from db_service import storage
+    user_id = setup_test_collections["user_id"]
+    items = [{"exercise_todo_id": f"item{i}", "workout_name": f"Exercise {i}"} for i in range(3)]
+    storage.todo.push_items(user_id, {
+        datetime(2024, 12, 1): items,
+        datetime(2024, 12, 2): [{"exercise_todo_id": "other"}],
+    })
+
+    response = client.get(f'/todo/get_exercise_by_id?user_id={user_id}&date=2024-12-01&exercise_todo_id=item1')
+    assert response.status_code == 200
+    assert json.loads(response.data) == items[1]
+
+    response = client.get(f'/todo/get_exercise_by_id?user_id={user_id}&date=2024-12-02&exercise_todo_id=item1')
+    assert response.status_code == 404
+
+    response = client.get(f'/todo/get-item/{user_id}/item2?date=2024-12-01')
+    assert response.status_code == 200
+    assert json.loads(response.data) == items[2]
+
+    response = client.get(f'/todo/get-item/{user_id}/other?date=2024-12-01')
+    assert response.status_code == 404
+
+    response = client.get(f'/todo/get-item/{user_id}/item2')
+    assert response.status_code == 400
+
+def test_search_history_dedup_and_cap(client, service, setup_test_collections, monkeypatch):
+    """Test repeated searches share one entry and the history keeps only the newest"""
+    monkeypatch.setattr(service, "SEARCH_HISTORY_MAX_ENTRIES", 3)
+    user_id = setup_test_collections["user_id"]
+    for content in ["squats", "Push Ups", "push-ups", "lunges", "plank"]:
+        response = client.post('/search-history/add',
+                              data=json.dumps({"user_id": user_id, "content": content}),
+                              content_type='application/json')
+        assert response.status_code == 200
+
+    response = client.get(f'/search-history/get/{user_id}')
+    history = json.loads(response.data)
+    assert [entry["content"] for entry in history] == ["plank", "lunges", "push-ups"]
+    assert set(history[0]) == {"_id", "user_id", "content", "time"}
+
+    # Searching again moves the same entry to the top and pushes nothing out.
+    client.post('/search-history/add',
+                data=json.dumps({"user_id": user_id, "content": "PUSH UPS"}),
+                content_type='application/json')
+    response = client.get(f'/search-history/get/{user_id}?limit=10')
+    repeated = json.loads(response.data)
+    assert [entry["content"] for entry in repeated] == ["PUSH UPS", "plank", "lunges"]
+    assert repeated[0]["_id"] == history[2]["_id"]
+
+def test_dedupe_search_history(db_connection, setup_test_collections, monkeypatch):
+    """Test the migration folds legacy duplicate searches and applies the cap"""
+    import migrations
+    monkeypatch.setattr(migrations, "SEARCH_HISTORY_MAX_ENTRIES", 2)
+    user_id = setup_test_collections["user_id"]
+    start = datetime.utcnow() - timedelta(hours=1)
+    db_connection.search_history.insert_many([
+        {"user_id": user_id, "content": content, "time": start + timedelta(minutes=i)}
+        for i, content in enumerate(["bench press", "squats", "Bench-Press", "deadlift"])
+    ])
+
+    assert migrations.dedupe_search_history() >= 2
+
+    entries = list(db_connection.search_history.find({"user_id": user_id}).sort("time", -1))
+    assert [(entry["content"], entry["content_key"], entry["hits"]) for entry in entries] == [
+        ("deadlift", "deadlift", 1), ("Bench-Press", "benchpress", 2)
+    ]
+
+def test_todo_get_by_date_projection(client, setup_test_collections):
+    """Test fields and max_items trim the items /todo/get_by_date returns"""
+    user_id = setup_test_collections["user_id"]
+    items = [
+        {"exercise_todo_id": str(i), "workout_name": f"Exercise {i}", "reps": i}
+        for i in range(5)
+    ]
+    from db_service import storage
+    storage.todo.push_items(user_id, {datetime(2024, 12, 1): items})
+    url = f'/todo/get_by_date/{user_id}?start_date=2024-12-01&end_date=2024-12-07'
+
+    response = client.get(url)
+    assert json.loads(response.data)[0]["todo"] == items
+
+    response = client.get(url + '&fields=workout_name&max_items=3')
+    assert response.status_code == 200
+    day = json.loads(response.data)[0]
+    assert day["date"] == "2024-12-01T00:00:00Z"
+    assert day["todo"] == [{"workout_name": f"Exercise {i}"} for i in range(3)]
+
+    response = client.get(url + '&fields=exercise_todo_id,workout_name')
+    assert json.loads(response.data)[0]["todo"] == [
+        {"exercise_todo_id": str(i), "workout_name": f"Exercise {i}"} for i in range(5)
+    ]
+
+    assert client.get(url + '&max_items=0').status_code == 400
+    assert client.get(url + '&fields=todo.$').status_code == 400
+
+def test_month_calendar(client, setup_test_collections):
+    """Test /todo/calendar/month buckets weeks and serves no summary older than a write"""
+    from db_service import storage
+    user_id = setup_test_collections["user_id"]
+    storage.todo.push_items(user_id, {
+        datetime(2024, 12, 1): [{"workout_name": "Push Ups"}],
+        datetime(2024, 12, 3): [{"workout_name": "Squats"}, {"workout_name": "Lunges"}, {"workout_name": "Plank"}],
+        datetime(2024, 12, 8): [{"workout_name": "Rest"}],
+        datetime(2024, 12, 31): [{"workout_name": "Run"}],
+        datetime(2025, 1, 1): [{"workout_name": "Swim"}],
+    })
+    url = f'/todo/calendar/month/{user_id}?month=2024-12'
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert json.loads(response.data) == {
+        "2024-12-01": ["Push Ups", "Squats", "Lunges"],
+        "2024-12-08": ["Rest"],
+        "2024-12-15": [],
+        "2024-12-22": [],
+        "2024-12-29": ["Run"],
+    }
+    hits = json.loads(client.get('/todo/calendar/stats').data)["hits"]
+    client.get(url)
+    assert json.loads(client.get('/todo/calendar/stats').data)["hits"] == hits + 1
+
+    client.post('/todo/add',
+                data=json.dumps({"user_id": user_id, "date": "2024-12-16",
+                                 "exercise_item": {"exercise_todo_id": "row", "workout_name": "Row"}}),
+                content_type='application/json')
+    assert json.loads(client.get(url).data)["2024-12-15"] == ["Row"]
+
+    client.post('/todo/update_exercise',
+                data=json.dumps({"user_id": user_id, "date": "2024-12-16", "exercise_todo_id": "row",
+                                 "update_fields": {"workout_name": "Rowing"}}),
+                content_type='application/json')
+    assert json.loads(client.get(url).data)["2024-12-15"] == ["Rowing"]
+
+    # A write taken by another worker reaches this one through the month's stamp.
+    storage.todo.push_item(user_id, datetime(2024, 12, 22), {"workout_name": "Bike"})
+    storage.stats.increment(user_id, {datetime(2024, 12, 22): 1})
+    assert json.loads(client.get(url).data)["2024-12-22"] == ["Bike"]
+
+    assert client.get(f'/todo/calendar/month/{user_id}').status_code == 400
+    assert client.get(f'/todo/calendar/month/{user_id}?month=12-2024').status_code == 400
+
+def test_todo_export(client, setup_test_collections):
+    """Test /todo/export streams NDJSON and CSV"""
+    from db_service import storage
+    user_id = setup_test_collections["user_id"]
+    storage.todo.push_items(user_id, {
+        datetime(2024, 12, 2): [{"exercise_todo_id": "b", "workout_name": "Squats", "reps": 10}],
+        datetime(2024, 12, 1): [{"exercise_todo_id": "a", "workout_name": "Push Ups, wide"}],
+    })
+
+    response = client.get(f'/todo/export/{user_id}')
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    days = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [day["date"] for day in days] == ["2024-12-01T00:00:00Z", "2024-12-02T00:00:00Z"]
+    assert days[1]["todo"] == [{"exercise_todo_id": "b", "workout_name": "Squats", "reps": 10}]
+    assert "user_id" not in days[0]
+
+    response = client.get(f'/todo/export/{user_id}?format=csv&start_date=2024-12-02')
+    assert response.mimetype == "text/csv"
+    rows = response.data.decode().splitlines()
+    assert rows[0].startswith("date,exercise_todo_id,exercise_id,workout_name")
+    assert rows[1:] == ["2024-12-02,b,,Squats,,10,,"]
+
+    assert client.get(f'/todo/export/{user_id}?format=xml').status_code == 400
+
+def current_rss_kb():
+    """Resident set size of this process, from /proc (Linux only)."""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return None
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="needs /proc to read RSS")
+def test_todo_export_memory_is_bounded(setup_test_collections):
+    """Test exporting 100k day documents keeps memory flat while streaming"""
+    # Seeding 100k days is slow, so this runs against the Flask app only.
+    # test_todo_export covers the asyncio app's streaming.
+    from db_service import storage
+    client = app.test_client()
+    user_id = setup_test_collections["user_id"]
+    start = datetime(1800, 1, 1)
+    item = {"exercise_todo_id": "x", "workout_name": "Synthetic Exercise", "reps": 10, "weight": 50}
+    for offset in range(0, 100_000, 10_000):
+        storage.todo.push_items(user_id, {
+            start + timedelta(days=day): [item] for day in range(offset, offset + 10_000)
+        })
+
+    response = client.get(f'/todo/export/{user_id}')
+    chunks = response.iter_encoded()
+    lines = next(chunks).count(b"\n")
+    baseline = peak = current_rss_kb()
+    for chunk in chunks:
+        lines += chunk.count(b"\n")
+        peak = max(peak, current_rss_kb())
+    response.close()
+
+    assert lines == 100_000
+    assert peak - baseline < 50 * 1024
+
+def test_json_provider(client):
+    """Test responses encode ObjectId and datetime without handler conversions"""
+    from json_provider import dumps_bytes
+
+    oid = ObjectId()
+    doc = {"_id": oid, "date": datetime(2024, 12, 1), "todo": [{"exercise_id": oid, "time": datetime(2024, 12, 1, 9, 30, 5)}]}
+    assert json.loads(dumps_bytes(doc)) == {
+        "_id": str(oid),
+        "date": "2024-12-01T00:00:00Z",
+        "todo": [{"exercise_id": str(oid), "time": "2024-12-01T09:30:05Z"}],
+    }
+    with app.app_context():
+        from flask import jsonify
+        response = jsonify(doc)
+    assert response.mimetype == "application/json"
+    assert json.loads(response.data)["_id"] == str(oid)
+
+def test_structured_logging(capsys):
+    """Test log records are JSON lines and sampled per route"""
+    import logging
+    from structured_logging import JsonFormatter, RouteSampler, parse_sample_rates
+
+    assert parse_sample_rates("/todo/add=0.01, /todo/get/<string:user_id>=0.5") == {
+        "/todo/add": 0.01, "/todo/get/<string:user_id>": 0.5
+    }
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter("db-service"))
+    handler.addFilter(RouteSampler(1.0, {"/todo/add": 0.0}))
+    logger = logging.getLogger("test_structured_logging")
+    logger.addHandler(handler)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+
+    with app.test_request_context('/todo/add', method='POST'):
+        logger.debug("dropped %s", {"big": "document"})
+        logger.warning("kept", extra={"user_id": "u1"})
+    with app.test_request_context('/todo/get/u1'):
+        logger.info("kept too")
+
+    lines = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+    assert [line["message"] for line in lines] == ["kept", "kept too"]
+    assert lines[0]["level"] == "WARNING"
+    assert lines[0]["service"] == "db-service"
+    assert lines[0]["route"] == "/todo/add"
+    assert lines[0]["user_id"] == "u1"
+
+def test_metrics_endpoint(client, setup_test_collections):
+    """Test /metrics reports per-route request counts and latency as Prometheus text"""
+    from metrics import observe_dependency
+
+    user_id = setup_test_collections["user_id"]
+    client.get(f'/todo/get/{user_id}')
+    client.get('/no/such/route')
+    observe_dependency("mongo", "find", 0.003)
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    text = response.data.decode()
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_requests_total{route="/todo/get/<string:user_id>",method="GET",status="200"}' in text
+    assert 'http_requests_total{route="<unmatched>",method="GET",status="404"}' in text
+    assert 'http_request_duration_seconds_count{route="/todo/get/<string:user_id>",method="GET"}' in text
+    assert 'dependency_duration_seconds_bucket{dependency="mongo",operation="find",le="0.005"}' in text
+    assert user_id not in text
+
+def test_health_endpoints(client, service, monkeypatch):
+    """Test /healthz always answers and /readyz reports whether Mongo answers a ping"""
+    from pymongo.errors import ServerSelectionTimeoutError
+
+    assert client.get('/healthz').status_code == 200
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert json.loads(response.data) == {"status": "ready"}
+
+    def unreachable():
+        raise ServerSelectionTimeoutError("no servers available")
+
+    async def unreachable_async():
+        unreachable()
+
+    monkeypatch.setattr(service, "ping_storage", unreachable_async if service.__name__ == "db_service_async" else unreachable)
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert json.loads(response.data)["status"] == "unavailable"
+    assert client.get('/healthz').status_code == 200
+
+def test_pool_metrics(client):
+    """Test the CMAP listener counts connections and reports checkout wait percentiles"""
+    from pymongo import monitoring
+    from mongo_monitoring import PoolMetrics
+
+    pool = PoolMetrics(window=100)
+    # The Prometheus series are per process, so every run gets its own server.
+    host = f"pooltest-{ObjectId()}"
+    address = (host, 27017)
+    for connection_id in range(3):
+        pool.connection_created(monitoring.ConnectionCreatedEvent(address, connection_id))
+    for i in range(100):
+        pool.connection_checked_out(monitoring.ConnectionCheckedOutEvent(address, i % 3, (i + 1) / 1000))
+        if i < 98:
+            pool.connection_checked_in(monitoring.ConnectionCheckedInEvent(address, i % 3))
+    pool.connection_check_out_failed(monitoring.ConnectionCheckOutFailedEvent(address, "timeout", None))
+    pool.connection_closed(monitoring.ConnectionClosedEvent(address, 2, "idle"))
+
+    stats = pool.stats()
+    assert stats["pools"] == {f"{host}:27017": {"open": 2, "checked_out": 2}}
+    assert stats["checkouts"] == 100
+    assert stats["checkout_failures"] == {"timeout": 1}
+    assert stats["wait_ms"] == {"p50": 51.0, "p95": 96.0, "p99": 100.0, "max": 100.0}
+
+    text = client.get('/metrics').data.decode()
+    assert f'mongo_pool_checked_out_connections{{address="{host}:27017"}} 2' in text
+    assert f'mongo_pool_checkout_failures_total{{address="{host}:27017",reason="timeout"}} 1' in text
+
+    response = client.get('/mongo/pool/stats')
+    assert response.status_code == 200
+    assert {"pools", "checkouts", "wait_ms", "max_pool_size", "wait_queue_timeout_ms"} <= set(json.loads(response.data))
+
+def test_both_apps_serve_the_same_routes():
+    """Test db_service_async.py serves every route of db_service.py, with the same methods"""
+    import db_service_async
+
+    def routes(application):
+        return {
+            (rule.rule, method) for rule in application.url_map.iter_rules()
+            for method in rule.methods - {"HEAD", "OPTIONS"} if rule.endpoint != "static"
+        }
+
+    assert routes(db_service_async.app) == routes(app)
+
+def test_memory_storage():
+    """Test the in-memory backend pages, trims and summarizes like the Mongo one"""
+    from memory_storage import MemoryStorage
+
+    storage = MemoryStorage()
+    user_id = "memory-user"
+    start = datetime(2024, 12, 1)
+    for i in range(5):
+        assert storage.todo.push_item(user_id, start + timedelta(days=i * 3), {"exercise_todo_id": f"t{i}", "workout_name": f"W{i}", "reps": i}) is True
+    assert storage.todo.push_item(user_id, start, {"exercise_todo_id": "extra", "workout_name": "Extra"}) is False
+
+    page = storage.todo.history(user_id, None, None, None, 2)
+    assert [day["date"].day for day in page] == [1, 4]
+    page = storage.todo.history(user_id, None, None, (page[-1]["date"], page[-1]["_id"]), 2)
+    assert [day["date"].day for day in page] == [7, 10]
+    assert [day["date"].day for day in storage.todo.history(user_id, start + timedelta(days=5), None, None, 10)] == [7, 10, 13]
+
+    trimmed = storage.todo.between(user_id, start, start + timedelta(days=1), ["workout_name"], 1)
+    assert trimmed[0]["todo"] == [{"workout_name": "W0"}]
+    trimmed[0]["todo"].clear()
+    assert len(storage.todo.get_day(user_id, start)["todo"]) == 2
+
+    assert storage.todo.update_item(user_id, start, "t0", {"reps": 10}) is True
+    assert storage.todo.update_item(user_id, start, "t0", {"reps": 10}) is False
+    assert storage.todo.find_item(user_id, start, "t0")["reps"] == 10
+    assert storage.todo.pull_item(user_id, start, "t0") == 1
+    assert storage.todo.pull_item(user_id, start + timedelta(days=1), "t0") is None
+
+    assert storage.todo.month_summary(user_id, start) == {
+        "2024-12-01": ["Extra", "W1", "W2"], "2024-12-08": ["W3", "W4"], "2024-12-15": [],
+        "2024-12-22": [], "2024-12-29": [],
+    }
+    exported = list(storage.todo.export_days(user_id, None, None, batch_size=2))
+    assert [day["date"].day for day in exported] == [1, 4, 7, 10, 13]
+    assert all("user_id" not in day for day in exported)
+
+    for content in ["squats", "Push Ups", "push-ups", "lunges", "plank"]:
+        storage.search_history.record(user_id, content, 3)
+    history = storage.search_history.page(user_id, None, 2)
+    assert [entry["content"] for entry in history] == ["plank", "lunges"]
+    older = storage.search_history.page(user_id, (history[-1]["time"], history[-1]["_id"]), 2)
+    assert [entry["content"] for entry in older] == ["push-ups"]
+
+    exercise_id = storage.exercises.add({"workout_name": "Bench Press", "workout_name_keys": ["benchpress", "press"]})
+    assert storage.exercises.get(str(exercise_id)) == {"_id": str(exercise_id), "workout_name": "Bench Press"}
+    assert [e["_id"] for e in storage.exercises.find_by_names(["bench-press"])] == [str(exercise_id)]
+    assert storage.exercises.update(str(exercise_id), {"workout_name": "Incline Press"}) is True
+    assert storage.exercises.find_by_names(["Bench Press"]) == []
+
+    storage.users.create({"username": "memory", "password": "x"})
+    with pytest.raises(Exception):
+        storage.users.create({"username": "memory", "password": "y"})
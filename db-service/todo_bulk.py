@@ -0,0 +1,70 @@
+"""
+Bookkeeping for /todo/add_bulk, shared by the Flask and the asyncio app.
+
+A request's items are grouped by day so each day document gets one
+``$push``/``$each`` upsert, and every item gets its own result back in
+request order.
+"""
+
+from datetime import datetime
+from pymongo import UpdateOne
+
+MAX_BULK_TODO_ITEMS = 500
+
+
+def group_items_by_day(items):
+    """
+    Validate the items of a bulk request. Returns ``(results, items_by_day,
+    positions_by_day)``: ``results`` already holds the failure of every
+    invalid item, and the other two map each day to the valid items and their
+    positions in the request.
+    """
+    results = [None] * len(items)
+    items_by_day = {}
+    positions_by_day = {}
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("date") or not item.get("exercise_item"):
+            results[i] = {"success": False, "error": "date and exercise_item are required"}
+            continue
+        try:
+            day = datetime.strptime(item["date"], "%Y-%m-%d")
+        except (TypeError, ValueError):
+            results[i] = {"success": False, "error": "Invalid date format. Use YYYY-MM-DD"}
+            continue
+        items_by_day.setdefault(day, []).append(item["exercise_item"])
+        positions_by_day.setdefault(day, []).append(i)
+    return results, items_by_day, positions_by_day
+
+
+def day_operations(user_id, days, items_by_day):
+    """One upsert pushing a day's items, for each of ``days``."""
+    return [
+        UpdateOne({"user_id": user_id, "date": day}, {"$push": {"todo": {"$each": items_by_day[day]}}}, upsert=True)
+        for day in days
+    ]
+
+
+def sort_write_errors(error, pending, errors, can_retry):
+    """
+    Split the write errors of a failed unordered bulk_write of
+    ``[operations[i] for i in pending]``. Upserts that lost an insert race
+    (11000) are returned for a retry while ``can_retry``; every other failure
+    is recorded in ``errors`` as ``{operation index: message}``.
+    """
+    retry = []
+    for write_error in error.details.get("writeErrors", []):
+        i = pending[write_error["index"]]
+        if write_error.get("code") == 11000 and can_retry:
+            retry.append(i)
+        else:
+            errors[i] = write_error.get("errmsg", "write failed")
+    return retry
+
+
+def fill_results(results, positions_by_day, errors):
+    """Record each grouped item's outcome, given ``{day: error message}``."""
+    for day, positions in positions_by_day.items():
+        for i in positions:
+            results[i] = {"success": False, "error": errors[day]} if day in errors else {"success": True}
+    added = sum(result["success"] for result in results)
+    return {"success": added == len(results), "added": added, "results": results}
@@ -0,0 +1,96 @@
+"""
+Serializers for /todo/export: turn a cursor of todo day documents into chunks
+of NDJSON or CSV text, a batch at a time, so an export never holds more than
+one batch of a user's history in memory. ``async_export_chunks`` does the
+same over an async cursor for db_service_async.py.
+"""
+
+import csv
+import io
+from json_provider import dumps_bytes
+
+EXPORT_BATCH_SIZE = 500
+
+CSV_COLUMNS = (
+    "date", "exercise_todo_id", "exercise_id", "workout_name",
+    "working_time", "reps", "weight", "time",
+)
+
+
+def _batches(cursor, batch_size):
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _async_batches(cursor, batch_size):
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ndjson_batch(batch):
+    """One JSON object per day document and line, encoded like every other response."""
+    return b"".join(dumps_bytes(doc) + b"\n" for doc in batch)
+
+
+def _csv_text(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def csv_header():
+    return _csv_text([CSV_COLUMNS])
+
+
+def csv_batch(batch):
+    """One row per todo item of the day documents in ``batch``."""
+    return _csv_text(
+        [doc["date"].strftime("%Y-%m-%d")] + [item.get(column) for column in CSV_COLUMNS[1:]]
+        for doc in batch
+        for item in doc.get("todo", [])
+    )
+
+
+def ndjson_chunks(cursor, batch_size=EXPORT_BATCH_SIZE):
+    for batch in _batches(cursor, batch_size):
+        yield ndjson_batch(batch)
+
+
+def csv_chunks(cursor, batch_size=EXPORT_BATCH_SIZE):
+    """A header row, then one row per todo item."""
+    yield csv_header()
+    for batch in _batches(cursor, batch_size):
+        yield csv_batch(batch)
+
+
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_chunks, "application/x-ndjson"),
+    "csv": (csv_chunks, "text/csv"),
+}
+
+# format: (header or None, batch encoder)
+_ENCODERS = {
+    "ndjson": (None, ndjson_batch),
+    "csv": (csv_header, csv_batch),
+}
+
+
+async def async_export_chunks(cursor, export_format, batch_size=EXPORT_BATCH_SIZE):
+    """The chunks of EXPORT_FORMATS[export_format] from an async cursor."""
+    header, encode = _ENCODERS[export_format]
+    if header:
+        yield header()
+    async for batch in _async_batches(cursor, batch_size):
+        yield encode(batch)
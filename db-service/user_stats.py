@@ -0,0 +1,155 @@
+"""
+Per-user todo counts, kept up to date as todos are written.
+
+Each user has one ``user_stats`` document, keyed by the user id so reading it
+is a single ``_id`` lookup:
+
+    {"_id": user_id, "total_items": 12, "days": {"2024-12-01": 3, ...},
+     "month_versions": {"2024-12": ObjectId(...), ...}}
+
+Every todo write follows up with one update of the days it touched: an
+``$inc`` of their counts and a new ``month_versions`` stamp for their months,
+which every worker's month calendar cache checks before serving a summary.
+
+Documents counted from the todo collection are marked ``"complete": True``,
+and counts are only added to those. A user without one (whose todos predate
+the counts, or whose document was dropped after a failed update) is counted
+from their todos on first use, with ``user_day_counts_pipeline``. The todo
+write and the update are not a transaction, so a crash between them leaves
+the counts off until ``rebuild_user_stats`` recomputes everyone's.
+"""
+
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+
+def day_key(day):
+    return day.strftime("%Y-%m-%d")
+
+
+def month_key(day):
+    return day.strftime("%Y-%m")
+
+
+def stats_increment(counts_by_day):
+    """
+    The update adding ``counts_by_day`` ({datetime: item delta}) and stamping
+    their months, or None if no day is given. A delta of 0 only stamps the
+    month, for writes that change items without adding or removing any.
+    """
+    if not counts_by_day:
+        return None
+    update = {"$set": {f"month_versions.{month_key(day)}": ObjectId() for day in counts_by_day}}
+    counts = {f"days.{day_key(day)}": count for day, count in counts_by_day.items() if count}
+    if counts:
+        update["$inc"] = {"total_items": sum(counts.values()), **counts}
+    return update
+
+
+def month_version(stats, month_start):
+    """The stamp of the month starting ``month_start`` in a user_stats document, None if it has none."""
+    return (stats or {}).get("month_versions", {}).get(month_key(month_start))
+
+
+def day_counts_stages():
+    """Aggregation stages counting the items of each user's days, one result per day with any."""
+    return [
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+            },
+            "count": {"$sum": {"$size": {"$ifNull": ["$todo", []]}}},
+        }},
+        {"$match": {"count": {"$gt": 0}}},
+    ]
+
+
+def user_day_counts_pipeline(user_id):
+    """Aggregation over the todo collection counting one user's items per day."""
+    return [{"$match": {"user_id": user_id}}, *day_counts_stages()]
+
+
+def stats_document(user_id, days):
+    """A complete user_stats document for ``days`` ({"YYYY-MM-DD": count})."""
+    return {"_id": user_id, "total_items": sum(days.values()), "days": days, "complete": True}
+
+
+def active_days(stats):
+    """{"YYYY-MM-DD": count} for the days with any items, oldest first."""
+    return {day: count for day, count in sorted((stats or {}).get("days", {}).items()) if count > 0}
+
+
+def streaks(days, today):
+    """
+    (current, longest) runs of consecutive active days, given "YYYY-MM-DD"
+    keys and today's date. The current run may end today or yesterday, so it
+    lasts until the user misses a whole day.
+    """
+    current = longest = run = 0
+    previous = None
+    for day in sorted(datetime.strptime(day, "%Y-%m-%d").date() for day in days):
+        run = run + 1 if previous and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    if previous and previous >= today - timedelta(days=1):
+        current = run
+    return current, longest
+
+
+def summarize(stats, today):
+    """The dashboard numbers for one user_stats document (or None)."""
+    days = active_days(stats)
+    current, longest = streaks(days, today)
+    return {
+        "total_items": (stats or {}).get("total_items", 0),
+        "active_days": len(days),
+        "current_streak": current,
+        "longest_streak": longest,
+    }
+
+
+def rebuild_user_stats(todo_collection, stats_collection, batch_size=500):
+    """
+    Recompute every user's counts from the todo collection and store them.
+    Returns {user_id: {"YYYY-MM-DD": (stored, actual)}} for every day whose
+    stored count was wrong, with 0 standing in for a missing day. Writes that
+    land while the rebuild runs may be overwritten, so run it when the
+    service is quiet.
+    """
+    users = todo_collection.aggregate([
+        *day_counts_stages(),
+        {"$group": {"_id": "$_id.user_id", "days": {"$push": {"k": "$_id.day", "v": "$count"}}}},
+    ], allowDiskUse=True)
+
+    drift = {}
+    seen = set()
+    batch = []
+
+    def compare_and_store(user_id, actual):
+        stored = active_days(stats_collection.find_one({"_id": user_id}))
+        wrong = {
+            day: (stored.get(day, 0), actual.get(day, 0))
+            for day in stored.keys() | actual.keys()
+            if stored.get(day, 0) != actual.get(day, 0)
+        }
+        if wrong:
+            drift[user_id] = dict(sorted(wrong.items()))
+        if actual:
+            batch.append(ReplaceOne({"_id": user_id}, stats_document(user_id, actual), upsert=True))
+        if len(batch) >= batch_size:
+            stats_collection.bulk_write(batch, ordered=False)
+            batch.clear()
+
+    for user in users:
+        seen.add(user["_id"])
+        compare_and_store(user["_id"], {day["k"]: day["v"] for day in user["days"]})
+    # Users whose todos are all gone still have counts to clear.
+    for stats in stats_collection.find({}, {"_id": 1}):
+        if stats["_id"] not in seen:
+            compare_and_store(stats["_id"], {})
+            stats_collection.delete_one({"_id": stats["_id"]})
+    if batch:
+        stats_collection.bulk_write(batch, ordered=False)
+    return drift
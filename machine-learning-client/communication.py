@@ -1,11 +1,17 @@
 """This is a model do deal with docker communication"""
 
+import logging
 from flask import Flask, request, jsonify
 from llm import plan_generation
 from speech_to_text import transcribe_file, get_google_cloud_credentials
+from structured_logging import configure_logging
+from metrics import instrument_app
 
 
 app = Flask(__name__)
+configure_logging("machine-learning-client")
+instrument_app(app)
+logger = logging.getLogger(__name__)
 
 @app.route("/transcribe", methods=["POST"])
 def transcribe():
@@ -16,7 +22,7 @@ def transcribe():
     """
     data = request.json
     audio_file = data.get("audio_file")
-    print(f"Received audio file path: {audio_file}")
+    logger.debug("Received audio file path: %s", audio_file)
 
     if not audio_file:
         return jsonify({"error": "Audio file path is required"}), 400
@@ -38,7 +44,7 @@ def plan():
     user_info = request.json
     # print(user_info)
     if not user_info:
-        print("User information is required")
+        logger.warning("User information is required")
         return jsonify({"error": "User information is required"}), 400
 
     result = plan_generation(user_info)
@@ -0,0 +1,31 @@
+"""
+gunicorn settings for the machine-learning-client. gunicorn reads this file
+from the working directory, so from the machine-learning-client directory:
+
+    gunicorn communication:app
+
+``python communication.py`` still starts the Werkzeug development server for
+local work. ``WEB_CONCURRENCY`` and ``GUNICORN_THREADS`` override the worker
+and thread counts.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+
+# A request waits seconds on Google Speech or Gemini and does little work
+# itself, and every worker loads the Google client libraries, so this service
+# runs fewer workers than the others and more threads in each.
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() + 1)))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# On SIGTERM (docker stop) workers stop accepting connections and get this
+# long to finish the requests they have. A transcription can take a while.
+graceful_timeout = 60
+timeout = 60
+keepalive = 5
+
+accesslog = None
+errorlog = "-"
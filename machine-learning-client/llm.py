@@ -4,14 +4,17 @@ This is a model to generate plan for users.
 
 import os
 import json
+import logging
 import google.generativeai as genai
 from google.ai.generativelanguage_v1beta.types import content
 from dotenv import load_dotenv
+from metrics import track_dependency
 
 
 load_dotenv()
 api_key = os.getenv('GEMINI_API_KEY')
 genai.configure(api_key=api_key)
+logger = logging.getLogger(__name__)
 
 with open('prompt.json', 'r', encoding='utf-8') as file:
     prompt = json.load(file)["prompt"]
@@ -122,7 +125,8 @@ def make_plan_request(input_data):
     history=[]
     )
 
-    response = chat_session.send_message(input_data)
+    with track_dependency("gemini", "send_message"):
+        response = chat_session.send_message(input_data)
     return response
 
 
@@ -132,15 +136,15 @@ def plan_generation(user_info):
     """
 
     try:
-        print("Generate successfully.")
         input_data = input_generate(prompt, user_info)
         response = make_plan_request(input_data)
+        logger.info("Generated a plan")
         return response.text
     except TimeoutError as e:
-        print(f"Timeout error: {e}")
+        logger.error("Timeout error: %s", e)
         return "The request timed out while generating the plan"
     except  FileNotFoundError as e:
-        print(f"An error occurred: {e}")
+        logger.error("An error occurred: %s", e)
         return "Error generating plan"
 
 
@@ -4,13 +4,16 @@ This module provides functions for speech-to-text transcription using Google Clo
 
 import os
 import json
+import logging
 from dotenv import load_dotenv
 from google.cloud import speech
 from google.oauth2 import service_account
 from flask import Flask
+from metrics import track_dependency
 
 load_dotenv()
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
 
 
 def get_google_cloud_credentials():
@@ -24,7 +27,6 @@ def get_google_cloud_credentials():
         raise EnvironmentError(
             "Service account JSON not found in environment variables"
         )
-    print(service_account_json)
     credentials_dict = json.loads(service_account_json)
     credentials = service_account.Credentials.from_service_account_info(
         credentials_dict
@@ -51,17 +53,18 @@ def transcribe_file(audio_file: str, credentials) -> speech.RecognizeResponse:
         )
 
         # print("Sending recognition request...")
-        response = client.recognize(config=config, audio=audio)
+        with track_dependency("google-speech", "recognize"):
+            response = client.recognize(config=config, audio=audio)
 
         if not response.results:
-            print("No transcription results found.")
+            logger.warning("No transcription results found.")
 
         return response.results[0].alternatives[0]
 
     except FileNotFoundError as e:
-        print(f"File not found: {e}")
+        logger.error("File not found: %s", e)
     except ValueError as e:
-        print(f"Value error: {e}")
+        logger.error("Value error: %s", e)
 
     return None
 
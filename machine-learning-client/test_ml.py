@@ -191,6 +191,22 @@ def test_plan_generation_error(mock_input_generate):
     assert result == "The request timed out while generating the plan"
 
 
+@patch("llm.genai.GenerativeModel", MockGenerativeModel)
+@patch("llm.content.Schema", MockSchema)
+@patch("llm.content.Type", MockType)
+def test_metrics_endpoint(mock_client):
+    """/metrics reports handled requests and the time spent waiting on Gemini"""
+    make_plan_request("Generate a weekly plan for study and rest.")
+    mock_client.post("/plan", json={})
+
+    response = mock_client.get("/metrics")
+
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'http_requests_total{route="/plan",method="POST",status="400"}' in body
+    assert 'dependency_duration_seconds_count{dependency="gemini",operation="send_message"}' in body
+
+
 
 if __name__ == "__main__":
     pytest.main()
@@ -1,6 +1,7 @@
 # app.py - Main Flask Application
 from flask import Flask, request, redirect, url_for, render_template, jsonify, session
 from datetime import datetime, timedelta
+import logging
 import os
 import re
 import subprocess
@@ -18,12 +19,17 @@ from werkzeug.exceptions import BadRequest
 from dotenv import load_dotenv
 from zoneinfo import ZoneInfo
 import uuid
+from structured_logging import configure_logging
+from metrics import instrument_app, instrument_requests
 
 
 load_dotenv()
 
 app = Flask(__name__)
-app.secret_key = os.urandom(13)
+configure_logging("web-app")
+instrument_app(app)
+logger = logging.getLogger(__name__)
+app.secret_key = os.getenv("SECRET_KEY") or os.urandom(13)
 
 UPLOAD_FOLDER = "uploads"
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
@@ -34,6 +40,14 @@ if not os.path.exists(UPLOAD_FOLDER):
 # URL of your db-service
 DB_SERVICE_URL = "http://db-service:5112/"
 #DB_SERVICE_URL = "http://localhost:5112/"
+ML_CLIENT_URL = "http://machine-learning-client:8080/"
+instrument_requests({DB_SERVICE_URL: "db-service", ML_CLIENT_URL: "machine-learning-client"})
+
+# How many recent searches the search page suggests exercises for.
+SEARCH_HISTORY_LIMIT = 5
+# The week calendar shows at most three exercise names per day, so it only
+# asks the db-service for that much of each day.
+CALENDAR_TODO_FIELDS = {"fields": "workout_name", "max_items": 3}
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -56,7 +70,7 @@ class User(UserMixin):
                 return User(user_data["_id"], user_data["username"])
             return None
         except requests.RequestException as e:
-            print(f"Error fetching user: {e}")
+            logger.error("Error fetching user: %s", e)
             return None
 
 def get_user_by_id(user_id):
@@ -67,7 +81,7 @@ def get_user_by_id(user_id):
             return response.json()
         return None
     except requests.RequestException as e:
-        print(f"Error retrieving user: {e}")
+        logger.error("Error retrieving user: %s", e)
         return None
 
 def update_user_by_id(user_id, update_fields):
@@ -79,7 +93,7 @@ def update_user_by_id(user_id, update_fields):
         )
         return response.status_code == 200
     except requests.RequestException as e:
-        print(f"Error updating user: {e}")
+        logger.error("Error updating user: %s", e)
         return False
 
 def normalize_text(text: str) -> str:
@@ -98,7 +112,7 @@ def search_exercise(query: str):
             return response.json()
         return []
     except requests.RequestException as e:
-        print(f"Error searching exercises: {e}")
+        logger.error("Error searching exercises: %s", e)
         return []
 
 def get_exercise(exercise_id: str):
@@ -109,32 +123,64 @@ def get_exercise(exercise_id: str):
             return response.json()
         return None
     except requests.RequestException as e:
-        print(f"Error getting exercise: {e}")
+        logger.error("Error getting exercise: %s", e)
         return None
 
-def get_all_exercises():
-    """Retrieves all exercise names from the database via API."""
+def resolve_exercises(names):
+    """Resolve a batch of exercise names as ``{name: exercise or None}`` in one db-service call."""
     try:
-        response = requests.get(f"{DB_SERVICE_URL}/exercises/all")
+        response = requests.post(
+            f"{DB_SERVICE_URL}/exercises/resolve",
+            json={"names": list(names)}
+        )
         if response.status_code == 200:
             return response.json()
-        return []
+        return {}
+    except requests.RequestException as e:
+        logger.error("Error resolving exercises: %s", e)
+        return {}
+
+# Last /exercises/all payload and its ETag, reused while db-service answers 304.
+_exercise_catalog = {"etag": None, "exercises": None}
+
+def fetch_exercise_catalog():
+    """
+    Retrieve all exercise names from the db-service, revalidating the locally
+    held copy with If-None-Match. Returns None if the db-service fails.
+    """
+    headers = {}
+    if _exercise_catalog["etag"]:
+        headers["If-None-Match"] = _exercise_catalog["etag"]
+
+    response = requests.get(f"{DB_SERVICE_URL}/exercises/all", headers=headers)
+    if response.status_code == 304 and _exercise_catalog["exercises"] is not None:
+        return _exercise_catalog["exercises"]
+    if response.status_code == 200:
+        exercises = response.json()
+        _exercise_catalog.update(etag=response.headers.get("ETag"), exercises=exercises)
+        return exercises
+    return None
+
+def get_all_exercises():
+    """Retrieves all exercise names from the database via API."""
+    try:
+        return fetch_exercise_catalog() or []
     except Exception as e:
-        print(f"Error retrieving exercises: {e}")
+        logger.error("Error retrieving exercises: %s", e)
         return []
 
 def get_todo():
     """Retrieve the user's to-do list from the db-service."""
     try:
         response = requests.get(f"{DB_SERVICE_URL}/todo/get/{current_user.id}")
-        print(f"DEBUG: Response status: {response.status_code}, Body: {response.text}")
+        logger.debug("db-service todo response: %s", response.status_code)
         if response.status_code == 200:
             todo_data = response.json()
             return todo_data.get("todo", [])
-        print(f"Error fetching todo: {response.status_code}, {response.text}")
+        logger.error("Error fetching todo: %s, %s", response.status_code, response.text)
         return [] 
     except requests.RequestException as e:
-        print(f"Error getting todo: {e}")
+        logger.error("Error getting todo: %s", e)
         return []  
 
 def get_today_todo():
@@ -142,7 +188,7 @@ def get_today_todo():
     try:
         response = requests.get(f"{DB_SERVICE_URL}/todo/get/{current_user.id}")
         if response.status_code != 200:
-            print(f"Error fetching todo: {response.status_code}, {response.text}")
+            logger.error("Error fetching todo: %s, %s", response.status_code, response.text)
             return []
 
         todo_list = response.json()
@@ -155,25 +201,22 @@ def get_today_todo():
         today_todo = []
         for item in todo_list["todo"]:
             if "time" in item:
-                item_date = datetime.strptime(item["time"], "%Y-%m-%d").date()
+                # ISO 8601; only the day matters here.
+                item_date = datetime.strptime(item["time"][:10], "%Y-%m-%d").date()
                 if item_date == today:
                     today_todo.append(item)
         return today_todo
 
     except Exception as e:
-        print(f"Error retrieving today's To-Do list: {e}")
+        logger.error("Error retrieving today's To-Do list: %s", e)
         return []
 
-def add_todo_api(exercise_id: str, date: str, working_time=None, reps=None, weight=None):
-    """Add a to-do item via the db-service API."""
-    exercise = get_exercise(exercise_id)
-    if not exercise:
-        return False
-    
+def build_todo_item(exercise_id: str, exercise: dict, working_time=None, reps=None, weight=None):
+    """Build the exercise_item stored in a user's todo list."""
     eastern_time = datetime.now(ZoneInfo("America/New_York"))
     utc_time = eastern_time.astimezone(ZoneInfo("UTC"))
-    
-    exercise_item = {
+
+    return {
         "exercise_todo_id": str(uuid.uuid4()),
         "exercise_id": exercise_id,
         "workout_name": exercise["workout_name"],
@@ -182,18 +225,49 @@ def add_todo_api(exercise_id: str, date: str, working_time=None, reps=None, weig
         "weight": weight,
         "time": utc_time.isoformat()
     }
+
+def add_todo_api(exercise_id: str, date: str, working_time=None, reps=None, weight=None, exercise=None):
+    """
+    Add a to-do item via the db-service API.
+    Pass ``exercise`` when the caller already has it to skip fetching it again.
+    """
+    if exercise is None:
+        exercise = get_exercise(exercise_id)
+    if not exercise:
+        return False
+    
     data = {
         "user_id": current_user.id,
         "date": date,
-        "exercise_item": exercise_item
+        "exercise_item": build_todo_item(exercise_id, exercise, working_time, reps, weight)
     }
     try:
         response = requests.post(f"{DB_SERVICE_URL}/todo/add", json=data)
         return response.json().get("success", False)
     except requests.RequestException as e:
-        print(f"Error adding todo item: {e}")
+        logger.error("Error adding todo item: %s", e)
         return False
 
+def add_todos_bulk_api(items):
+    """
+    Add many to-do items in one db-service request.
+    ``items`` is a list of {"date": "YYYY-MM-DD", "exercise_item": {...}}.
+    Returns the per-item results, or None if the request failed.
+    """
+    data = {
+        "user_id": current_user.id,
+        "items": items
+    }
+    try:
+        response = requests.post(f"{DB_SERVICE_URL}/todo/add_bulk", json=data)
+        if response.status_code != 200:
+            logger.error("Error adding todo items: status %s", response.status_code)
+            return None
+        return response.json().get("results", [])
+    except requests.RequestException as e:
+        logger.error("Error adding todo items: %s", e)
+        return None
+
 def add_search_history_api(content):
     """Add a search query to the search history via the db-service API."""
     data = {
@@ -204,27 +278,40 @@ def add_search_history_api(content):
         response = requests.post(f"{DB_SERVICE_URL}/search-history/add", json=data)
         return response.json().get("success", False)
     except requests.RequestException as e:
-        print(f"Error adding search history: {e}")
+        logger.error("Error adding search history: %s", e)
         return False
 
-def get_search_history():
-    """Retrieve the user's search history via the db-service API."""
+def get_search_history(limit=SEARCH_HISTORY_LIMIT):
+    """Retrieve the user's most recent searches via the db-service API."""
     try:
-        response = requests.get(f"{DB_SERVICE_URL}/search-history/get/{current_user.id}")
+        response = requests.get(
+            f"{DB_SERVICE_URL}/search-history/get/{current_user.id}",
+            params={"limit": limit}
+        )
         if response.status_code == 200:
             return response.json()
         return []
     except requests.RequestException as e:
-        print(f"Error getting search history: {e}")
+        logger.error("Error getting search history: %s", e)
         return []
 
-def get_exercise_in_todo(exercise_todo_id: int):
-    """Retrieve a specific exercise from the user's to-do list."""
-    exercises = get_todo()
-    for item in exercises:
-        if item.get("exercise_todo_id") == int(exercise_todo_id):
-            return item
-    return None
+def get_exercise_in_todo(exercise_todo_id: str, date: str = None):
+    """
+    Retrieve one exercise from the user's to-do list for ``date`` (YYYY-MM-DD,
+    default today), or None. The db-service returns only that item.
+    """
+    date = date or datetime.now(ZoneInfo("UTC")).strftime("%Y-%m-%d")
+    try:
+        response = requests.get(
+            f"{DB_SERVICE_URL}/todo/get_exercise_by_id",
+            params={"user_id": current_user.id, "date": date, "exercise_todo_id": exercise_todo_id}
+        )
+        if response.status_code == 200:
+            return response.json()
+        return None
+    except requests.RequestException as e:
+        logger.error("Error fetching exercise from db-service: %s", e)
+        return None
 
 def get_instruction(exercise_id: str):
     """Retrieve exercise instructions from the db-service."""
@@ -263,7 +350,7 @@ def insert_transcription_entry_api(content):
             return response.json().get("id", None)
         return None
     except requests.RequestException as e:
-        print(f"Error inserting transcription entry: {e}")
+        logger.error("Error inserting transcription entry: %s", e)
         return None
 
 @login_manager.user_loader
@@ -310,7 +397,7 @@ def register():
         return jsonify({"success": False, "message": response.json().get("message", "Registration failed!")}), 400
 
     except requests.RequestException as e:
-        print(f"Error communicating with database service: {e}")
+        logger.error("Error communicating with database service: %s", e)
         return jsonify({"success": False, "message": "Error communicating with database service"}), 500
 
 @app.route("/login", methods=["POST"])
@@ -318,13 +405,13 @@ def login():
     try:
         username = request.form.get("username")
         password = request.form.get("password")
-        print(f"DEBUG: Received username={username}, password={password}")
+        logger.debug("Login attempt for %s", username)
 
         response = requests.post(
             f"{DB_SERVICE_URL}/users/auth",
             json={"username": username, "password": password}
         )
-        print(f"DEBUG: db-service response: {response.status_code}, {response.json()}")
+        logger.debug("db-service auth response: %s", response.status_code)
 
         if response.status_code == 200:
             user_data = response.json()
@@ -335,13 +422,11 @@ def login():
             login_user(user)
             return jsonify({"message": "Login successful!", "success": True}), 200
         else:
-            print("DEBUG: db-service returned non-200 status code")
+            logger.debug("db-service returned non-200 status code")
             return jsonify({"message": "Invalid username or password!", "success": False}), 401
 
-    except Exception as e:
-        import traceback
-        print(f"DEBUG: Exception occurred: {e}")
-        print(traceback.format_exc())  
+    except Exception:
+        logger.exception("Login failed")
         return jsonify({"message": "Login failed due to internal error!"}), 500
 
 @app.route("/logout")
@@ -398,19 +483,19 @@ def add_exercise():
     date = request.args.get("date")
 
     if not exercise_id:
-        print("No exercise ID provided")
+        logger.warning("No exercise ID provided")
         return jsonify({"message": "Exercise ID is required"}), 400
 
     if not date:
-        print("No date provided")
+        logger.warning("No date provided")
         return jsonify({"message": "Date is required"}), 400
 
     success = add_todo_api(exercise_id,date)
 
     if success:
-        print(f"Successfully added exercise with ID: {exercise_id} on date: {date}")
+        logger.debug("Successfully added exercise with ID: %s on date: %s", exercise_id, date)
         return jsonify({"message": "Added successfully"}), 200
-    print(f"Failed to add exercise with ID: {exercise_id} on date: {date}")
+    logger.error("Failed to add exercise with ID: %s on date: %s", exercise_id, date)
     return jsonify({"message": "Failed to add"}), 400
 
 @app.route("/edit", methods=["GET"])
@@ -425,21 +510,7 @@ def get_edit():
     if not exercise_todo_id or not formatted_date:
         return jsonify({"message": "exercise_todo_id and date are required"}), 400
 
-    try:
-        response = requests.get(
-            f"{DB_SERVICE_URL}/todo/get_exercise_by_id",
-            params={"user_id": current_user.id, "date": formatted_date, "exercise_todo_id": exercise_todo_id}
-        )
-
-        if response.status_code == 200:
-            exercise_in_todo = response.json()
-        else:
-            exercise_in_todo = None
-
-    except requests.RequestException as e:
-        print(f"Error fetching exercise from db-service: {e}")
-        exercise_in_todo = None
-
+    exercise_in_todo = get_exercise_in_todo(exercise_todo_id, formatted_date)
     if not exercise_in_todo:
         return jsonify({"message": "Exercise not found in your To-Do list"}), 404
 
@@ -454,7 +525,7 @@ def post_edit():
     exercise_todo_id = request.form.get("exercise_todo_id")
     date = request.form.get("date")
     formatted_date = datetime.strptime(date, "%Y-%m-%d").strftime("%Y-%m-%d")
-    print(f"DEBUG: Received exercise_todo_id={exercise_todo_id}, date={date}")
+    logger.debug("Received exercise_todo_id=%s, date=%s", exercise_todo_id, date)
 
     if not exercise_todo_id or not date:
         return jsonify({"message": "exercise_todo_id and date are required"}), 400
@@ -492,7 +563,7 @@ def post_edit():
             return jsonify({"message": "Failed to update exercise"}), response.status_code
 
     except requests.RequestException as e:
-        print(f"Error updating exercise in db-service: {e}")
+        logger.error("Error updating exercise in db-service: %s", e)
         return jsonify({"message": "An error occurred while updating the exercise"}), 500
 
 @app.route("/instructions", methods=["GET"])
@@ -533,7 +604,7 @@ def upload_audio():
             check=True,
         )
     except subprocess.CalledProcessError as e:
-        print(f"Error converting audio to WAV: {e}")
+        logger.error("Error converting audio to WAV: %s", e)
         return jsonify({"error": "Failed to convert audio file"}), 500
 
     transcription = call_speech_to_text_service(wav_file_path)
@@ -543,7 +614,7 @@ def upload_audio():
 
 def call_speech_to_text_service(file_path):
     """Sends the uploaded audio file to a remote speech-to-text service for transcription."""
-    url = "http://machine-learning-client:8080/transcribe"
+    url = f"{ML_CLIENT_URL}transcribe"
     data = {"audio_file": file_path}
     headers = {"Content-Type": "application/json"}
     try:
@@ -551,7 +622,7 @@ def call_speech_to_text_service(file_path):
         response.raise_for_status()
         return response.json().get("transcript", "No transcription returned")
     except requests.RequestException as e:
-        print(f"Error communicating with the Speech-to-Text service: {e}")
+        logger.error("Error communicating with the Speech-to-Text service: %s", e)
         return "Error during transcription"
 
 @app.route("/upload-transcription", methods=["POST"])
@@ -605,24 +676,24 @@ def get_week_plan():
     try:
         response = requests.get(
             f"{DB_SERVICE_URL}/todo/get_by_date/{current_user.id}",
-            params={"start_date": start_date, "end_date": end_date}
+            params={"start_date": start_date, "end_date": end_date, **CALENDAR_TODO_FIELDS}
         )
         if response.status_code != 200:
             return jsonify({"error": "Failed to get todo list"}), 500
 
         todos = response.json()
-        print(f"DEBUG: Todos received for date range: {todos}")
+        logger.debug("Todos received for date range: %s", todos)
 
         week_plan_data = {}
         for todo in todos:
-            date = todo["date"]
+            date = todo["date"][:10]
             tasks = [task["workout_name"] for task in todo.get("todo", [])][:3]
             week_plan_data[date] = tasks
 
         return jsonify(week_plan_data)
 
     except Exception as e:
-        print(f"ERROR: Failed to get week plan: {e}")
+        logger.error("Failed to get week plan: %s", e)
         return jsonify({"error": "An error occurred", "message": str(e)}), 500
 
 @app.route('/plan/month', methods=['GET'])
@@ -637,47 +708,20 @@ def get_month_plan():
         return jsonify({"error": "month is required!"}), 400
 
     try:
-        start_of_month = datetime.strptime(month + "-01", "%Y-%m-%d").replace(hour=0, minute=0, second=0, microsecond=0)
-        next_month = (start_of_month.replace(day=28) + timedelta(days=4)).replace(day=1)
-        end_of_month = next_month - timedelta(days=1)
-
+        # db-service buckets the month into weeks starting on the 1st.
         response = requests.get(
-            f"{DB_SERVICE_URL}/todo/get_by_date/{current_user.id}",
-            params={"start_date": start_of_month.strftime("%Y-%m-%d"), "end_date": end_of_month.strftime("%Y-%m-%d")}
+            f"{DB_SERVICE_URL}/todo/calendar/month/{current_user.id}",
+            params={"month": month}
         )
 
         if response.status_code != 200:
-            print(f"ERROR: Failed to fetch todos, status: {response.status_code}")
+            logger.error("Failed to fetch month calendar, status: %s", response.status_code)
             return jsonify({"error": "Failed to get todo list"}), 500
 
-        todos = response.json()
-        print(f"DEBUG: Todos received: {todos}")
-
-        month_plan_data = {}
-        current_date = start_of_month
-        while current_date <= end_of_month:
-            week_start_date = current_date
-            week_end_date = min(current_date + timedelta(days=6), end_of_month)
-
-            week_tasks = [
-                task["workout_name"]
-                for todo in todos
-                if "date" in todo and week_start_date <= datetime.strptime(todo["date"], "%Y-%m-%d") <= week_end_date
-                for task in todo.get("todo", [])
-            ]
-
-            if week_tasks:
-                limited_tasks = week_tasks[:3]  
-                month_plan_data[week_start_date.strftime("%Y-%m-%d")] = limited_tasks
-            else:
-                month_plan_data[week_start_date.strftime("%Y-%m-%d")] = []
-
-            current_date += timedelta(days=7)
-
-        return jsonify(month_plan_data)
+        return jsonify(response.json())
 
     except Exception as e:
-        print(f"ERROR: Failed to generate month plan: {e}")
+        logger.error("Failed to generate month plan: %s", e)
         return jsonify({"error": "An error occurred", "message": str(e)}), 500
 
 
@@ -707,7 +751,7 @@ def update_profile():
                 return jsonify({"message": "Profile updated successfully."}), 200
             return jsonify({"message": "Failed to update profile."}), 500
         except requests.RequestException as e:
-            print(f"Error updating profile: {e}")
+            logger.error("Error updating profile: %s", e)
             return jsonify({"message": "Error updating profile."}), 500
 
     try:
@@ -718,7 +762,7 @@ def update_profile():
         else:
             return render_template('update.html', user={})
     except requests.RequestException as e:
-        print(f"Error fetching user data: {e}")
+        logger.error("Error fetching user data: %s", e)
         return render_template('update.html', user={})
 
 
@@ -772,11 +816,10 @@ def generate_weekly_plan():
 
         user = response.json()
 
-        response = requests.get(f"{DB_SERVICE_URL}/exercises/all")
-        if response.status_code != 200:
+        all_exercises = fetch_exercise_catalog()
+        if all_exercises is None:
             return jsonify({"success": False, "message": "Failed to retrieve exercises"}), 500
 
-        all_exercises = response.json()
         all_workouts = [exercise["workout_name"] for exercise in all_exercises if "workout_name" in exercise]
 
         user_info = {
@@ -791,7 +834,7 @@ def generate_weekly_plan():
             "additional_note": user.get("additional_note", ""),
         }
 
-        response = requests.post("http://machine-learning-client:8080/plan", json=user_info, timeout=10)
+        response = requests.post(f"{ML_CLIENT_URL}plan", json=user_info, timeout=10)
 
         if response.status_code == 200:
             ml_response = response.json()
@@ -802,11 +845,11 @@ def generate_weekly_plan():
         
 
     except requests.exceptions.RequestException as e:
-        print(f"Error communicating with ML Client: {e}")
+        logger.error("Error communicating with ML Client: %s", e)
         return jsonify({"success": False, "message": "Error communicating with ML Client"}), 500
 
     except Exception as e:
-        print(f"Error generating plan: {e}")
+        logger.error("Error generating plan: %s", e)
         return jsonify({"success": False, "message": "Internal server error"}), 500
 
 
@@ -821,16 +864,23 @@ def add_plan(date, plan: dict):
         if key != "Explaining":
             plan_list.append(val)
 
-    i = 0
-    for day_plan in plan_list:
-        target_date = date + timedelta(days=i)
-        formatted_date = target_date.strftime('%Y-%m-%d')
-        i += 1
+    names = list(dict.fromkeys(exercise for day_plan in plan_list for exercise in day_plan))
+    if not names:
+        return
+    resolved = resolve_exercises(names)
+
+    items = []
+    for i, day_plan in enumerate(plan_list):
+        formatted_date = (date + timedelta(days=i)).strftime('%Y-%m-%d')
         for exercise in day_plan:
-            exercise_ids = search_exercise(exercise)
-            if len(exercise_ids) > 0:
-                exercise_id = exercise_ids[0]["_id"]
-                add_todo_api(exercise_id, formatted_date)
+            match = resolved.get(exercise)
+            if match:
+                items.append({
+                    "date": formatted_date,
+                    "exercise_item": build_todo_item(match["_id"], match)
+                })
+    if items:
+        add_todos_bulk_api(items)
     
 
 @app.route("/api/workout-data", methods=["GET"])
@@ -842,32 +892,30 @@ def get_workout_data():
     """
     try:
         user_id = current_user.id
-        print(f"DEBUG: Current user ID: {user_id}")
+        logger.debug("Current user ID: %s", user_id)
+
+        # The profile calendar only shows the current month.
+        month_start = datetime.now(ZoneInfo("America/New_York")).replace(day=1)
+        next_month = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        params = {
+            "start_date": month_start.strftime("%Y-%m-%d"),
+            "end_date": (next_month - timedelta(days=1)).strftime("%Y-%m-%d"),
+        }
 
-        response = requests.get(f"{DB_SERVICE_URL}/todo/{user_id}")
+        response = requests.get(f"{DB_SERVICE_URL}/todo/stats/daily/{user_id}", params=params)
         if response.status_code != 200:
-            print(f"ERROR: Failed to fetch todos, status: {response.status_code}")
+            logger.error("Failed to fetch workout counts, status: %s", response.status_code)
             return jsonify({"error": "Failed to retrieve workout data"}), 500
+        workout_data = response.json()
 
-        todos = response.json()
-        print(f"DEBUG: Received todos from db-service: {todos}")
-
-        workout_data = {}
-        for todo in todos:
-            record_date = datetime.strptime(todo.get("date"), "%a, %d %b %Y %H:%M:%S %Z").strftime("%Y-%m-%d")
-            for item in todo.get("todo", []):
-                if record_date not in workout_data:
-                    workout_data[record_date] = 0
-                workout_data[record_date] += 1
-
-        print(f"DEBUG: Final workout data: {workout_data}")
+        logger.debug("Final workout data: %s", workout_data)
         return jsonify(workout_data)
 
     except requests.exceptions.RequestException as e:
-        print(f"ERROR: Communication with db-service failed: {e}")
+        logger.error("Communication with db-service failed: %s", e)
         return jsonify({"error": "Failed to retrieve workout data"}), 500
     except Exception as e:
-        print(f"ERROR: Unexpected error: {e}")
+        logger.error("Unexpected error: %s", e)
         return jsonify({"error": "Failed to retrieve workout data"}), 500
 
 
@@ -996,11 +1044,11 @@ def delete_exercise_by_date():
     raw_date = datetime.strptime(date, "%A, %B %d, %Y") 
     formatted_date = raw_date.strftime("%Y-%m-%d")
     if not date or not exercise_id:
-        print("DEBUG: Missing date or exercise_id in request")
+        logger.debug("Missing date or exercise_id in request")
         return jsonify({"success": False, "message": "Both date and exercise_id are required"}), 400
 
     try:
-        print(f"DEBUG: Received request to delete exercise. Date: {formatted_date}, Exercise ID: {exercise_id}, User ID: {current_user.id}")
+        logger.debug("Received request to delete exercise. Date: %s, Exercise ID: %s, User ID: %s", formatted_date, exercise_id, current_user.id)
 
         response = requests.post(
             f"{DB_SERVICE_URL}/todo/delete_exercise",
@@ -1012,14 +1060,14 @@ def delete_exercise_by_date():
         )
 
         if response.status_code == 200:
-            print(f"DEBUG: Successfully deleted exercise. Response: {response.json()}")
+            logger.debug("Successfully deleted exercise %s", exercise_id)
             return jsonify({"success": True, "message": "Exercise deleted successfully"}), 200
         else:
-            print(f"ERROR: Failed to delete exercise. Status Code: {response.status_code}, Response: {response.text}")
+            logger.error("Failed to delete exercise. Status Code: %s, Response: %s", response.status_code, response.text)
             return jsonify({"success": False, "message": "Failed to delete exercise"}), response.status_code
 
     except requests.RequestException as e:
-        print(f"ERROR: Communication error with db-service: {str(e)}")
+        logger.error("Communication error with db-service: %s", e)
         return jsonify({"success": False, "message": f"Error communicating with db-service: {str(e)}"}), 500
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+"""
+gunicorn settings for the web-app. gunicorn reads this file from the working
+directory, so from the web-app directory:
+
+    gunicorn app:app
+
+``python app.py`` still starts the Werkzeug development server for local
+work. ``WEB_CONCURRENCY`` and ``GUNICORN_THREADS`` override the worker and
+thread counts.
+"""
+
+import multiprocessing
+import os
+import secrets
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+# Requests spend most of their time waiting on the db-service and the
+# machine-learning-client, so every worker also runs a few threads.
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+# Every worker has to sign sessions with the same key, or a login made on one
+# worker is rejected by the next. Without a configured SECRET_KEY, pick one
+# here in the master process; the workers inherit it.
+os.environ.setdefault("SECRET_KEY", secrets.token_hex(32))
+
+# On SIGTERM (docker stop) workers stop accepting connections and get this
+# long to finish the requests they have.
+graceful_timeout = 30
+timeout = 30
+keepalive = 5
+
+accesslog = None
+errorlog = "-"
@@ -22,6 +22,7 @@ from app import (
     get_todo,
     get_today_todo,
     add_todo_api,
+    add_todos_bulk_api,
     add_search_history_api,
     get_exercise_in_todo,
     get_instruction,
@@ -30,6 +31,7 @@ from app import (
     insert_transcription_entry_api,
     load_user,
     add_plan,
+    resolve_exercises,
     get_workout_data,
     save_plan,
     delete_todo_by_date,
@@ -50,6 +52,13 @@ def client():
 DB_SERVICE_URL = "http://db-service:5112/"
 
 
+@pytest.fixture(autouse=True)
+def empty_exercise_catalog():
+    """Start every test without a locally held exercise catalog."""
+    with patch.dict("app._exercise_catalog", {"etag": None, "exercises": None}):
+        yield
+
+
 ### Test get_user_by_id function ###
 @patch("requests.get")
 def test_get_user_by_id_success(mock_get):
@@ -283,7 +292,7 @@ def test_get_all_exercises_success(mock_get):
     assert len(exercises) == 2
     assert exercises[0]["name"] == "Push-Up"
     assert exercises[1]["name"] == "Pull-Up"
-    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/exercises/all")
+    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/exercises/all", headers={})
 
 
 @patch("requests.get")
@@ -294,7 +303,7 @@ def test_get_all_exercises_empty(mock_get):
     exercises = get_all_exercises()
 
     assert len(exercises) == 0
-    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/exercises/all")
+    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/exercises/all", headers={})
 
 
 @patch("requests.get")
@@ -304,7 +313,26 @@ def test_get_all_exercises_api_failure(mock_get):
     exercises = get_all_exercises()
 
     assert exercises == []
-    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/exercises/all")
+    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/exercises/all", headers={})
+
+
+@patch("requests.get")
+def test_get_all_exercises_not_modified(mock_get):
+    """Test the local copy is revalidated with its ETag and reused on 304."""
+    mock_get.side_effect = [
+        MagicMock(
+            status_code=200,
+            headers={"ETag": '"rev1"'},
+            json=MagicMock(return_value=[{"_id": "1", "workout_name": "Push-Up"}]),
+        ),
+        MagicMock(status_code=304, headers={"ETag": '"rev1"'}),
+    ]
+
+    assert get_all_exercises() == [{"_id": "1", "workout_name": "Push-Up"}]
+    assert get_all_exercises() == [{"_id": "1", "workout_name": "Push-Up"}]
+    mock_get.assert_called_with(
+        f"{DB_SERVICE_URL}/exercises/all", headers={"If-None-Match": '"rev1"'}
+    )
 
 
 @patch("requests.get")
@@ -314,7 +342,7 @@ def test_get_all_exercises_request_exception(mock_get):
     exercises = get_all_exercises()
 
     assert exercises == []
-    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/exercises/all")
+    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/exercises/all", headers={})
 
 
 ### Test get_todo function ###
@@ -619,7 +647,9 @@ def test_get_search_history_success(mock_current_user, mock_get):
         {"content": "testquery1", "timestamp": "2024-12-05T10:00:00Z"},
         {"content": "testquery2", "timestamp": "2024-12-05T11:00:00Z"},
     ]
-    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/search-history/get/123")
+    mock_get.assert_called_once_with(
+        f"{DB_SERVICE_URL}/search-history/get/123", params={"limit": 5}
+    )
 
 
 @patch("app.requests.get")
@@ -632,7 +662,9 @@ def test_get_search_history_empty(mock_current_user, mock_get):
 
     result = get_search_history()
     assert result == []
-    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/search-history/get/123")
+    mock_get.assert_called_once_with(
+        f"{DB_SERVICE_URL}/search-history/get/123", params={"limit": 5}
+    )
 
 
 @patch("app.requests.get")
@@ -644,7 +676,9 @@ def test_get_search_history_failure(mock_current_user, mock_get):
     result = get_search_history()
 
     assert result == []
-    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/search-history/get/123")
+    mock_get.assert_called_once_with(
+        f"{DB_SERVICE_URL}/search-history/get/123", params={"limit": 5}
+    )
 
 
 @patch("app.requests.get")
@@ -656,45 +690,51 @@ def test_get_search_history_request_exception(mock_current_user, mock_get):
     result = get_search_history()
 
     assert result == []
-    mock_get.assert_called_once_with(f"{DB_SERVICE_URL}/search-history/get/123")
+    mock_get.assert_called_once_with(
+        f"{DB_SERVICE_URL}/search-history/get/123", params={"limit": 5}
+    )
 
 
 ### Test get exercise in todo function ###
-@patch("app.get_todo")
-def test_get_exercise_in_todo_found(mock_get_todo):
+@patch("app.requests.get")
+@patch("app.current_user")
+def test_get_exercise_in_todo_found(mock_current_user, mock_get):
     """Test get_exercise_in_todo function when the exercise is found."""
-    mock_get_todo.return_value = [
-        {"exercise_todo_id": 1, "task": "Push-Ups"},
-        {"exercise_todo_id": 2, "task": "Sit-Ups"},
-    ]
-    result = get_exercise_in_todo(1)
+    mock_current_user.id = "123"
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = {"exercise_todo_id": "abc", "task": "Push-Ups"}
 
-    assert result == {"exercise_todo_id": 1, "task": "Push-Ups"}
-    mock_get_todo.assert_called_once()
+    result = get_exercise_in_todo("abc", "2024-12-01")
 
+    assert result == {"exercise_todo_id": "abc", "task": "Push-Ups"}
+    mock_get.assert_called_once_with(
+        f"{DB_SERVICE_URL}/todo/get_exercise_by_id",
+        params={"user_id": "123", "date": "2024-12-01", "exercise_todo_id": "abc"},
+    )
 
-@patch("app.get_todo")
-def test_get_exercise_in_todo_not_found(mock_get_todo):
+
+@patch("app.requests.get")
+@patch("app.current_user")
+def test_get_exercise_in_todo_not_found(mock_current_user, mock_get):
     """Test get_exercise_in_todo function when the exercise is not found."""
-    mock_get_todo.return_value = [
-        {"exercise_todo_id": 1, "task": "Push-Ups"},
-        {"exercise_todo_id": 2, "task": "Sit-Ups"},
-    ]
+    mock_current_user.id = "123"
+    mock_get.return_value.status_code = 404
 
-    result = get_exercise_in_todo(3)
+    result = get_exercise_in_todo("missing")
 
     assert result is None
-    mock_get_todo.assert_called_once()
+    today = datetime.now(ZoneInfo("UTC")).strftime("%Y-%m-%d")
+    assert mock_get.call_args.kwargs["params"]["date"] == today
 
 
-@patch("app.get_todo")
-def test_get_exercise_in_todo_empty_list(mock_get_todo):
-    """Test get_exercise_in_todo function when the to-do list is empty."""
-    mock_get_todo.return_value = []
-    result = get_exercise_in_todo(1)
+@patch("app.requests.get")
+@patch("app.current_user")
+def test_get_exercise_in_todo_request_exception(mock_current_user, mock_get):
+    """Test get_exercise_in_todo function when the db-service is unreachable."""
+    mock_current_user.id = "123"
+    mock_get.side_effect = requests.RequestException("Network error")
 
-    assert result is None
-    mock_get_todo.assert_called_once()
+    assert get_exercise_in_todo("abc", "2024-12-01") is None
 
 
 ### Test get instruction function ###
@@ -1509,7 +1549,8 @@ def test_get_week_plan_success(mock_current_user, mock_requests_get, client):
     }
     mock_requests_get.assert_called_once_with(
         f"{DB_SERVICE_URL}/todo/get_by_date/123",
-        params={"start_date": "2024-12-01", "end_date": "2024-12-07"},
+        params={"start_date": "2024-12-01", "end_date": "2024-12-07",
+                "fields": "workout_name", "max_items": 3},
     )
 
 
@@ -1537,7 +1578,8 @@ def test_get_week_plan_api_failure(mock_current_user, mock_requests_get, client)
     assert response.json == {"error": "Failed to get todo list"}
     mock_requests_get.assert_called_once_with(
         f"{DB_SERVICE_URL}/todo/get_by_date/123",
-        params={"start_date": "2024-12-01", "end_date": "2024-12-07"},
+        params={"start_date": "2024-12-01", "end_date": "2024-12-07",
+                "fields": "workout_name", "max_items": 3},
     )
 
 
@@ -1553,7 +1595,8 @@ def test_get_week_plan_request_exception(mock_current_user, mock_requests_get, c
     assert response.json == {"error": "An error occurred", "message": "Network error"}
     mock_requests_get.assert_called_once_with(
         f"{DB_SERVICE_URL}/todo/get_by_date/123",
-        params={"start_date": "2024-12-01", "end_date": "2024-12-07"},
+        params={"start_date": "2024-12-01", "end_date": "2024-12-07",
+                "fields": "workout_name", "max_items": 3},
     )
 
 
@@ -1564,13 +1607,13 @@ def test_get_month_plan_success(mock_current_user, mock_requests_get, client):
     """Test get_month_plan with successful API call."""
     mock_current_user.id = "123"
     mock_requests_get.return_value.status_code = 200
-    mock_requests_get.return_value.json.return_value = [
-        {"date": "2024-12-01", "todo": [{"workout_name": "Push Ups"}]},
-        {
-            "date": "2024-12-08",
-            "todo": [{"workout_name": "Rest"}, {"workout_name": "Squats"}],
-        },
-    ]
+    mock_requests_get.return_value.json.return_value = {
+        "2024-12-01": ["Push Ups"],
+        "2024-12-08": ["Rest", "Squats"],
+        "2024-12-15": [],
+        "2024-12-22": [],
+        "2024-12-29": [],
+    }
     response = client.get("/plan/month?month=2024-12")
 
     assert response.status_code == 200
@@ -1582,8 +1625,8 @@ def test_get_month_plan_success(mock_current_user, mock_requests_get, client):
         "2024-12-29": [],
     }
     mock_requests_get.assert_called_once_with(
-        f"{DB_SERVICE_URL}/todo/get_by_date/123",
-        params={"start_date": "2024-12-01", "end_date": "2024-12-31"},
+        f"{DB_SERVICE_URL}/todo/calendar/month/123",
+        params={"month": "2024-12"},
     )
 
 
@@ -1598,8 +1641,8 @@ def test_get_month_plan_api_failure(mock_current_user, mock_requests_get, client
     assert response.status_code == 500
     assert response.json == {"error": "Failed to get todo list"}
     mock_requests_get.assert_called_once_with(
-        f"{DB_SERVICE_URL}/todo/get_by_date/123",
-        params={"start_date": "2024-12-01", "end_date": "2024-12-31"},
+        f"{DB_SERVICE_URL}/todo/calendar/month/123",
+        params={"month": "2024-12"},
     )
 
 
@@ -1626,8 +1669,8 @@ def test_get_month_plan_request_exception(mock_current_user, mock_requests_get,
     assert response.status_code == 500
     assert response.json == {"error": "An error occurred", "message": "Network error"}
     mock_requests_get.assert_called_once_with(
-        f"{DB_SERVICE_URL}/todo/get_by_date/123",
-        params={"start_date": "2024-12-01", "end_date": "2024-12-31"},
+        f"{DB_SERVICE_URL}/todo/calendar/month/123",
+        params={"month": "2024-12"},
     )
 
 
@@ -1903,7 +1946,7 @@ def test_generate_weekly_plan_success(
     assert response.status_code == 200
     assert response.json == {"success": True, "plan": {"plan": "sample_plan"}}
     mock_requests_get.assert_any_call(f"{DB_SERVICE_URL}/users/get/123")
-    mock_requests_get.assert_any_call(f"{DB_SERVICE_URL}/exercises/all")
+    mock_requests_get.assert_any_call(f"{DB_SERVICE_URL}/exercises/all", headers={})
     mock_requests_post.assert_called_once_with(
         "http://machine-learning-client:8080/plan",
         json={
@@ -1971,7 +2014,7 @@ def test_generate_weekly_plan_exercises_failure(
         "message": "Failed to retrieve exercises",
     }
     mock_requests_get.assert_any_call(f"{DB_SERVICE_URL}/users/get/123")
-    mock_requests_get.assert_any_call(f"{DB_SERVICE_URL}/exercises/all")
+    mock_requests_get.assert_any_call(f"{DB_SERVICE_URL}/exercises/all", headers={})
 
 
 @patch("app.requests.post")
@@ -2050,55 +2093,60 @@ def test_generate_weekly_plan_request_exception(
         "message": "Error communicating with ML Client",
     }
     mock_requests_get.assert_any_call(f"{DB_SERVICE_URL}/users/get/123")
-    mock_requests_get.assert_any_call(f"{DB_SERVICE_URL}/exercises/all")
+    mock_requests_get.assert_any_call(f"{DB_SERVICE_URL}/exercises/all", headers={})
     mock_requests_post.assert_called_once()
 
 
 ### Test add_plan function ###
-@patch("app.search_exercise")
-@patch("app.add_todo_api")
-def test_add_plan_success(mock_add_todo_api, mock_search_exercise):
-    """Test adding a plan successfully."""
-    mock_search_exercise.side_effect = lambda name: (
-        [{"_id": f"{name}_id"}] if name != "Nonexistent" else []
-    )
+@patch("app.resolve_exercises")
+@patch("app.add_todos_bulk_api")
+def test_add_plan_success(mock_add_todos_bulk_api, mock_resolve_exercises):
+    """Test adding a plan sends every matched exercise in one bulk request."""
+    mock_resolve_exercises.side_effect = lambda names: {
+        name: ({"_id": f"{name}_id", "workout_name": name} if name != "Nonexist" else None)
+        for name in names
+    }
     date = datetime(2024, 12, 1)
     plan = {
         "Day 1": ["Push Ups", "Sit Ups"],
-        "Day 2": ["Nonexist", "Squats"],
+        "Day 2": ["Nonexist", "Squats", "Push Ups"],
         "Explaining": "Details about the plan.",
     }
 
     add_plan(date, plan)
 
-    mock_search_exercise.assert_any_call("Push Ups")
-    mock_search_exercise.assert_any_call("Sit Ups")
-    mock_search_exercise.assert_any_call("Nonexist")
-    mock_search_exercise.assert_any_call("Squats")
-
-    mock_add_todo_api.assert_any_call("Push Ups_id", "2024-12-01")
-    mock_add_todo_api.assert_any_call("Sit Ups_id", "2024-12-01")
-    mock_add_todo_api.assert_any_call("Squats_id", "2024-12-02")
-    assert mock_add_todo_api.call_count == 4
+    mock_resolve_exercises.assert_called_once_with(
+        ["Push Ups", "Sit Ups", "Nonexist", "Squats"]
+    )
+    mock_add_todos_bulk_api.assert_called_once()
+    items = mock_add_todos_bulk_api.call_args[0][0]
+    assert [(item["date"], item["exercise_item"]["exercise_id"]) for item in items] == [
+        ("2024-12-01", "Push Ups_id"),
+        ("2024-12-01", "Sit Ups_id"),
+        ("2024-12-02", "Squats_id"),
+        ("2024-12-02", "Push Ups_id"),
+    ]
+    assert items[2]["exercise_item"]["workout_name"] == "Squats"
+    assert len({item["exercise_item"]["exercise_todo_id"] for item in items}) == 4
 
 
-@patch("app.search_exercise")
-@patch("app.add_todo_api")
-def test_add_plan_empty_plan(mock_add_todo_api, mock_search_exercise):
+@patch("app.resolve_exercises")
+@patch("app.add_todos_bulk_api")
+def test_add_plan_empty_plan(mock_add_todos_bulk_api, mock_resolve_exercises):
     """Test adding an empty plan."""
     date = datetime(2024, 12, 1)
     plan = {}
     add_plan(date, plan)
 
-    mock_search_exercise.assert_not_called()
-    mock_add_todo_api.assert_not_called()
+    mock_resolve_exercises.assert_not_called()
+    mock_add_todos_bulk_api.assert_not_called()
 
 
-@patch("app.search_exercise")
-@patch("app.add_todo_api")
-def test_add_plan_no_matching_exercises(mock_add_todo_api, mock_search_exercise):
+@patch("app.resolve_exercises")
+@patch("app.add_todos_bulk_api")
+def test_add_plan_no_matching_exercises(mock_add_todos_bulk_api, mock_resolve_exercises):
     """Test adding a plan with no matching exercises."""
-    mock_search_exercise.side_effect = lambda name: []
+    mock_resolve_exercises.side_effect = lambda names: {name: None for name in names}
     date = datetime(2024, 12, 1)
     plan = {
         "Day 1": ["Nonexistent Exercise"],
@@ -2107,9 +2155,76 @@ def test_add_plan_no_matching_exercises(mock_add_todo_api, mock_search_exercise)
 
     add_plan(date, plan)
 
-    mock_search_exercise.assert_any_call("Nonexistent Exercise")
-    mock_search_exercise.assert_any_call("Another Nonexistent Exercise")
-    mock_add_todo_api.assert_not_called()
+    mock_resolve_exercises.assert_called_once_with(
+        ["Nonexistent Exercise", "Another Nonexistent Exercise"]
+    )
+    mock_add_todos_bulk_api.assert_not_called()
+
+
+### Test add_todos_bulk_api function ###
+@patch("app.requests.post")
+@patch("app.current_user")
+def test_add_todos_bulk_api(mock_current_user, mock_post):
+    """Test add_todos_bulk_api posts all items at once and returns the results."""
+    mock_current_user.id = 123
+    mock_post.return_value.status_code = 200
+    mock_post.return_value.json.return_value = {
+        "success": True, "added": 1, "results": [{"success": True}]
+    }
+    items = [{"date": "2024-12-01", "exercise_item": {"exercise_id": "1"}}]
+
+    assert add_todos_bulk_api(items) == [{"success": True}]
+    mock_post.assert_called_once_with(
+        f"{DB_SERVICE_URL}/todo/add_bulk", json={"user_id": 123, "items": items}
+    )
+
+    mock_post.return_value.status_code = 400
+    assert add_todos_bulk_api(items) is None
+
+    mock_post.side_effect = requests.RequestException("Connection error")
+    assert add_todos_bulk_api(items) is None
+
+
+### Test resolve_exercises function ###
+@patch("app.requests.post")
+def test_resolve_exercises_success(mock_post):
+    """Test resolve_exercises sends the whole batch in one request."""
+    mock_post.return_value.status_code = 200
+    mock_post.return_value.json.return_value = {"Squats": {"_id": "1"}, "Nope": None}
+
+    result = resolve_exercises(["Squats", "Nope"])
+
+    assert result == {"Squats": {"_id": "1"}, "Nope": None}
+    mock_post.assert_called_once_with(
+        f"{DB_SERVICE_URL}/exercises/resolve", json={"names": ["Squats", "Nope"]}
+    )
+
+
+@patch("app.requests.post")
+def test_resolve_exercises_failure(mock_post):
+    """Test resolve_exercises when the db-service fails."""
+    mock_post.return_value.status_code = 500
+    assert resolve_exercises(["Squats"]) == {}
+
+    mock_post.side_effect = requests.RequestException("Connection error")
+    assert resolve_exercises(["Squats"]) == {}
+
+
+@patch("app.requests.post")
+@patch("app.current_user")
+@patch("app.get_exercise")
+def test_add_todo_api_with_known_exercise(mock_get_exercise, mock_current_user, mock_post):
+    """Test add_todo_api skips the exercise lookup when the exercise is passed in."""
+    mock_current_user.id = 123
+    mock_post.return_value.json.return_value = {"success": True}
+
+    result = add_todo_api(
+        "exercise123", "2024-12-04", exercise={"workout_name": "Test Exercise"}
+    )
+
+    assert result is True
+    mock_get_exercise.assert_not_called()
+    assert mock_post.call_args[1]["json"]["exercise_item"]["workout_name"] == "Test Exercise"
 
 
 ### Test get_workout_data function ###
@@ -2119,16 +2234,10 @@ def test_get_workout_data_success(mock_current_user, mock_requests_get):
     """Test get_workout_data with successful response."""
     mock_current_user.id = 123
     mock_requests_get.return_value.status_code = 200
-    mock_requests_get.return_value.json.return_value = [
-        {
-            "date": "Thu, 05 Dec 2024 10:00:00 UTC",
-            "todo": [{"exercise_id": "id1"}, {"exercise_id": "id2"}],
-        },
-        {
-            "date": "Fri, 06 Dec 2024 10:00:00 UTC",
-            "todo": [{"exercise_id": "id3"}],
-        },
-    ]
+    mock_requests_get.return_value.json.return_value = {
+        "2024-12-05": 2,
+        "2024-12-06": 1,
+    }
 
     with app.test_client() as client:
         response = client.get("/api/workout-data")
@@ -2140,7 +2249,10 @@ def test_get_workout_data_success(mock_current_user, mock_requests_get):
             "2024-12-06": 1,
         }
 
-    mock_requests_get.assert_called_once_with(f"{DB_SERVICE_URL}/todo/123")
+    mock_requests_get.assert_called_once_with(f"{DB_SERVICE_URL}/todo/stats/daily/123", params=ANY)
+    params = mock_requests_get.call_args[1]["params"]
+    assert params["start_date"].endswith("-01")
+    assert params["end_date"] >= params["start_date"]
 
 
 @patch("app.requests.get")
@@ -2149,7 +2261,7 @@ def test_get_workout_data_no_workouts(mock_current_user, mock_requests_get):
     """Test get_workout_data when there are no workouts."""
     mock_current_user.id = "123"
     mock_requests_get.return_value.status_code = 200
-    mock_requests_get.return_value.json.return_value = []
+    mock_requests_get.return_value.json.return_value = {}
 
     with app.test_request_context("/api/workout-data"):
         response = get_workout_data()
@@ -2167,7 +2279,7 @@ def test_get_workout_data_api_failure(mock_current_user, mock_requests_get, clie
 
     assert response.status_code == 500
     assert response.json == {"error": "Failed to retrieve workout data"}
-    mock_requests_get.assert_called_once_with(f"{DB_SERVICE_URL}/todo/123")
+    mock_requests_get.assert_called_once_with(f"{DB_SERVICE_URL}/todo/stats/daily/123", params=ANY)
 
 
 @patch("app.requests.get")
@@ -2182,7 +2294,7 @@ def test_get_workout_data_request_exception(
 
     assert response.status_code == 500
     assert response.json == {"error": "Failed to retrieve workout data"}
-    mock_requests_get.assert_called_once_with(f"{DB_SERVICE_URL}/todo/123")
+    mock_requests_get.assert_called_once_with(f"{DB_SERVICE_URL}/todo/stats/daily/123", params=ANY)
 
 
 ### Test save_plan function ###
@@ -2438,5 +2550,25 @@ def test_delete_exercise_by_date_request_exception(
         )
 
 
+def test_metrics_endpoint(client):
+    """/metrics reports handled requests and the time spent in db-service calls."""
+    reply = requests.Response()
+    reply.status_code = 200
+    with patch("requests.adapters.HTTPAdapter.send", return_value=reply):
+        requests.get(f"{DB_SERVICE_URL}todo/get/123", timeout=5)
+    client.get("/login")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    body = response.get_data(as_text=True)
+    assert re.search(r'http_requests_total\{route="/login",method="GET",status="\d+"\} \d+', body)
+    assert (
+        'dependency_duration_seconds_count{dependency="db-service",operation="GET /todo"}'
+        in body
+    )
+
+
 if __name__ == "__main__":
     pytest.main()